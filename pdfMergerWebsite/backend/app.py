@@ -4,9 +4,11 @@ Flask application for the PDF Merger service.
 This module provides API endpoints for uploading and merging PDF files.
 """
 import os
+import json
 from flask import Flask, request, jsonify
 from werkzeug.utils import secure_filename
 from utils.pdf_merger import merge_pdfs
+from utils.merge_pool import MergePool
 
 # Initialize Flask application
 app = Flask(__name__)
@@ -22,6 +24,12 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limit upload size to 16MB
 
+# Merges run in worker processes; requests beyond the queue are answered with 429
+merge_pool = MergePool(
+    max_workers=int(os.environ.get('MERGE_POOL_WORKERS', 2)),
+    max_queued=int(os.environ.get('MERGE_POOL_QUEUE_SIZE', 8))
+)
+
 
 def allowed_file(filename):
     """
@@ -52,28 +60,52 @@ def upload_files():
     if not files or not files[0].filename:
         return jsonify({'error': 'No selected files'}), 400
 
-    pdf_paths = []
+    # Uploads go to the merge as bytes instead of a round trip through the upload folder
+    documents = []
 
     for file in files:
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            pdf_paths.append(file_path)
+            documents.append((secure_filename(file.filename), file.read()))
         else:
             return jsonify({
                 'error': f'File {file.filename} is not a valid PDF'
             }), 400
 
+    # Optional JSON list of segments selecting and reordering pages
+    merge_spec = None
+    if request.form.get('merge_spec'):
+        try:
+            merge_spec = json.loads(request.form['merge_spec'])
+        except json.JSONDecodeError as error:
+            return jsonify({'error': f'Invalid merge spec: {error}'}), 400
+
     output_path = os.path.join(app.config['UPLOAD_FOLDER'], 'merged_document.pdf')
-    merge_result = merge_pdfs(pdf_paths, output_path)
+    dedupe = request.form.get('dedupe', '').lower() in ('1', 'true', 'yes', 'on')
+    # Output profile trading merge time for size, with an optional zlib level override
+    profile = request.form.get('profile') or 'fast'
+    compression_level = None
+    if request.form.get('compression_level'):
+        try:
+            compression_level = int(request.form['compression_level'])
+        except ValueError:
+            return jsonify({'error': 'Compression level must be a number between 1 and 9'}), 400
+    merge_result = merge_pdfs(documents, output_path, pool=merge_pool, merge_spec=merge_spec, dedupe=dedupe,
+                              profile=profile, compression_level=compression_level)
 
     if merge_result.get('success', False):
         return jsonify({
             'message': 'Files merged successfully',
-            'download_link': output_path
+            'download_link': output_path,
+            'profile': profile,
+            'size_bytes': merge_result['size_bytes'],
+            'merge_seconds': merge_result['merge_seconds']
         }), 200
 
+    if 'retry_after' in merge_result:
+        response = jsonify({'error': merge_result['error']})
+        response.headers['Retry-After'] = str(merge_result['retry_after'])
+        return response, 429
+
     return jsonify({
         'error': merge_result.get('error', 'Error merging files')
     }), 500
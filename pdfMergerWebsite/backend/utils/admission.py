@@ -0,0 +1,343 @@
+"""
+Admission control utility module.
+
+This module admits merges by the work they are expected to cause rather than
+by counting requests. The work of a merge is estimated in CPU seconds from the
+size and page count of its inputs, and every client has a token bucket of CPU
+seconds it refills at a steady rate, so that a client sending large merges
+runs out long before one sending small ones. A budget on the estimated work
+running or waiting at once keeps the merge processes busy without letting a
+backlog build up, and no single client may take more than a share of it.
+
+Estimates are corrected once the merge has run: the CPU time it actually took
+is charged to the client instead, and the per-page rates the estimates are
+based on follow the measured ones.
+
+The buckets live in a bucket store: TokenBucketStore keeps them in the process,
+shared_store.SqliteTokenBucketStore shares them between the workers of a host.
+"""
+import math
+import time
+import logging
+import threading
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Weight of the newest measurement in the running per-page rates
+RATE_SMOOTHING = 0.2
+
+
+class AdmissionDenied(Exception):
+    """
+    A merge does not fit a budget; carries the suggested Retry-After in seconds.
+
+    ``scope`` is ``client`` when the client's bucket is short and ``server``
+    when the in-flight budget is full.
+    """
+
+    def __init__(self, retry_after, scope):
+        super().__init__(f'Merge exceeds the {scope} budget, retry in {retry_after} seconds')
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+def cpu_timed_call(fn, *args, progress=None):
+    """
+    Call a MergePool task and measure the CPU time it used.
+
+    This is a top-level function so that it can run in a MergePool process.
+    The time of the calling thread is measured, which in a pool process is
+    the task alone.
+
+    Args:
+        fn (callable): Task taking ``*args`` and a ``progress`` keyword
+        progress (callable, optional): Passed on to ``fn``
+
+    Returns:
+        tuple: (result of ``fn``, CPU seconds)
+    """
+    started = time.thread_time()
+    result = fn(*args, progress=progress)
+    return result, time.thread_time() - started
+
+
+class TokenBucketStore:
+    """
+    Per-client token buckets kept in this process.
+
+    Every method takes the refill ``rate`` and capacity ``burst`` so that the
+    controller alone owns the configuration. Calls are serialised by the
+    AdmissionController using the store.
+    """
+
+    def __init__(self, max_clients=10000):
+        """
+        Args:
+            max_clients (int): Buckets kept before full, idle ones are dropped, for the default store
+            bucket_store (optional): Where the client buckets live, such as a
+                SqliteTokenBucketStore; a TokenBucketStore in this process by default
+        """
+        self.max_clients = max(1, int(max_clients))
+        # client -> [tokens, time of last refill]
+        self._buckets = {}
+
+    def _refill(self, client, rate, burst, now):
+        """Return the client's bucket after adding what it earned since its last refill."""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                self._prune(rate, burst, now)
+            bucket = self._buckets[client] = [burst, now]
+        else:
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        return bucket
+
+    def _prune(self, rate, burst, now):
+        """Drop the buckets of idle clients that have refilled completely."""
+        for client, (tokens, refilled_at) in list(self._buckets.items()):
+            if tokens + (now - refilled_at) * rate >= burst:
+                del self._buckets[client]
+
+    def take(self, client, cost, rate, burst):
+        """
+        Refill a client's bucket and take ``cost`` from it if it can pay.
+
+        A bucket can pay if it holds the cost, or is full for a cost beyond its capacity.
+
+        Returns:
+            tuple: (whether the cost was taken, tokens in the bucket before taking it)
+        """
+        bucket = self._refill(client, rate, burst, time.monotonic())
+        tokens = bucket[0]
+        if tokens < min(cost, burst):
+            return False, tokens
+        bucket[0] -= cost
+        return True, tokens
+
+    def charge(self, client, cost):
+        """Take ``cost`` from a client's bucket, which may go into debt; a negative cost refunds."""
+        bucket = self._buckets.get(client)
+        if bucket is not None:
+            bucket[0] -= cost
+
+    def tokens(self, client, rate, burst):
+        """Return the tokens in a client's bucket after refilling it."""
+        return self._refill(client, rate, burst, time.monotonic())[0]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionTicket:
+    """
+    A merge admitted by an AdmissionController.
+
+    Use it as a context manager around the merge, or call ``release`` when the
+    merge ends; until then its estimated cost counts against the in-flight
+    budget. ``settle`` replaces the estimate with the measured cost.
+    """
+
+    def __init__(self, controller, client, cost, input_bytes):
+        self.controller = controller
+        self.client = client
+        self.cost = cost
+        self.input_bytes = input_bytes
+        self.settled = False
+        self.released = False
+
+    def settle(self, cpu_seconds, pages=None):
+        """
+        Charge the client the measured CPU time instead of the estimate.
+
+        The per-merge overhead is charged either way, so that even merges
+        served from a cache are not free.
+
+        Args:
+            cpu_seconds (float): CPU time the merge took; 0 for a merge served from a cache
+            pages (int, optional): Pages merged, to refine the estimates of later merges
+        """
+        if not self.settled:
+            self.settled = True
+            self.controller._settle(self, cpu_seconds, pages)  # pylint: disable=protected-access
+
+    def release(self):
+        """Return the estimated cost to the in-flight budget; later calls do nothing."""
+        if not self.released:
+            self.released = True
+            self.controller._release(self)  # pylint: disable=protected-access
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Cost-based admission for merges with per-client token buckets.
+
+    A client's bucket holds up to ``client_burst`` CPU seconds and refills at
+    ``client_rate`` CPU seconds per second. A merge is admitted if the bucket
+    covers its estimated cost, or is full for a merge costing more than the
+    whole bucket, and is charged the estimate up front; the bucket may go
+    into debt when the measured cost turns out higher. Independently the
+    estimated cost of admitted, unreleased merges is kept within
+    ``max_inflight``, of which one client may hold ``client_share``. A client
+    or server with nothing in flight always gets one merge in, however large.
+
+    A rate or budget of zero turns that check off. The buckets are kept in
+    ``bucket_store`` and can be shared between processes; the in-flight budget
+    and the per-page rates are per process, like the merge pool whose load the
+    budget stands for.
+    """
+
+    def __init__(self, client_rate=1.0, client_burst=120.0, max_inflight=20.0, client_share=0.5, workers=1,
+                 cpu_seconds_per_page=0.001, bytes_per_page=50 * 1024, overhead_seconds=0.01, max_clients=10000,
+                 bucket_store=None):
+        """
+        Args:
+            client_rate (float): CPU seconds per second a client's bucket refills with, 0 for no buckets
+            client_burst (float): Capacity of a client's bucket in CPU seconds
+            max_inflight (float): Estimated CPU seconds admitted at once, 0 for no limit
+            client_share (float): Fraction of ``max_inflight`` one client may hold
+            workers (int): Merge processes working off the in-flight cost, for Retry-After
+            cpu_seconds_per_page (float): Initial CPU cost of a page
+            bytes_per_page (float): Initial input size of a page, for inputs whose page count is unknown
+            overhead_seconds (float): Cost of handling a merge request beyond its pages
+            max_clients (int): Buckets kept before full, idle ones are dropped, for the default store
+            bucket_store (optional): Where the client buckets live, such as a
+                SqliteTokenBucketStore; a TokenBucketStore in this process by default
+        """
+        self.client_rate = max(0.0, float(client_rate))
+        self.client_burst = max(0.0, float(client_burst))
+        self.max_inflight = max(0.0, float(max_inflight))
+        self.client_share = min(1.0, max(0.0, float(client_share)))
+        self.workers = max(1, int(workers))
+        self.cpu_seconds_per_page = float(cpu_seconds_per_page)
+        self.bytes_per_page = float(bytes_per_page)
+        self.overhead_seconds = float(overhead_seconds)
+        self.bucket_store = bucket_store if bucket_store is not None else TokenBucketStore(max_clients)
+        self._lock = threading.Lock()
+        # client -> estimated cost in flight, for clients with anything in flight
+        self._client_inflight = {}
+        self._inflight = 0.0
+        self.stats = {
+            'admitted': 0,
+            'rejected_client': 0,
+            'rejected_busy': 0,
+            'settled': 0,
+            'cpu_seconds': 0.0
+        }
+
+    def estimate(self, inputs):
+        """
+        Estimate the CPU time of merging some inputs.
+
+        Args:
+            inputs (list): (size in bytes, page count or None if unknown) pairs
+
+        Returns:
+            dict: ``pages``, the known or estimated page count, and ``cpu_seconds``
+        """
+        with self._lock:
+            bytes_per_page = self.bytes_per_page
+            cpu_seconds_per_page = self.cpu_seconds_per_page
+        pages = sum(page_count if page_count is not None else size_bytes / bytes_per_page
+                    for size_bytes, page_count in inputs)
+        return {'pages': pages, 'cpu_seconds': self.overhead_seconds + pages * cpu_seconds_per_page}
+
+    def admit(self, client, inputs):
+        """
+        Admit a merge or turn it away.
+
+        Args:
+            client (str): Client identity, such as its address
+            inputs (list): (size in bytes, page count or None) pairs, see estimate
+
+        Returns:
+            AdmissionTicket: The admitted merge
+
+        Raises:
+            AdmissionDenied: If the client's bucket or the in-flight budget cannot take the merge
+        """
+        cost = self.estimate(inputs)['cpu_seconds']
+        with self._lock:
+            if self.client_rate:
+                taken, tokens = self.bucket_store.take(client, cost, self.client_rate, self.client_burst)
+                if not taken:
+                    self.stats['rejected_client'] += 1
+                    retry_after = max(1, math.ceil((min(cost, self.client_burst) - tokens) / self.client_rate))
+                    logger.warning("Client %s is out of merge budget (%.2f of %.2f CPU seconds), Retry-After %d",
+                                   client, tokens, cost, retry_after)
+                    raise AdmissionDenied(retry_after, 'client')
+            if self.max_inflight:
+                client_inflight = self._client_inflight.get(client, 0.0)
+                over_total = self._inflight and self._inflight + cost > self.max_inflight
+                over_share = client_inflight and client_inflight + cost > self.max_inflight * self.client_share
+                if over_total or over_share:
+                    self.stats['rejected_busy'] += 1
+                    # Work in flight drains at about one CPU second per second per merge process
+                    excess = self._inflight + cost - self.max_inflight if over_total else client_inflight
+                    retry_after = max(1, math.ceil(excess / self.workers))
+                    logger.warning("Merge budget full (%.2f CPU seconds in flight), Retry-After %d",
+                                   self._inflight, retry_after)
+                    if self.client_rate:
+                        # The merge does not run, so its cost goes back into the client's bucket
+                        self.bucket_store.charge(client, -cost)
+                    raise AdmissionDenied(retry_after, 'server')
+            self._client_inflight[client] = self._client_inflight.get(client, 0.0) + cost
+            self._inflight += cost
+            self.stats['admitted'] += 1
+        return AdmissionTicket(self, client, cost, sum(size_bytes for size_bytes, _ in inputs))
+
+    def _settle(self, ticket, cpu_seconds, pages):
+        """Charge a ticket's client the difference between measured and estimated cost."""
+        cpu_seconds = max(0.0, float(cpu_seconds))
+        with self._lock:
+            self.stats['settled'] += 1
+            self.stats['cpu_seconds'] += cpu_seconds
+            if self.client_rate:
+                self.bucket_store.charge(ticket.client, self.overhead_seconds + cpu_seconds - ticket.cost)
+            if pages and cpu_seconds:
+                self.cpu_seconds_per_page += RATE_SMOOTHING * (cpu_seconds / pages - self.cpu_seconds_per_page)
+                if ticket.input_bytes:
+                    self.bytes_per_page += RATE_SMOOTHING * (ticket.input_bytes / pages - self.bytes_per_page)
+
+    def _release(self, ticket):
+        """Remove a ticket's estimated cost from the in-flight totals."""
+        with self._lock:
+            # Rounding leaves crumbs behind once the last merge is released; they must not count as work
+            self._inflight -= ticket.cost
+            if self._inflight < 1e-9:
+                self._inflight = 0.0
+            client_inflight = self._client_inflight.pop(ticket.client, 0.0) - ticket.cost
+            if client_inflight > 1e-9:
+                self._client_inflight[ticket.client] = client_inflight
+
+    def client_tokens(self, client):
+        """Return the CPU seconds left in a client's bucket, or None without buckets."""
+        if not self.client_rate:
+            return None
+        with self._lock:
+            return self.bucket_store.tokens(client, self.client_rate, self.client_burst)
+
+    def snapshot(self):
+        """
+        Report the controller's state.
+
+        Returns:
+            dict: Counters, ``inflight_cpu_seconds``, ``clients`` and the current per-page rates
+        """
+        with self._lock:
+            return dict(
+                self.stats,
+                cpu_seconds=round(self.stats['cpu_seconds'], 3),
+                inflight_cpu_seconds=round(self._inflight, 3),
+                max_inflight_cpu_seconds=self.max_inflight,
+                clients=len(self.bucket_store),
+                cpu_seconds_per_page=round(self.cpu_seconds_per_page, 6),
+                bytes_per_page=round(self.bytes_per_page)
+            )
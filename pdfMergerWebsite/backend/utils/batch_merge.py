@@ -0,0 +1,305 @@
+"""
+Batch merge utility module.
+
+This module merges large batches of document sets offline. A manifest lists
+jobs, each with its ordered inputs and an output path; the jobs run through
+merge_pdfs in a pool of processes, every finished job is appended to a
+checkpoint file so that an interrupted batch resumes where it stopped, and a
+throughput summary is printed at the end.
+
+Run it from the pdfMergerWebsite directory::
+
+    python -m backend.utils.batch_merge manifest.csv --workers 8 --profile balanced
+
+A CSV manifest has ``job``, ``input`` and ``output`` columns with one row per
+input, in merge order. A JSON manifest is a list of objects with ``job``,
+``inputs`` and ``output`` keys. Relative paths are resolved against the
+directory of the manifest.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from .pdf_merger import merge_pdfs
+from .pdf_output import OUTPUT_PROFILES
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Jobs submitted to the pool per worker ahead of the ones running, so that
+# thousands of jobs do not all sit in the executor's queue at once
+JOBS_AHEAD_PER_WORKER = 2
+
+
+class BatchManifestError(ValueError):
+    """The manifest cannot be read or describes an invalid job."""
+
+
+def _resolve(base_dir, path):
+    """Resolve a manifest path against the manifest's directory."""
+    return os.path.normpath(os.path.join(base_dir, os.path.expanduser(path)))
+
+
+def load_manifest(path):
+    """
+    Read the jobs of a manifest.
+
+    Args:
+        path (str): CSV or JSON manifest, told apart by the ``.json`` extension
+
+    Returns:
+        list: Jobs as dicts with ``job``, ``inputs`` and ``output``, in manifest order
+
+    Raises:
+        BatchManifestError: If the manifest is malformed, a JSON job's ``inputs`` is
+            not an array, a job ID repeats with a different output, or a job has
+            fewer than two inputs
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = {}
+    try:
+        with open(path, newline='', encoding='utf-8') as manifest_file:
+            if path.lower().endswith('.json'):
+                entries = json.load(manifest_file)
+                if not isinstance(entries, list):
+                    raise BatchManifestError('A JSON manifest must be a list of jobs')
+                rows = []
+                for entry in entries:
+                    if not isinstance(entry['inputs'], list):
+                        # A string would otherwise be taken as one input per character
+                        raise BatchManifestError(f"Job {entry['job']} must list its inputs as an array")
+                    rows.extend((entry['job'], input_path, entry['output']) for input_path in entry['inputs'])
+            else:
+                rows = [(row['job'], row['input'], row['output']) for row in csv.DictReader(manifest_file)]
+    except (KeyError, TypeError) as ex:
+        raise BatchManifestError(f'Manifest entry is missing {ex}') from ex
+    except (OSError, ValueError) as ex:
+        if isinstance(ex, BatchManifestError):
+            raise
+        raise BatchManifestError(f'Cannot read manifest {path}: {ex}') from ex
+
+    for job_id, input_path, output_path in rows:
+        job_id = str(job_id).strip()
+        if not job_id:
+            raise BatchManifestError('Manifest entry has an empty job ID')
+        output_path = _resolve(base_dir, output_path)
+        job = jobs.setdefault(job_id, {'job': job_id, 'inputs': [], 'output': output_path})
+        if job['output'] != output_path:
+            raise BatchManifestError(f'Job {job_id} names more than one output')
+        job['inputs'].append(_resolve(base_dir, input_path))
+
+    for job in jobs.values():
+        if len(job['inputs']) < 2:
+            raise BatchManifestError(f"Job {job['job']} needs at least two inputs")
+    return list(jobs.values())
+
+
+def load_checkpoint(path):
+    """
+    Read the IDs of the jobs a previous run completed.
+
+    A line cut short by an interruption is ignored, so the job it described
+    simply runs again.
+
+    Args:
+        path (str): Checkpoint file written by run_batch
+
+    Returns:
+        set: IDs of jobs that merged successfully
+    """
+    completed = set()
+    try:
+        with open(path, encoding='utf-8') as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('success'):
+                    completed.add(record['job'])
+    except FileNotFoundError:
+        pass
+    return completed
+
+
+def _init_worker(merge_log_level):
+    """Give a freshly started pool process the parent's merge log level."""
+    logging.getLogger(merge_pdfs.__module__).setLevel(merge_log_level)
+
+
+def run_job(job, merge_options):
+    """
+    Merge one job of the batch.
+
+    This is a top-level function so that it can run in a pool process.
+
+    Args:
+        job (dict): Job from load_manifest
+        merge_options (dict): Keyword arguments for merge_pdfs such as ``profile``
+
+    Returns:
+        dict: Checkpoint record with ``job``, ``success``, ``error``, ``pages``,
+            ``input_bytes``, ``output_bytes`` and ``seconds``; an unexpected
+            exception is recorded as a failure rather than raised
+    """
+    started = time.monotonic()
+    try:
+        result = merge_pdfs(job['inputs'], job['output'], **merge_options)
+    except Exception as ex:  # pylint: disable=broad-except
+        # One job's unexpected failure must not end the whole batch
+        logger.exception("Job %s raised an unexpected error", job['job'])
+        result = {'success': False, 'error': f'{type(ex).__name__}: {ex}'}
+    input_bytes = 0
+    for path in job['inputs']:
+        try:
+            input_bytes += os.path.getsize(path)
+        except OSError:
+            pass
+    return {
+        'job': job['job'],
+        'success': result['success'],
+        'error': result['error'],
+        'pages': result.get('pages', 0),
+        'input_bytes': input_bytes,
+        'output_bytes': result.get('size_bytes', 0),
+        'seconds': round(time.monotonic() - started, 3)
+    }
+
+
+def run_batch(jobs, checkpoint_path, workers=None, merge_options=None, start_method=None):
+    """
+    Run the jobs that the checkpoint does not list as done.
+
+    Every finished job, successful or not, is appended to the checkpoint as a
+    JSON line and flushed to disk before the next one is recorded. Failed jobs
+    are retried by the next run.
+
+    Args:
+        jobs (list): Jobs from load_manifest
+        checkpoint_path (str): File recording finished jobs
+        workers (int, optional): Merge processes; the CPU count by default, 0 to merge inline
+        merge_options (dict, optional): Keyword arguments for merge_pdfs
+        start_method (str, optional): multiprocessing start method, forkserver by default
+
+    Returns:
+        dict: Summary with ``jobs``, ``skipped``, ``succeeded``, ``failed``, ``pages``,
+            ``input_bytes``, ``output_bytes``, ``seconds``, ``jobs_per_second``,
+            ``pages_per_second`` and ``mb_per_second`` (input megabytes)
+    """
+    merge_options = merge_options or {}
+    workers = (os.cpu_count() or 1) if workers is None else max(0, int(workers))
+    completed = load_checkpoint(checkpoint_path)
+    pending = [job for job in jobs if job['job'] not in completed]
+    summary = {'jobs': len(jobs), 'skipped': len(jobs) - len(pending), 'succeeded': 0, 'failed': 0,
+               'pages': 0, 'input_bytes': 0, 'output_bytes': 0}
+    if summary['skipped']:
+        logger.info("Resuming from %s: %d of %d jobs already done",
+                    checkpoint_path, summary['skipped'], len(jobs))
+
+    started = time.monotonic()
+    with open(checkpoint_path, 'a+', encoding='utf-8') as checkpoint_file:
+        # Terminate a line cut short by an interruption so the next record starts cleanly
+        if checkpoint_file.tell():
+            checkpoint_file.seek(checkpoint_file.tell() - 1)
+            if checkpoint_file.read(1) != '\n':
+                checkpoint_file.write('\n')
+
+        def record(result):
+            checkpoint_file.write(json.dumps(result) + '\n')
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+            if result['success']:
+                summary['succeeded'] += 1
+                summary['pages'] += result['pages']
+                summary['input_bytes'] += result['input_bytes']
+                summary['output_bytes'] += result['output_bytes']
+            else:
+                summary['failed'] += 1
+                logger.error("Job %s failed: %s", result['job'], result['error'])
+
+        if workers == 0:
+            for job in pending:
+                record(run_job(job, merge_options))
+        else:
+            if start_method is None:
+                methods = multiprocessing.get_all_start_methods()
+                start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+            context = multiprocessing.get_context(start_method)
+            queue = iter(pending)
+            in_flight = set()
+            merge_log_level = logging.getLogger(merge_pdfs.__module__).level
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=_init_worker, initargs=(merge_log_level,)) as executor:
+                try:
+                    while True:
+                        for job in queue:
+                            in_flight.add(executor.submit(run_job, job, merge_options))
+                            if len(in_flight) >= workers * (1 + JOBS_AHEAD_PER_WORKER):
+                                break
+                        if not in_flight:
+                            break
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record(future.result())
+                except BaseException:
+                    for future in in_flight:
+                        future.cancel()
+                    raise
+
+    seconds = time.monotonic() - started
+    summary['seconds'] = round(seconds, 3)
+    seconds = max(seconds, 1e-9)
+    summary['jobs_per_second'] = round((summary['succeeded'] + summary['failed']) / seconds, 3)
+    summary['pages_per_second'] = round(summary['pages'] / seconds, 3)
+    summary['mb_per_second'] = round(summary['input_bytes'] / 1024 / 1024 / seconds, 3)
+    return summary
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Merge the document sets listed in a manifest.')
+    parser.add_argument('manifest', help='CSV (job,input,output) or JSON manifest')
+    parser.add_argument('--checkpoint', help='checkpoint file (the manifest path plus .checkpoint by default)')
+    parser.add_argument('--workers', type=int, help='merge processes (CPU count by default, 0 to merge inline)')
+    parser.add_argument('--profile', default='fast', choices=sorted(OUTPUT_PROFILES), help='output profile')
+    parser.add_argument('--compression-level', type=int, help='zlib level 1-9 overriding the profile')
+    parser.add_argument('--dedupe', action='store_true', help='share identical resources across inputs')
+    parser.add_argument('--verbose', action='store_true', help='log every file merged')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not args.verbose:
+        # merge_pdfs logs every input at INFO
+        logging.getLogger(merge_pdfs.__module__).setLevel(logging.WARNING)
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except BatchManifestError as ex:
+        logger.error("%s", ex)
+        return 2
+
+    merge_options = {'profile': args.profile, 'dedupe': args.dedupe}
+    if args.compression_level is not None:
+        merge_options['compression_level'] = args.compression_level
+    checkpoint_path = args.checkpoint or args.manifest + '.checkpoint'
+    try:
+        summary = run_batch(jobs, checkpoint_path, args.workers, merge_options)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; rerun the same command to resume from %s", checkpoint_path)
+        return 130
+
+    sys.stdout.write(
+        f"{summary['succeeded']} merged, {summary['failed']} failed, {summary['skipped']} skipped "
+        f"in {summary['seconds']:.1f}s: {summary['jobs_per_second']:.2f} jobs/s, "
+        f"{summary['pages_per_second']:.1f} pages/s, {summary['mb_per_second']:.2f} MB/s\n")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""
+Chunked upload utility module.
+
+This module stores resumable uploads of large PDFs. An upload session fixes
+the file size and chunk size up front; numbered chunks, each with its own
+SHA-256, are written straight to their offset in a preallocated file, in any
+order and as often as needed. A marker file per received chunk records
+progress, so sessions live entirely on disk and any worker process can accept
+the next chunk or report how far an upload has got. A finalized upload is
+verified as a whole and can then be referenced by ID from merge requests.
+"""
+import os
+import re
+import json
+import fcntl
+import time
+import shutil
+import hashlib
+import logging
+import secrets
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Upload IDs are generated by ChunkedUploadStore.create; anything else is rejected before touching the disk
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Bytes read from a request body or the assembled file at a time
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class ChunkedUploadError(Exception):
+    """A chunked upload request cannot be honoured; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _write_json(path, data):
+    """Write a small JSON file atomically."""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as json_file:
+        json.dump(data, json_file)
+    os.replace(temp_path, path)
+
+
+class ChunkedUploadStore:
+    """
+    Directory of resumable upload sessions.
+
+    Each session is a directory holding ``meta.json``, the preallocated
+    ``data.pdf``, a ``chunks`` directory with one empty marker per received
+    chunk, and ``complete.json`` once finalized. Chunk writers hold a shared
+    ``flock`` on the session's ``lock`` file and finalizing holds it
+    exclusively, so no chunk lands in ``data.pdf`` after it was hashed.
+    """
+
+    def __init__(self, directory, max_upload_bytes=1024 * 1024 * 1024, chunk_bytes=8 * 1024 * 1024,
+                 max_chunk_bytes=32 * 1024 * 1024, ttl_seconds=3600):
+        """
+        Args:
+            directory (str): Where sessions are kept; shared by all workers
+            max_upload_bytes (int): Largest file accepted
+            chunk_bytes (int): Chunk size used when a session does not ask for one
+            max_chunk_bytes (int): Largest chunk size a session may ask for
+            ttl_seconds (float): Seconds after creation when a session is deleted
+        """
+        self.directory = directory
+        self.max_upload_bytes = int(max_upload_bytes)
+        self.max_chunk_bytes = int(max_chunk_bytes)
+        self.chunk_bytes = min(int(chunk_bytes), self.max_chunk_bytes)
+        self.ttl_seconds = float(ttl_seconds)
+
+    def _session_dir(self, upload_id):
+        """Return the directory of an existing session, raising 404 for unknown IDs."""
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise ChunkedUploadError(f'Unknown upload {upload_id}', 404)
+        session_dir = os.path.join(self.directory, upload_id)
+        if not os.path.isdir(session_dir):
+            raise ChunkedUploadError(f'Unknown upload {upload_id}', 404)
+        return session_dir
+
+    def _meta(self, upload_id):
+        """Read the metadata of a session, raising 410 once it has expired."""
+        session_dir = self._session_dir(upload_id)
+        try:
+            with open(os.path.join(session_dir, 'meta.json'), encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError) as ex:
+            raise ChunkedUploadError(f'Unknown upload {upload_id}', 404) from ex
+        if meta['expires_at'] < time.time():
+            self.delete(upload_id)
+            raise ChunkedUploadError(f'Upload {upload_id} has expired', 410)
+        return session_dir, meta
+
+    def _flock(self, upload_id, exclusive):
+        """Open and lock a session's lock file, shared by all processes using the directory."""
+        session_dir = self._session_dir(upload_id)
+        try:
+            lock_file = open(os.path.join(session_dir, 'lock'), 'a+b')  # pylint: disable=consider-using-with
+        except FileNotFoundError as ex:
+            # Deleted since the directory was found
+            raise ChunkedUploadError(f'Unknown upload {upload_id}', 404) from ex
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return lock_file
+
+    def create(self, filename, size, chunk_size=None, sha256=None):
+        """
+        Start an upload session.
+
+        Args:
+            filename (str): Name of the file, used as its name in merges
+            size (int): Exact size of the file in bytes
+            chunk_size (int, optional): Size of every chunk but the last
+            sha256 (str, optional): Hex digest the assembled file must have
+
+        Returns:
+            dict: Status of the new session, see status
+
+        Raises:
+            ChunkedUploadError: If a size is out of range or the file is not a PDF by name
+        """
+        if not filename or not filename.lower().endswith('.pdf'):
+            raise ChunkedUploadError(f'Invalid file format: {filename}. Only PDF files are allowed.')
+        try:
+            size = int(size)
+            chunk_size = self.chunk_bytes if chunk_size is None else int(chunk_size)
+        except (TypeError, ValueError) as ex:
+            raise ChunkedUploadError('Size and chunk size must be numbers') from ex
+        if not 0 < size <= self.max_upload_bytes:
+            raise ChunkedUploadError(f'Size must be between 1 and {self.max_upload_bytes} bytes', 413)
+        if not 0 < chunk_size <= self.max_chunk_bytes:
+            raise ChunkedUploadError(f'Chunk size must be between 1 and {self.max_chunk_bytes} bytes')
+        if sha256 is not None and not re.match(r'^[0-9a-f]{64}$', str(sha256).lower()):
+            raise ChunkedUploadError('sha256 must be a hex SHA-256 digest')
+
+        self.purge_expired()
+        upload_id = secrets.token_hex(16)
+        session_dir = os.path.join(self.directory, upload_id)
+        os.makedirs(os.path.join(session_dir, 'chunks'))
+        # Sparse until the chunks arrive; each chunk is written at its own offset
+        with open(os.path.join(session_dir, 'data.pdf'), 'wb') as data_file:
+            data_file.truncate(size)
+        now = time.time()
+        _write_json(os.path.join(session_dir, 'meta.json'), {
+            'filename': filename,
+            'size': size,
+            'chunk_size': chunk_size,
+            'sha256': sha256.lower() if sha256 else None,
+            'created_at': now,
+            'expires_at': now + self.ttl_seconds
+        })
+        logger.info("Created chunked upload %s for %s (%d bytes)", upload_id, filename, size)
+        return self.status(upload_id)
+
+    def write_chunk(self, upload_id, index, stream, sha256):
+        """
+        Store one chunk of an upload.
+
+        The chunk is read from ``stream`` in blocks and written at its offset
+        as it arrives. It only counts as received once its length and digest
+        have been checked, so a broken transfer is simply sent again.
+
+        Args:
+            upload_id (str): Session ID
+            index (int): Zero-based chunk number
+            stream: Binary file object with the chunk's bytes, such as the request body
+            sha256 (str): Hex SHA-256 of the chunk
+
+        Returns:
+            dict: Status of the session, see status
+
+        Raises:
+            ChunkedUploadError: If the session is unknown or finalized, the index is out of
+                range, or the chunk's length or digest is wrong
+        """
+        # Shared, so chunks of one upload are written in parallel but never while it is finalized
+        lock_file = self._flock(upload_id, exclusive=False)
+        try:
+            session_dir, meta = self._meta(upload_id)
+            if os.path.exists(os.path.join(session_dir, 'complete.json')):
+                raise ChunkedUploadError(f'Upload {upload_id} is already complete', 409)
+            if not sha256:
+                raise ChunkedUploadError('The chunk checksum header is missing')
+            chunk_count = -(-meta['size'] // meta['chunk_size'])
+            if not 0 <= index < chunk_count:
+                raise ChunkedUploadError(f'Chunk {index} is out of range 0-{chunk_count - 1}', 416)
+            offset = index * meta['chunk_size']
+            expected = min(meta['chunk_size'], meta['size'] - offset)
+
+            # A resent chunk overwrites the earlier copy, which no longer counts until this one checks out
+            marker = os.path.join(session_dir, 'chunks', str(index))
+            if os.path.exists(marker):
+                os.remove(marker)
+            digest = hashlib.sha256()
+            received = 0
+            descriptor = os.open(os.path.join(session_dir, 'data.pdf'), os.O_WRONLY)
+            try:
+                while received <= expected:
+                    block = stream.read(min(READ_BLOCK_SIZE, expected + 1 - received))
+                    if not block:
+                        break
+                    if received + len(block) <= expected:
+                        os.pwrite(descriptor, block, offset + received)
+                    digest.update(block)
+                    received += len(block)
+                if received == expected:
+                    os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+            if received != expected:
+                raise ChunkedUploadError(f'Chunk {index} must be {expected} bytes, got {received}')
+            if digest.hexdigest() != sha256.lower():
+                raise ChunkedUploadError(f'Checksum mismatch for chunk {index}', 422)
+
+            open(marker, 'wb').close()
+            return self.status(upload_id)
+        finally:
+            lock_file.close()
+
+    def status(self, upload_id):
+        """
+        Describe the progress of an upload.
+
+        Returns:
+            dict: ``upload_id``, ``filename``, ``size``, ``chunk_size``, ``chunk_count``,
+                ``received_chunks`` (count), ``received_offset`` (bytes received
+                without a gap from the start, where a client resumes),
+                ``missing_chunks`` (up to 100 indices), ``expires_at`` and ``complete``,
+                plus ``sha256`` once complete
+
+        Raises:
+            ChunkedUploadError: If the session is unknown or expired
+        """
+        session_dir, meta = self._meta(upload_id)
+        chunk_count = -(-meta['size'] // meta['chunk_size'])
+        received = {int(name) for name in os.listdir(os.path.join(session_dir, 'chunks')) if name.isdigit()}
+        contiguous = 0
+        while contiguous in received:
+            contiguous += 1
+        status = {
+            'upload_id': upload_id,
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'chunk_size': meta['chunk_size'],
+            'chunk_count': chunk_count,
+            'received_chunks': len(received),
+            'received_offset': min(contiguous * meta['chunk_size'], meta['size']),
+            'missing_chunks': [index for index in range(chunk_count) if index not in received][:100],
+            'expires_at': meta['expires_at'],
+            'complete': False
+        }
+        try:
+            with open(os.path.join(session_dir, 'complete.json'), encoding='utf-8') as complete_file:
+                status.update(json.load(complete_file), complete=True)
+        except FileNotFoundError:
+            pass
+        return status
+
+    def finalize(self, upload_id):
+        """
+        Check that every chunk has arrived and verify the assembled file.
+
+        Finalizing a complete upload again just returns its status.
+
+        Returns:
+            dict: Status of the session with ``complete`` and ``sha256``
+
+        Raises:
+            ChunkedUploadError: If chunks are missing, the file is not a PDF, or its
+                digest differs from the one given when the session was created
+        """
+        # Exclusive, so chunks still being written are waited for and later ones see complete.json
+        lock_file = self._flock(upload_id, exclusive=True)
+        try:
+            status = self.status(upload_id)
+            if status['complete']:
+                return status
+            if status['received_chunks'] < status['chunk_count']:
+                raise ChunkedUploadError(
+                    f"Upload {upload_id} is missing {status['chunk_count'] - status['received_chunks']} chunks", 409
+                )
+            session_dir, meta = self._meta(upload_id)
+            digest = hashlib.sha256()
+            with open(os.path.join(session_dir, 'data.pdf'), 'rb') as data_file:
+                header = data_file.read(1024)
+                if b'%PDF-' not in header:
+                    raise ChunkedUploadError(f"{meta['filename']} is not a PDF file")
+                digest.update(header)
+                for block in iter(lambda: data_file.read(READ_BLOCK_SIZE), b''):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+            if meta['sha256'] and meta['sha256'] != sha256:
+                raise ChunkedUploadError(f'Checksum mismatch for upload {upload_id}', 422)
+            _write_json(os.path.join(session_dir, 'complete.json'), {'sha256': sha256})
+            logger.info("Finalized chunked upload %s (%d bytes)", upload_id, meta['size'])
+            return self.status(upload_id)
+        finally:
+            lock_file.close()
+
+    def open(self, upload_id):
+        """
+        Open a finalized upload for merging.
+
+        The returned file stays readable after the session is deleted or expires.
+
+        Returns:
+            tuple: (filename, binary file object, sha256 hex digest)
+
+        Raises:
+            ChunkedUploadError: If the session is unknown, expired or not finalized
+        """
+        status = self.status(upload_id)
+        if not status['complete']:
+            raise ChunkedUploadError(f'Upload {upload_id} is not complete', 409)
+        # pylint: disable=consider-using-with
+        data_file = open(os.path.join(self.directory, upload_id, 'data.pdf'), 'rb')
+        return status['filename'], data_file, status['sha256']
+
+    def delete(self, upload_id):
+        """Delete a session and its data; returns whether it existed."""
+        if not _UPLOAD_ID.match(upload_id or ''):
+            return False
+        session_dir = os.path.join(self.directory, upload_id)
+        if not os.path.isdir(session_dir):
+            return False
+        shutil.rmtree(session_dir, ignore_errors=True)
+        return True
+
+    def purge_expired(self, current_time=None):
+        """
+        Delete the sessions past their expiration.
+
+        Returns:
+            int: Number of sessions deleted
+        """
+        current_time = time.time() if current_time is None else current_time
+        try:
+            upload_ids = [name for name in os.listdir(self.directory) if _UPLOAD_ID.match(name)]
+        except FileNotFoundError:
+            return 0
+        purged = 0
+        for upload_id in upload_ids:
+            try:
+                with open(os.path.join(self.directory, upload_id, 'meta.json'), encoding='utf-8') as meta_file:
+                    expires_at = json.load(meta_file)['expires_at']
+            except (OSError, ValueError, KeyError):
+                # A session being created has no metadata yet; judge it by its directory's age
+                try:
+                    expires_at = os.path.getmtime(os.path.join(self.directory, upload_id)) + self.ttl_seconds
+                except OSError:
+                    continue
+            if expires_at < current_time and self.delete(upload_id):
+                purged += 1
+        if purged:
+            logger.info("Purged %d expired chunked uploads", purged)
+        return purged
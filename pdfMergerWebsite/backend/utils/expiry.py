@@ -0,0 +1,216 @@
+"""
+PDF expiry utility module.
+
+This module keeps stored PDFs ordered by expiration time in a min-heap and runs
+a background reaper that removes them as they expire, so request handlers never
+scan the store.
+"""
+import os
+import time
+import heapq
+import logging
+import threading
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+
+class ExpiryIndex:
+    """
+    Min-heap of (expiration, pdf_id) pairs.
+
+    Rescheduling or discarding an ID does not touch the heap; stale heap items
+    are recognised by comparing them with the current deadline of their ID and
+    skipped when they reach the top. Popping expired IDs therefore costs
+    O(k log n) for k expired entries instead of a scan of the whole store.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, pdf_id, expiration):
+        """
+        Set or replace the expiration time of an ID.
+
+        Args:
+            pdf_id (str): ID of the PDF
+            expiration (float): Unix time at which the PDF expires
+        """
+        with self._lock:
+            self._deadlines[pdf_id] = expiration
+            heapq.heappush(self._heap, (expiration, pdf_id))
+
+    def discard(self, pdf_id):
+        """
+        Stop tracking an ID.
+
+        Args:
+            pdf_id (str): ID of the PDF
+        """
+        with self._lock:
+            self._deadlines.pop(pdf_id, None)
+
+    def next_expiration(self):
+        """
+        Return the earliest pending expiration time.
+
+        Returns:
+            float: Unix time, or None if nothing is scheduled
+        """
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, current_time):
+        """
+        Remove and return every ID whose expiration has passed.
+
+        Args:
+            current_time (float): Reference time
+
+        Returns:
+            list: (pdf_id, expiration) pairs in expiration order
+        """
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= current_time:
+                expiration, pdf_id = heapq.heappop(self._heap)
+                if self._deadlines.get(pdf_id) == expiration:
+                    del self._deadlines[pdf_id]
+                    expired.append((pdf_id, expiration))
+        return expired
+
+    def _drop_stale(self):
+        """Pop heap items that no longer match their ID's deadline."""
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._deadlines)
+
+
+class ExpiryReaper:
+    """
+    Background thread that expires PDFs when their deadline passes.
+
+    The thread sleeps until the earliest scheduled expiration (or the next
+    sweep), then hands the expired IDs to ``on_expired``. Scheduling an earlier
+    deadline wakes it up. An optional ``sweep`` callback runs every
+    ``sweep_interval`` seconds for stores that other processes also write to.
+    """
+
+    def __init__(self, index, on_expired, sweep=None, sweep_interval=60.0):
+        """
+        Args:
+            index (ExpiryIndex): Index holding the scheduled expirations
+            on_expired (callable): Called with the list of expired IDs and the current time
+            sweep (callable, optional): Called with the current time every sweep interval
+            sweep_interval (float): Seconds between sweeps, and the longest the thread sleeps
+        """
+        self.index = index
+        self.on_expired = on_expired
+        self.sweep = sweep
+        self.sweep_interval = sweep_interval
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self.stats = {
+            'runs': 0,
+            'expired': 0,
+            'last_run': None,
+            'last_lag_seconds': 0.0
+        }
+
+    def start(self):
+        """Start the reaper thread in the current process."""
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stopping = False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='pdf-expiry-reaper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the reaper thread."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def schedule(self, pdf_id, expiration):
+        """
+        Track a PDF and wake the reaper if it now has an earlier deadline.
+
+        Args:
+            pdf_id (str): ID of the PDF
+            expiration (float): Unix time at which the PDF expires
+        """
+        self.index.schedule(pdf_id, expiration)
+        # Threads do not survive a fork, so a preloaded app restarts its reaper here
+        if self._pid != os.getpid():
+            self.start()
+        with self._condition:
+            self._condition.notify()
+
+    def discard(self, pdf_id):
+        """
+        Stop tracking a PDF that was removed by other means.
+
+        Args:
+            pdf_id (str): ID of the PDF
+        """
+        self.index.discard(pdf_id)
+
+    def run_once(self, current_time=None, sweep=True):
+        """
+        Expire everything that is due and optionally run the sweep.
+
+        Args:
+            current_time (float, optional): Reference time
+            sweep (bool): Whether to run the sweep callback as well
+
+        Returns:
+            int: Number of IDs handed to ``on_expired``
+        """
+        if current_time is None:
+            current_time = time.time()
+        expired = self.index.pop_expired(current_time)
+        if expired:
+            self.stats['last_lag_seconds'] = current_time - expired[0][1]
+            self.on_expired([pdf_id for pdf_id, _ in expired], current_time)
+        if sweep and self.sweep is not None:
+            self.sweep(current_time)
+        self.stats['runs'] += 1
+        self.stats['expired'] += len(expired)
+        self.stats['last_run'] = current_time
+        return len(expired)
+
+    def _run(self):
+        """Sleep until the next deadline or sweep, then expire what is due."""
+        next_sweep = time.time() + self.sweep_interval
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    next_expiration = self.index.next_expiration()
+                    wake_at = next_sweep if next_expiration is None else min(next_expiration, next_sweep)
+                    remaining = wake_at - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._stopping:
+                    return
+            current_time = time.time()
+            sweep_due = current_time >= next_sweep
+            if sweep_due:
+                next_sweep = current_time + self.sweep_interval
+            try:
+                self.run_once(current_time, sweep=sweep_due)
+            except Exception as ex:  # pylint: disable=broad-except
+                # The reaper must keep running whatever a single pass runs into
+                logger.exception("Expiry reaper pass failed: %s", str(ex))
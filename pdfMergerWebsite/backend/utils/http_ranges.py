@@ -0,0 +1,117 @@
+"""
+HTTP byte range utility module.
+
+This module resolves ``Range`` headers against an in-memory document and
+produces response bodies for full, single-range and multi-range responses as
+chunk iterators over a memoryview, so the stored buffer is never copied whole.
+"""
+import logging
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Requests asking for more ranges than this are answered with the full document
+MAX_RANGES = 16
+
+
+def resolve_byte_ranges(range_header, length):
+    """
+    Turn a parsed Range header into concrete byte ranges.
+
+    Ranges that start beyond the end of the document are dropped, ends are
+    clipped to the document, and overlapping or adjacent ranges are coalesced.
+
+    Args:
+        range_header (werkzeug.datastructures.Range): Parsed header from ``request.range``
+        length (int): Size of the document in bytes
+
+    Returns:
+        list: Sorted (start, stop) pairs with ``stop`` exclusive; empty if none is satisfiable,
+            or None if the header should be ignored and the full document sent
+    """
+    if range_header is None or range_header.units != 'bytes' or len(range_header.ranges) > MAX_RANGES:
+        return None
+
+    resolved = []
+    for start, stop in range_header.ranges:
+        if start < 0:
+            # Suffix range: the last -start bytes
+            start, stop = max(0, length + start), length
+        elif stop is None or stop > length:
+            stop = length
+        if start < stop:
+            resolved.append((start, stop))
+
+    resolved.sort()
+    coalesced = []
+    for start, stop in resolved:
+        if coalesced and start <= coalesced[-1][1]:
+            coalesced[-1] = (coalesced[-1][0], max(coalesced[-1][1], stop))
+        else:
+            coalesced.append((start, stop))
+    return coalesced
+
+
+def content_range(start, stop, length):
+    """
+    Format a Content-Range header value.
+
+    Args:
+        start (int): First byte of the range
+        stop (int): Byte after the last byte of the range
+        length (int): Size of the document in bytes
+
+    Returns:
+        str: Header value such as ``bytes 0-99/1000``
+    """
+    return f'bytes {start}-{stop - 1}/{length}'
+
+
+def iter_buffer(buffer, start, stop, chunk_size=64 * 1024):
+    """
+    Yield a slice of a buffer in chunks.
+
+    Args:
+        buffer (memoryview): The document
+        start (int): First byte to send
+        stop (int): Byte after the last byte to send
+        chunk_size (int): Size of the yielded chunks
+
+    Yields:
+        bytes: Consecutive chunks of the slice
+    """
+    for offset in range(start, stop, chunk_size):
+        yield buffer[offset:min(offset + chunk_size, stop)].tobytes()
+
+
+def multipart_byteranges(buffer, ranges, boundary, content_type, chunk_size=64 * 1024):
+    """
+    Build a ``multipart/byteranges`` body for several ranges.
+
+    Args:
+        buffer (memoryview): The document
+        ranges (list): (start, stop) pairs from resolve_byte_ranges
+        boundary (str): Multipart boundary, also sent in the Content-Type header
+        content_type (str): Media type of the document
+        chunk_size (int): Size of the yielded data chunks
+
+    Returns:
+        tuple: (Content-Length of the body, iterator over the body's chunks)
+    """
+    length = len(buffer)
+    part_headers = [
+        (f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+         f'Content-Range: {content_range(start, stop, length)}\r\n\r\n').encode('ascii')
+        for start, stop in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    body_length = (sum(len(header) for header in part_headers)
+                   + sum(stop - start for start, stop in ranges) + len(closing))
+
+    def generate():
+        for header, (start, stop) in zip(part_headers, ranges):
+            yield header
+            yield from iter_buffer(buffer, start, stop, chunk_size)
+        yield closing
+
+    return body_length, generate()
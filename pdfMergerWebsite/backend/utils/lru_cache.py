@@ -0,0 +1,166 @@
+"""
+LRU cache utility module.
+
+This module provides a thread-safe least-recently-used cache whose capacity is
+expressed as a byte budget rather than an entry count, so large and small values
+can share the same cache fairly.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+
+class LRUByteCache:
+    """
+    Least-recently-used cache bounded by the total size of its values.
+
+    Every entry is stored together with the size it was declared with. When the
+    sum of those sizes exceeds ``max_bytes`` the least recently used entries are
+    evicted until the cache fits again. A ``max_bytes`` of zero disables the cache.
+    """
+
+    def __init__(self, max_bytes, name='cache'):
+        """
+        Create an empty cache.
+
+        Args:
+            max_bytes (int): Maximum total size of all cached values in bytes
+            name (str): Name used in log messages
+        """
+        self.max_bytes = max(0, int(max_bytes))
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self):
+        """bool: True if the cache can hold anything at all."""
+        return self.max_bytes > 0
+
+    def get(self, key):
+        """
+        Look up a value and mark it as most recently used.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def peek(self, key):
+        """
+        Look up a value without counting a hit or miss or marking it as used.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None if there is none
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def take(self, key):
+        """
+        Remove a value from the cache and return it, counting a hit or a miss.
+
+        For values that must not be used by two threads at once: the taker
+        has sole use of the value until it puts it back.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._current_bytes -= entry[1]
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, value, size_bytes):
+        """
+        Insert or replace a value, evicting older entries if needed.
+
+        Values larger than the whole budget are not cached.
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            size_bytes (int): Size charged against the byte budget
+
+        Returns:
+            bool: True if the value was cached, False otherwise
+        """
+        if not self.enabled or size_bytes > self.max_bytes:
+            return False
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._current_bytes -= previous[1]
+
+            self._entries[key] = (value, size_bytes)
+            self._current_bytes += size_bytes
+
+            while self._current_bytes > self.max_bytes:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self._current_bytes -= evicted_size
+                self._evictions += 1
+                logger.debug("Evicted %s from %s (%d bytes)", evicted_key, self.name, evicted_size)
+
+        return True
+
+    def clear(self):
+        """Remove every entry, keeping the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self):
+        """
+        Report cache usage counters.
+
+        Returns:
+            dict: Entry count, byte usage, hits, misses, evictions and hit rate
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
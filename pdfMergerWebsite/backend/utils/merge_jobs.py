@@ -0,0 +1,148 @@
+"""
+Asynchronous merge job utility module.
+
+This module runs merges on background threads and records their status, so an
+upload request can return a job ID immediately and clients can poll for the
+outcome.
+"""
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class MergeJobQueue:
+    """
+    Background executor for merge jobs with pollable status.
+
+    Job status records are plain dictionaries kept in ``status_store``, which
+    can be any mutable mapping: a dict for a single process, or a store shared
+    between workers so that any worker can answer a status poll. Progress
+    updates are throttled so that a shared store is not written for every page.
+    Finished jobs get an ``expires_at`` ``retention_seconds`` after they complete
+    and are forgotten after it; stores with a ``purge_expired`` method delete
+    them themselves, as the SQLite store does with one indexed DELETE.
+    """
+
+    def __init__(self, status_store=None, max_workers=2, retention_seconds=3600,
+                 progress_interval=0.5):
+        """
+        Args:
+            status_store (MutableMapping, optional): Where job status records live
+            max_workers (int): Number of merges that run at the same time
+            retention_seconds (float): How long finished jobs remain pollable
+            progress_interval (float): Minimum seconds between progress writes
+        """
+        self.status_store = status_store if status_store is not None else {}
+        self.max_workers = max(1, int(max_workers))
+        self.retention_seconds = retention_seconds
+        self.progress_interval = progress_interval
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        """Create the executor on first use, after any worker fork."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='merge-job')
+            return self._executor
+
+    def submit(self, work, cleanup=None):
+        """
+        Queue a merge.
+
+        ``work`` is called on a background thread with a ``report_progress``
+        callback taking (pages_done, pages_total, phase). It returns a dict that is
+        merged into the final status record, e.g. the download link.
+
+        Args:
+            work (callable): The merge to run
+            cleanup (callable, optional): Called after the job finishes either way
+
+        Returns:
+            str: ID of the new job
+        """
+        self._prune()
+        job_id = uuid.uuid4().hex[:12]
+        current_time = time.time()
+        self.status_store[job_id] = {
+            'job_id': job_id,
+            'status': JOB_QUEUED,
+            'progress': {'pages_done': 0, 'pages_total': None, 'phase': None},
+            'created_at': current_time,
+            'updated_at': current_time
+        }
+        self._get_executor().submit(self._run, job_id, work, cleanup)
+        logger.info("Queued merge job %s", job_id)
+        return job_id
+
+    def get(self, job_id):
+        """
+        Look up a job's status record.
+
+        Args:
+            job_id (str): ID returned by ``submit``
+
+        Returns:
+            dict: Status record, or None if the job is unknown or was pruned
+        """
+        return self.status_store.get(job_id)
+
+    def _update(self, job_id, **changes):
+        """Write changed fields of a status record back to the store."""
+        status = self.status_store.get(job_id)
+        if status is None:
+            return
+        status.update(changes)
+        status['updated_at'] = time.time()
+        self.status_store[job_id] = status
+
+    def _run(self, job_id, work, cleanup):
+        """Run one job on an executor thread and record its outcome."""
+        last_report = [0.0]
+
+        def report_progress(pages_done, pages_total, phase='merging'):
+            now = time.monotonic()
+            if now - last_report[0] < self.progress_interval and pages_done < pages_total:
+                return
+            last_report[0] = now
+            self._update(job_id, progress={'pages_done': pages_done, 'pages_total': pages_total, 'phase': phase})
+
+        self._update(job_id, status=JOB_RUNNING, started_at=time.time())
+        try:
+            result = work(report_progress)
+            finished_at = time.time()
+            self._update(job_id, status=JOB_DONE, finished_at=finished_at,
+                         expires_at=finished_at + self.retention_seconds, **result)
+            logger.info("Merge job %s finished", job_id)
+        except Exception as ex:  # pylint: disable=broad-except
+            # Any failure inside the merge is reported to the polling client
+            logger.exception("Merge job %s failed: %s", job_id, str(ex))
+            finished_at = time.time()
+            self._update(job_id, status=JOB_FAILED, finished_at=finished_at,
+                         expires_at=finished_at + self.retention_seconds, error=str(ex))
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    def _prune(self):
+        """Forget finished jobs whose retention period is over."""
+        current_time = time.time()
+        purge_expired = getattr(self.status_store, 'purge_expired', None)
+        if purge_expired is not None:
+            purge_expired(current_time)
+            return
+        for job_id in list(self.status_store):
+            status = self.status_store.get(job_id)
+            if status and status.get('expires_at') and status['expires_at'] < current_time:
+                self.status_store.pop(job_id, None)
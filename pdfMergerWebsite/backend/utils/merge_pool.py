@@ -0,0 +1,276 @@
+"""
+Merge pool utility module.
+
+This module runs CPU-bound merges in a pool of worker processes with a bounded
+number of admitted tasks, so that parsing and writing PDFs is not serialised by
+the GIL of the web worker and bursts are turned away instead of queuing without
+limit.
+"""
+import os
+import math
+import time
+import atexit
+import contextlib
+import logging
+import threading
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Progress queue inherited by pool processes, set by _init_worker
+_worker_progress_queue = None
+
+
+class MergePoolBusy(Exception):
+    """The pool has no free slot; carries the suggested Retry-After in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Merge queue is full, retry in {retry_after} seconds')
+        self.retry_after = retry_after
+
+    def __reduce__(self):
+        return (self.__class__, (self.retry_after,))
+
+
+def _init_worker(progress_queue, initializer=None, initargs=()):
+    """Remember the progress queue in a freshly started pool process and run the pool's initializer."""
+    global _worker_progress_queue  # pylint: disable=global-statement
+    _worker_progress_queue = progress_queue
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _call_in_worker(task_id, fn, args):
+    """Run a task in a pool process, forwarding its progress to the parent."""
+    def report_progress(*progress_args):
+        _worker_progress_queue.put((task_id, progress_args))
+
+    try:
+        return fn(*args, progress=report_progress)
+    finally:
+        # Tells the parent that no progress for this task is still in flight
+        _worker_progress_queue.put((task_id, None))
+
+
+class MergePool:
+    """
+    Process pool for merge tasks with admission control.
+
+    At most ``max_workers + max_queued`` tasks are admitted at any time; a
+    non-blocking ``run`` beyond that raises MergePoolBusy with a Retry-After
+    estimate derived from recent task durations. Task functions must be
+    picklable top-level functions accepting a ``progress`` keyword argument.
+    With ``max_workers=0`` tasks run inline in the calling thread, still subject
+    to the admission limit, which suits tests and single-process deployments.
+
+    The executor is created on first use, so a pool built before gunicorn forks
+    its workers gets one executor per worker. If a pool process dies, the task
+    it was running fails with BrokenProcessPool and the next task starts a new
+    executor.
+    """
+
+    def __init__(self, max_workers=2, max_queued=8, start_method=None, initializer=None, initargs=()):
+        """
+        Args:
+            max_workers (int): Number of merge processes, 0 to merge inline
+            max_queued (int): Admitted tasks allowed to wait for a process
+            start_method (str, optional): multiprocessing start method, forkserver by default
+            initializer (callable, optional): Picklable function run with ``initargs`` in every
+                pool process as it starts, or once in this process when merging inline
+            initargs (tuple): Arguments for ``initializer``
+        """
+        self.max_workers = max(0, int(max_workers))
+        self.max_queued = max(0, int(max_queued))
+        self.capacity = max(1, self.max_workers + self.max_queued)
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self.start_method = start_method
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        if self.inline and initializer is not None:
+            initializer(*self.initargs)
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._progress_queue = None
+        self._progress_callbacks = {}
+        self._task_ids = itertools.count(1)
+        self._in_flight = 0
+        self._average_seconds = None
+        self.stats = {
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0
+        }
+
+    @property
+    def inline(self):
+        """bool: Whether tasks run in the calling process."""
+        return self.max_workers == 0
+
+    def _get_executor(self):
+        """Create the process pool and progress listener for this process."""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                context = multiprocessing.get_context(self.start_method)
+                self._progress_queue = context.SimpleQueue()
+                self._progress_callbacks = {}
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._progress_queue, self.initializer, self.initargs)
+                )
+                self._pid = os.getpid()
+                threading.Thread(target=self._dispatch_progress, args=(self._progress_queue,),
+                                 name='merge-pool-progress', daemon=True).start()
+                atexit.register(self.shutdown)
+            return self._executor
+
+    def _dispatch_progress(self, progress_queue):
+        """Hand progress messages from pool processes to their callbacks."""
+        while True:
+            message = progress_queue.get()
+            if message is None:
+                return
+            task_id, progress_args = message
+            callback, finished = self._progress_callbacks.get(task_id, (None, None))
+            if progress_args is None:
+                if finished is not None:
+                    finished.set()
+            elif callback is not None:
+                try:
+                    callback(*progress_args)
+                except Exception as ex:  # pylint: disable=broad-except
+                    # A failing progress callback must not stop the listener
+                    logger.warning("Progress callback failed: %s", str(ex))
+
+    def retry_after(self):
+        """
+        Estimate how long until a slot frees up.
+
+        Returns:
+            int: Whole seconds, at least 1
+        """
+        average = self._average_seconds or 1.0
+        waves = (self._in_flight - self.capacity + 1) / max(1, self.max_workers or 1)
+        return max(1, math.ceil(average * max(1.0, waves)))
+
+    @contextlib.contextmanager
+    def admit(self, block=False):
+        """
+        Hold one of the pool's slots for work done by the caller.
+
+        ``run`` uses this for pool tasks; work that has to run in the calling
+        process, such as streaming a response, uses it directly so that it
+        counts against the same limit.
+
+        Args:
+            block (bool): Wait for a free slot instead of raising MergePoolBusy
+
+        Raises:
+            MergePoolBusy: If ``block`` is false and every slot is taken
+        """
+        if not self._slots.acquire(blocking=block):
+            self.stats['rejected'] += 1
+            retry_after = self.retry_after()
+            logger.warning("Merge pool full (%d tasks), rejecting with Retry-After %d",
+                           self._in_flight, retry_after)
+            raise MergePoolBusy(retry_after)
+        with self._lock:
+            self._in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+            self.stats['completed'] += 1
+        except BaseException:
+            self.stats['failed'] += 1
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._in_flight -= 1
+                # Exponentially weighted so the estimate follows the current load
+                if self._average_seconds is None:
+                    self._average_seconds = elapsed
+                else:
+                    self._average_seconds = 0.8 * self._average_seconds + 0.2 * elapsed
+            self._slots.release()
+
+    def run(self, fn, *args, progress=None, block=False):
+        """
+        Run a task in the pool and wait for its result.
+
+        Args:
+            fn (callable): Top-level function taking ``*args`` and a ``progress`` keyword
+            *args: Picklable arguments for ``fn``
+            progress (callable, optional): Receives the arguments ``fn`` reports progress with
+            block (bool): Wait for a free slot instead of raising MergePoolBusy
+
+        Returns:
+            Whatever ``fn`` returns; exceptions raised by ``fn`` propagate
+
+        Raises:
+            MergePoolBusy: If ``block`` is false and every slot is taken
+            BrokenProcessPool: If a pool process died while the task was admitted
+        """
+        with self.admit(block):
+            if self.inline:
+                return fn(*args, progress=progress or (lambda *_: None))
+            executor = self._get_executor()
+            task_id = next(self._task_ids)
+            finished = threading.Event()
+            self._progress_callbacks[task_id] = (progress, finished)
+            try:
+                result = executor.submit(_call_in_worker, task_id, fn, args).result()
+                # Deliver the task's last progress report before returning its result
+                finished.wait(timeout=5)
+                return result
+            except BrokenProcessPool:
+                logger.error("A merge process died, replacing the merge pool")
+                self._discard_executor(executor)
+                raise
+            finally:
+                self._progress_callbacks.pop(task_id, None)
+
+    def _discard_executor(self, executor):
+        """Drop a broken executor so that the next task builds a new one."""
+        with self._lock:
+            if self._executor is not executor:
+                # Another thread already replaced it
+                return
+            self._executor = None
+            progress_queue, self._progress_queue = self._progress_queue, None
+        executor.shutdown(wait=False)
+        progress_queue.put(None)
+
+    def snapshot(self):
+        """
+        Report the pool's configuration, load and counters.
+
+        Returns:
+            dict: Pool statistics
+        """
+        return {
+            'workers': self.max_workers,
+            'capacity': self.capacity,
+            'in_flight': self._in_flight,
+            'average_task_seconds': round(self._average_seconds or 0.0, 4),
+            **self.stats
+        }
+
+    def shutdown(self):
+        """Stop the pool processes and the progress listener."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            progress_queue, self._progress_queue = self._progress_queue, None
+            owned = self._pid == os.getpid()
+        if executor is not None and owned:
+            executor.shutdown(wait=True)
+            progress_queue.put(None)
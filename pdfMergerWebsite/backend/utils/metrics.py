@@ -0,0 +1,336 @@
+"""
+Metrics utility module.
+
+This module collects latency and size histograms, counters and gauges and renders them
+in the Prometheus text exposition format. Every gunicorn worker keeps its own
+numbers in memory and periodically writes a snapshot file to a shared
+directory; a scrape served by any worker adds up the snapshots of all of them.
+"""
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from fast page-range merges to large documents
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Upper bounds in bytes, 10 KB to 100 MB
+SIZE_BUCKETS = (10e3, 100e3, 500e3, 1e6, 5e6, 10e6, 25e6, 50e6, 100e6)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values."""
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        """
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            buckets (tuple): Sorted upper bounds; a +Inf bucket is added
+        """
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        """Return a context manager observing the seconds its block takes."""
+        return _Timer(self)
+
+    def snapshot(self):
+        """dict: Per-bucket counts (not cumulative) and the sum of observations."""
+        with self._lock:
+            return {'buckets': list(self.buckets), 'counts': list(self._counts), 'sum': self._sum}
+
+
+class _Timer:
+    """Context manager feeding elapsed seconds into a histogram."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+def _pid_alive(pid):
+    """Return whether a process with this ID exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """
+    Histograms, counters and gauges of one process, aggregated across processes on scrape.
+
+    Snapshots are named after the parent (gunicorn master) and the worker
+    process, so workers of one server instance are added up and files left by
+    an earlier instance are ignored and cleaned up. Only live workers count:
+    the snapshot of a worker that has exited is deleted when a scrape finds
+    it, so histograms and counters drop by its share, which Prometheus treats
+    as a counter reset. Counters and gauges are read through callables when a
+    snapshot is taken. Counters are summed; gauges are combined with ``sum``
+    (per-worker values such as in-memory store sizes) or ``max`` (values every
+    worker sees alike, or worst-case lag).
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        """
+        Args:
+            directory (str, optional): Shared snapshot directory; None for a single process
+            flush_interval (float): Seconds between snapshot writes
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._started_pid = None
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS):
+        """
+        Register a histogram, or return the one already registered under ``name``.
+
+        Returns:
+            Histogram: The histogram to observe values with
+        """
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, documentation, buckets)
+            return self._histograms[name]
+
+    def counter(self, name, documentation, read):
+        """
+        Register a counter whose running total is read when a snapshot is taken.
+
+        Args:
+            name (str): Metric name, ending in ``_total``
+            documentation (str): HELP text
+            read (callable): Returns this process's total, which must never decrease
+        """
+        if not name.endswith('_total'):
+            raise ValueError(f'Counter name {name!r} must end in _total')
+        with self._lock:
+            self._counters[name] = (documentation, read)
+
+    def gauge(self, name, documentation, read, aggregate='sum'):
+        """
+        Register a gauge whose value is read when a snapshot is taken.
+
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            read (callable): Returns the current value, or None if there is none
+            aggregate (str): ``sum`` or ``max`` across workers
+        """
+        if aggregate not in ('sum', 'max'):
+            raise ValueError(f'Unknown gauge aggregation {aggregate!r}')
+        with self._lock:
+            self._gauges[name] = (documentation, read, aggregate)
+
+    def snapshot(self):
+        """
+        Capture the current values of this process.
+
+        Returns:
+            dict: ``histograms``, ``counters`` and ``gauges`` keyed by metric name
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+            counter_names = set(self._counters)
+            readers = {name: counter[1] for name, counter in self._counters.items()}
+            readers.update({name: gauge[1] for name, gauge in self._gauges.items()})
+        values = {}
+        for name, read in readers.items():
+            try:
+                value = read()
+            except Exception as ex:  # pylint: disable=broad-except
+                # One broken metric must not take the whole scrape down
+                logger.warning("Could not read metric %s: %s", name, str(ex))
+                continue
+            if value is not None:
+                values[name] = float(value)
+        return {
+            'histograms': {name: histogram.snapshot() for name, histogram in histograms.items()},
+            'counters': {name: value for name, value in values.items() if name in counter_names},
+            'gauges': {name: value for name, value in values.items() if name not in counter_names}
+        }
+
+    def _snapshot_path(self, pid=None):
+        return os.path.join(self.directory, f'metrics-{os.getppid()}-{pid or os.getpid()}.json')
+
+    def flush(self):
+        """Write this process's snapshot to the shared directory."""
+        if self.directory is None:
+            return
+        path = self._snapshot_path()
+        temporary_path = f'{path}.tmp'
+        try:
+            with open(temporary_path, 'w', encoding='utf-8') as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            os.replace(temporary_path, path)
+        except OSError as ex:
+            logger.warning("Could not write metrics snapshot %s: %s", path, str(ex))
+
+    def _read_snapshots(self):
+        """Return (pid, snapshot) pairs of the live workers of this server instance, deleting the others."""
+        own = (os.getpid(), self.snapshot())
+        if self.directory is None:
+            return [own]
+        self.flush()
+        prefix = f'metrics-{os.getppid()}-'
+        snapshots = [own]
+        try:
+            names = os.listdir(self.directory)
+        except OSError as ex:
+            logger.warning("Could not list metrics directory %s: %s", self.directory, str(ex))
+            return snapshots
+        for name in names:
+            if not name.startswith(prefix) or not name.endswith('.json'):
+                continue
+            pid = int(name[len(prefix):-len('.json')])
+            if pid == os.getpid():
+                continue
+            path = os.path.join(self.directory, name)
+            if not _pid_alive(pid):
+                # gunicorn replaces exited workers; their last values must not count forever
+                try:
+                    os.remove(path)
+                except OSError as ex:
+                    logger.debug("Could not remove metrics snapshot %s: %s", name, str(ex))
+                continue
+            try:
+                with open(path, encoding='utf-8') as snapshot_file:
+                    snapshots.append((pid, json.load(snapshot_file)))
+            except (OSError, ValueError) as ex:
+                logger.debug("Skipping metrics snapshot %s: %s", name, str(ex))
+        return snapshots
+
+    def collect(self):
+        """
+        Combine the snapshots of all workers.
+
+        Returns:
+            dict: ``histograms`` with summed bucket counts, summed ``counters`` and
+                ``gauges`` combined per their aggregation
+        """
+        with self._lock:
+            gauge_modes = {name: aggregate for name, (_, _, aggregate) in self._gauges.items()}
+        histograms = {}
+        counters = {}
+        gauges = {}
+        for pid, snapshot in self._read_snapshots():
+            for name, values in snapshot.get('histograms', {}).items():
+                combined = histograms.get(name)
+                if combined is None:
+                    histograms[name] = {'buckets': values['buckets'], 'counts': list(values['counts']),
+                                        'sum': values['sum']}
+                elif combined['buckets'] == values['buckets']:
+                    combined['counts'] = [a + b for a, b in zip(combined['counts'], values['counts'])]
+                    combined['sum'] += values['sum']
+            for name, value in snapshot.get('counters', {}).items():
+                counters[name] = counters.get(name, 0.0) + value
+            for name, value in snapshot.get('gauges', {}).items():
+                if name not in gauges:
+                    gauges[name] = value
+                elif gauge_modes.get(name, 'sum') == 'max':
+                    gauges[name] = max(gauges[name], value)
+                else:
+                    gauges[name] += value
+        return {'histograms': histograms, 'counters': counters, 'gauges': gauges}
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+            str: The exposition
+        """
+        collected = self.collect()
+        with self._lock:
+            documentation = {name: histogram.documentation for name, histogram in self._histograms.items()}
+            documentation.update({name: counter[0] for name, counter in self._counters.items()})
+            documentation.update({name: gauge[0] for name, gauge in self._gauges.items()})
+        lines = []
+        for name in sorted(collected['histograms']):
+            values = collected['histograms'][name]
+            lines.append(f'# HELP {name} {documentation.get(name, name)}')
+            lines.append(f'# TYPE {name} histogram')
+            cumulative = 0
+            for bound, count in zip(values['buckets'] + ['+Inf'], values['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{_format_number(bound)}"}} {cumulative}')
+            lines.append(f'{name}_sum {_format_number(values["sum"])}')
+            lines.append(f'{name}_count {cumulative}')
+        for kind in ('counter', 'gauge'):
+            values = collected[f'{kind}s']
+            for name in sorted(values):
+                lines.append(f'# HELP {name} {documentation.get(name, name)}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {_format_number(values[name])}')
+        return '\n'.join(lines) + '\n'
+
+    def start(self):
+        """Start writing snapshots in the background; call once per process."""
+        if self.directory is None or self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_stale_snapshots()
+        threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+
+    def _remove_stale_snapshots(self):
+        """Delete snapshots of earlier server instances whose workers are gone."""
+        current_prefix = f'metrics-{os.getppid()}-'
+        for name in os.listdir(self.directory):
+            if not name.startswith('metrics-') or name.startswith(current_prefix):
+                continue
+            try:
+                pid = int(name.split('-')[2].split('.')[0])
+            except (IndexError, ValueError):
+                continue
+            if not _pid_alive(pid):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def _format_number(value):
+    """Format a sample value or bucket bound the way Prometheus clients do."""
+    if isinstance(value, str):
+        return value
+    if float(value).is_integer():
+        return f'{float(value):.1f}'
+    return repr(float(value))
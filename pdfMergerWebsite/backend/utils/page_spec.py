@@ -0,0 +1,184 @@
+"""
+Page selection utility module.
+
+This module parses page-range specifications such as ``1-3,10,-1`` and merge
+specs that pick and reorder pages across several inputs, and looks pages up in
+a PDF's page tree without flattening the whole tree first.
+"""
+import re
+import logging
+from pypdf import PageObject
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# A page number or range; negative numbers count from the last page (-1 is the last)
+_RANGE_ITEM = re.compile(r'^(?P<start>-?\d+)(?P<dash>-(?P<end>-?\d+)?)?$')
+
+# Page attributes a /Page inherits from its /Pages ancestors
+INHERITABLE_PAGE_ATTRIBUTES = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+
+
+class PageSpecError(ValueError):
+    """A page range or merge spec is malformed or names pages that do not exist."""
+
+
+def _page_number(number, page_count, spec):
+    """Convert a 1-based or negative page number into a 0-based index."""
+    index = number - 1 if number > 0 else page_count + number
+    if number == 0 or not 0 <= index < page_count:
+        raise PageSpecError(f"Page {number} in '{spec}' is outside 1-{page_count}")
+    return index
+
+
+def parse_page_ranges(spec, page_count):
+    """
+    Resolve a page-range specification against a document.
+
+    Items are separated by commas: ``N`` selects one page, ``A-B`` a range
+    (descending when A > B), ``A-`` everything from A on. Negative numbers count
+    from the end, so ``-1`` is the last page and ``-3--1`` the last three.
+
+    Args:
+        spec (str): The specification, e.g. ``1-3,10,-1``
+        page_count (int): Number of pages in the document
+
+    Returns:
+        list: 0-based page indices in the requested order
+
+    Raises:
+        PageSpecError: If the specification is malformed or out of range
+    """
+    indices = []
+    for item in str(spec).replace(' ', '').split(','):
+        match = _RANGE_ITEM.match(item)
+        if not match:
+            raise PageSpecError(f"Invalid page range '{item}' in '{spec}'")
+        start = _page_number(int(match.group('start')), page_count, spec)
+        if not match.group('dash'):
+            indices.append(start)
+            continue
+        end = page_count - 1 if match.group('end') is None else _page_number(int(match.group('end')), page_count, spec)
+        step = 1 if end >= start else -1
+        indices.extend(range(start, end + step, step))
+    return indices
+
+
+def parse_merge_spec(spec, input_count):
+    """
+    Validate a merge spec and normalise it.
+
+    A merge spec is a list of segments, each naming an input by its 0-based
+    position and optionally the pages to take from it::
+
+        [{"file": 1, "pages": "1-3"}, {"file": 0}, {"file": 1, "pages": "-1"}]
+
+    Segments are emitted in list order, so a spec can reorder and interleave
+    inputs. Page ranges are checked against page counts when the inputs are read.
+
+    Args:
+        spec (list): Segments as decoded from JSON
+        input_count (int): Number of inputs the spec refers to
+
+    Returns:
+        list: [file_index, pages] pairs, ``pages`` being None for every page
+
+    Raises:
+        PageSpecError: If the spec is malformed or names a missing input
+    """
+    if not isinstance(spec, list) or not spec:
+        raise PageSpecError('Merge spec must be a non-empty list of segments')
+    segments = []
+    for segment in spec:
+        if not isinstance(segment, dict) or set(segment) - {'file', 'pages'}:
+            raise PageSpecError(f'Invalid merge spec segment: {segment!r}')
+        file_index = segment.get('file')
+        if isinstance(file_index, bool) or not isinstance(file_index, int) or not 0 <= file_index < input_count:
+            raise PageSpecError(f'Merge spec segment names unknown file {file_index!r}')
+        pages = segment.get('pages')
+        if pages is not None and not isinstance(pages, str):
+            raise PageSpecError(f'Page range for file {file_index} must be a string')
+        segments.append([file_index, pages or None])
+    return segments
+
+
+def document_catalog(reader):
+    """
+    Return the document catalog of a PDF.
+
+    Resolved through the trailer, which every supported pypdf version exposes.
+
+    Args:
+        reader (PdfReader): The document
+
+    Returns:
+        DictionaryObject: The ``/Root`` dictionary
+    """
+    return reader.trailer['/Root'].get_object()
+
+
+def count_pages(reader):
+    """
+    Return the number of pages of a document from its page tree root.
+
+    Reads ``/Count`` instead of ``len(reader.pages)``, which flattens the tree.
+
+    Args:
+        reader (PdfReader): The document
+
+    Returns:
+        int: Number of pages
+    """
+    try:
+        return int(document_catalog(reader)['/Pages'].get_object()['/Count'])
+    except (KeyError, TypeError, ValueError) as ex:
+        logger.warning("Page tree root has no usable /Count (%s), counting the flattened page list", str(ex))
+        return len(reader.pages)
+
+
+def get_page_lazily(reader, index):
+    """
+    Look up one page by descending the page tree along ``/Count``.
+
+    Only the nodes on the path to the page and their earlier siblings are
+    resolved, the siblings for their ``/Count``. The lookup is therefore cheap
+    for balanced trees only; in a flat tree, with every page in one ``/Kids``
+    array, it resolves every earlier page, as flattening would. Damaged trees
+    fall back to pypdf's own lookup.
+
+    The reader's page dictionary is left untouched, since readers may be
+    cached and shared between merges; the attributes the page inherits from
+    its ancestors are returned beside it for the caller to apply to its copy.
+
+    Args:
+        reader (PdfReader): The document
+        index (int): 0-based page index
+
+    Returns:
+        tuple: (PageObject, dict of inherited attributes the page does not set itself)
+    """
+    try:
+        node_reference = document_catalog(reader).raw_get('/Pages')
+        node = node_reference.get_object()
+        inherited = {}
+        remaining = index
+        while node.get('/Type') != '/Page':
+            for attribute in INHERITABLE_PAGE_ATTRIBUTES:
+                if attribute in node:
+                    inherited[attribute] = node[attribute]
+            for kid_reference in node['/Kids']:
+                kid = kid_reference.get_object()
+                kid_count = int(kid['/Count']) if kid.get('/Type') == '/Pages' else 1
+                if remaining < kid_count:
+                    node_reference, node = kid_reference, kid
+                    break
+                remaining -= kid_count
+            else:
+                raise IndexError(index)
+        page = PageObject(reader, node_reference)
+        page.update(node)
+        return page, {attribute: value for attribute, value in inherited.items() if attribute not in node}
+    except (KeyError, TypeError, ValueError, IndexError) as ex:
+        logger.warning("Lazy lookup of page %d failed (%s), using the flattened page list", index, str(ex))
+        # Flattening has already copied the inherited attributes onto the page
+        return reader.pages[index], {}
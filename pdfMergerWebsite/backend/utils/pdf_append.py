@@ -0,0 +1,218 @@
+"""
+PDF append utility module.
+
+This module adds pages to an existing PDF as an incremental update: the new
+page objects, a replacement for the root of the page tree and a
+cross-reference section are written after the existing bytes, which are kept
+as they are. Only the trailer, the catalog and the page tree root of the
+existing document are parsed, so appending costs time in proportion to the
+new pages rather than to the whole document.
+"""
+import io
+import zlib
+import logging
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+from .pdf_merger import PDF_READ_ERRORS, PdfInputError, open_pdf_reader
+from .pdf_output import writer_catalog
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# startxref must be within the last kilobyte of a PDF
+_TAIL_BYTES = 1024
+
+
+def _last_xref_offset(data):
+    """
+    Return the offset of the last cross-reference section.
+
+    Raises:
+        PdfInputError: If the document has no readable startxref
+    """
+    tail_start = max(0, len(data) - _TAIL_BYTES)
+    position = data.rfind(b'startxref', tail_start)
+    if position < 0:
+        raise PdfInputError('The stored PDF has no cross-reference section to append to', 500)
+    try:
+        return int(data[position + len(b'startxref'):].split()[0])
+    except (IndexError, ValueError) as ex:
+        raise PdfInputError('The stored PDF has no cross-reference section to append to', 500) from ex
+
+
+def _renumber(obj, mapping, visited):
+    """
+    Point the references inside an object at their numbers in the update.
+
+    Containers are changed in place; ``visited`` keeps a container shared by
+    several objects from being renumbered twice.
+
+    Returns:
+        The object, or a replacement reference if ``obj`` is a reference
+    """
+    if isinstance(obj, IndirectObject):
+        idnum, generation = mapping[obj.idnum]
+        return IndirectObject(idnum, generation, None)
+    if id(obj) in visited:
+        return obj
+    if isinstance(obj, DictionaryObject):
+        visited.add(id(obj))
+        for key, value in list(obj.items()):
+            obj[key] = _renumber(value, mapping, visited)
+    elif isinstance(obj, ArrayObject):
+        visited.add(id(obj))
+        for index, value in enumerate(obj):
+            obj[index] = _renumber(value, mapping, visited)
+    return obj
+
+
+def append_documents(existing, documents, progress=None):
+    """
+    Build an incremental update appending the pages of some PDFs to a document.
+
+    The update is in the same cross-reference format as the document's last
+    section, a table or a cross-reference stream. It is returned separately so
+    the caller decides how to join it to the existing bytes.
+
+    This is a top-level function so that it can run in a MergePool process.
+
+    Args:
+        existing (bytes): The document appended to, normally output of merge_documents
+        documents (list): (name, path, PDF bytes or binary file object) pairs in input order
+        progress (callable, optional): Called with (pages_done, pages_total, phase)
+
+    Returns:
+        dict: ``update`` with the bytes to write after ``existing``, ``pages_added``
+            and ``page_count``, the number of pages of the updated document
+
+    Raises:
+        PdfInputError: If an input cannot be read, or the existing document is
+            encrypted or damaged
+    """
+    try:
+        reader = PdfReader(io.BytesIO(existing))
+        if reader.is_encrypted:
+            raise PdfInputError('Cannot append to an encrypted PDF')
+        trailer = reader.trailer
+        root_ref = trailer.raw_get('/Root')
+        pages_ref = root_ref.get_object().raw_get('/Pages')
+        pages_root = pages_ref.get_object()
+        kids = pages_root['/Kids']
+        old_count = int(pages_root['/Count'])
+        old_size = int(trailer['/Size'])
+    except PDF_READ_ERRORS + (KeyError, AttributeError) as ex:
+        logger.error("Stored PDF cannot be appended to: %s", str(ex))
+        raise PdfInputError(f'The stored PDF cannot be appended to: {str(ex)}', 500) from ex
+    prev_offset = _last_xref_offset(existing)
+    xref_is_stream = not existing[prev_offset:prev_offset + 16].lstrip().startswith(b'xref')
+
+    pdf_readers = [open_pdf_reader(name, source) for name, source in documents]
+    pages_total = sum(len(pdf_reader.pages) for pdf_reader in pdf_readers)
+    pdf_writer = PdfWriter()
+    pages_done = 0
+    for pdf_reader in pdf_readers:
+        for page in pdf_reader.pages:
+            pdf_writer.add_page(page)
+            pages_done += 1
+            if progress:
+                progress(pages_done, pages_total, 'merging')
+    if progress:
+        progress(pages_done, pages_total, 'writing')
+    # pypdf does this at the start of write_stream; outlines and links point at pages through it
+    resolve_links = getattr(pdf_writer, '_resolve_links', None)
+    if resolve_links is not None:
+        resolve_links()
+
+    # The writer's own catalog and page tree root stand for those of the existing document
+    objects = pdf_writer._objects  # pylint: disable=protected-access
+    writer_root = writer_catalog(pdf_writer).indirect_reference.idnum
+    writer_pages = writer_catalog(pdf_writer).raw_get('/Pages').idnum
+    info = pdf_writer._info  # pylint: disable=protected-access
+    # Older pypdf releases keep the reference itself rather than the dictionary
+    info_ref = info if isinstance(info, IndirectObject) else getattr(info, 'indirect_reference', None)
+    writer_info = info_ref.idnum if info_ref is not None else None
+    mapping = {
+        writer_root: (root_ref.idnum, root_ref.generation),
+        writer_pages: (pages_ref.idnum, pages_ref.generation),
+    }
+    new_objects = []
+    for idnum, obj in enumerate(objects, start=1):
+        if obj is None or idnum in mapping or idnum == writer_info:
+            continue
+        mapping[idnum] = (old_size + len(new_objects), 0)
+        new_objects.append((idnum, obj))
+
+    # Offsets in the update are relative to the start of the existing document
+    base = len(existing)
+    update = io.BytesIO()
+    if not existing.endswith((b'\n', b'\r')):
+        update.write(b'\n')
+    offsets = {}
+    visited = set()
+    for idnum, obj in new_objects:
+        new_idnum = mapping[idnum][0]
+        offsets[new_idnum] = base + update.tell()
+        update.write(f'{new_idnum} 0 obj\n'.encode())
+        _renumber(obj, mapping, visited).write_to_stream(update)
+        update.write(b'\nendobj\n')
+
+    new_kids = [IndirectObject(*mapping[page.indirect_reference.idnum], None) for page in pdf_writer.pages]
+    updated_pages = DictionaryObject(pages_root)
+    updated_pages[NameObject('/Kids')] = ArrayObject(list(kids) + new_kids)
+    updated_pages[NameObject('/Count')] = NumberObject(old_count + len(new_kids))
+    pages_offset = base + update.tell()
+    update.write(f'{pages_ref.idnum} {pages_ref.generation} obj\n'.encode())
+    updated_pages.write_to_stream(update)
+    update.write(b'\nendobj\n')
+
+    trailer_dict = DictionaryObject({
+        NameObject('/Root'): root_ref,
+        NameObject('/Prev'): NumberObject(prev_offset),
+    })
+    for key in ('/Info', '/ID'):
+        if key in trailer:
+            trailer_dict[NameObject(key)] = trailer.raw_get(key)
+    next_idnum = old_size + len(new_objects)
+    xref_offset = base + update.tell()
+    if xref_is_stream:
+        # The cross-reference stream describes itself as the last new object
+        offsets[next_idnum] = xref_offset
+        rows = [(pages_offset, pages_ref.generation)] + [(offsets[idnum], 0) for idnum in sorted(offsets)]
+        width = max(1, (max(offset for offset, _ in rows).bit_length() + 7) // 8)
+        data = zlib.compress(b''.join(b'\x01' + offset.to_bytes(width, 'big') + generation.to_bytes(2, 'big')
+                                      for offset, generation in rows))
+        trailer_dict.update({
+            NameObject('/Type'): NameObject('/XRef'),
+            NameObject('/Size'): NumberObject(next_idnum + 1),
+            NameObject('/Index'): ArrayObject([NumberObject(pages_ref.idnum), NumberObject(1),
+                                               NumberObject(old_size), NumberObject(len(new_objects) + 1)]),
+            NameObject('/W'): ArrayObject([NumberObject(1), NumberObject(width), NumberObject(2)]),
+            NameObject('/Filter'): NameObject('/FlateDecode'),
+            NameObject('/Length'): NumberObject(len(data)),
+        })
+        update.write(f'{next_idnum} 0 obj\n'.encode())
+        trailer_dict.write_to_stream(update)
+        update.write(b'\nstream\n' + data + b'\nendstream\nendobj\n')
+    else:
+        # Restating the head of the free list keeps readers that expect a zero-indexed table quiet
+        update.write(b'xref\n0 1\n0000000000 65535 f \n')
+        update.write(f'{pages_ref.idnum} 1\n{pages_offset:010d} {pages_ref.generation:05d} n \n'.encode())
+        if new_objects:
+            update.write(f'{old_size} {len(new_objects)}\n'.encode())
+            for idnum in sorted(offsets):
+                update.write(f'{offsets[idnum]:010d} 00000 n \n'.encode())
+        trailer_dict[NameObject('/Size')] = NumberObject(next_idnum)
+        update.write(b'trailer\n')
+        trailer_dict.write_to_stream(update)
+        update.write(b'\n')
+    update.write(f'startxref\n{xref_offset}\n%%EOF\n'.encode())
+
+    logger.info("Appended %d pages as %d new objects (%d bytes)",
+                len(new_kids), len(new_objects), update.tell())
+    return {
+        'update': update.getvalue(),
+        'pages_added': len(new_kids),
+        'page_count': old_count + len(new_kids)
+    }
@@ -0,0 +1,93 @@
+"""
+PDF resource deduplication utility module.
+
+This module shares identical resources (fonts, ICC profiles, images and other
+streams) between pages that came from different inputs, so a merge of many
+files exported by the same tool stores each resource once.
+"""
+import logging
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NullObject, StreamObject
+from pypdf.errors import PyPdfError
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Dictionaries that describe resources and are safe to share between pages.
+# Pages, annotations and form fields keep their identity.
+SHAREABLE_DICTIONARY_TYPES = ('/Font', '/FontDescriptor', '/ExtGState', '/Encoding', '/Pattern', '/Shading')
+
+
+def _is_shareable(obj):
+    """Return whether an indirect object may be replaced by an identical one."""
+    if isinstance(obj, StreamObject):
+        return True
+    if isinstance(obj, DictionaryObject):
+        return obj.get('/Type') in SHAREABLE_DICTIONARY_TYPES
+    # Indirect arrays hold color spaces, widths and similar resource data
+    return isinstance(obj, ArrayObject)
+
+
+def _replace_references(obj, replacements):
+    """Point references inside a dictionary or array at the kept copies."""
+    if isinstance(obj, DictionaryObject):
+        items = list(obj.items())
+    elif isinstance(obj, ArrayObject):
+        items = list(enumerate(obj))
+    else:
+        return
+    for key, value in items:
+        if isinstance(value, IndirectObject):
+            replacement = replacements.get(value.idnum)
+            if replacement is not None:
+                obj[key] = replacement
+        else:
+            _replace_references(value, replacements)
+
+
+def deduplicate_resources(pdf_writer, max_passes=4):
+    """
+    Merge identical resource objects of a writer before it is written out.
+
+    Objects are compared by pypdf's content hash, which covers stream data and
+    every key. Each pass rewrites references to the kept copy, which makes
+    objects pointing at merged resources (a font pointing at its font file, say)
+    identical in turn, so later passes pick those up as well.
+
+    Args:
+        pdf_writer (PdfWriter): Writer holding the merged pages
+        max_passes (int): Upper bound on dependency levels to collapse
+
+    Returns:
+        dict: ``objects_removed`` and ``passes`` run
+    """
+    # pypdf only exposes its object table privately. Removed objects become null
+    # objects rather than None: older pypdf versions skip None entries without
+    # an xref offset, which puts every later offset out of step
+    objects = pdf_writer._objects  # pylint: disable=protected-access
+    removed = 0
+    passes = 0
+    for passes in range(1, max_passes + 1):
+        kept_by_hash = {}
+        replacements = {}
+        for idnum, obj in enumerate(objects, start=1):
+            if obj is None or isinstance(obj, NullObject) or not _is_shareable(obj):
+                continue
+            try:
+                key = obj.hash_value()
+            except (PyPdfError, ValueError, NotImplementedError) as ex:
+                # Streams with filters pypdf cannot decode are left alone
+                logger.debug("Not deduplicating object %d: %s", idnum, str(ex))
+                continue
+            kept = kept_by_hash.setdefault(key, idnum)
+            if kept != idnum:
+                replacements[idnum] = objects[kept - 1].indirect_reference
+        if not replacements:
+            break
+        for idnum in replacements:
+            objects[idnum - 1] = NullObject()
+        for obj in objects:
+            if obj is not None:
+                _replace_references(obj, replacements)
+        removed += len(replacements)
+    logger.info("Deduplicated %d resource objects in %d passes", removed, passes)
+    return {'objects_removed': removed, 'passes': passes}
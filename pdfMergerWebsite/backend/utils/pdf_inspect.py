@@ -0,0 +1,115 @@
+"""
+PDF inspection utility module.
+
+This module reports what the frontend needs to know about an input before a
+merge (page count, page sizes, encryption, version) from the trailer, the
+cross-reference table and the page tree only. Content streams are never read.
+"""
+import logging
+from pypdf import PdfReader
+from pypdf.errors import FileNotDecryptedError
+
+from .pdf_merger import PDF_READ_ERRORS
+from .page_spec import INHERITABLE_PAGE_ATTRIBUTES, document_catalog
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+
+def iter_page_boxes(reader):
+    """
+    Walk the page tree and yield the effective size of each page.
+
+    Only page tree dictionaries are resolved. ``/MediaBox``, ``/CropBox`` and
+    ``/Rotate`` are inherited from ancestors as the PDF specification requires.
+
+    Args:
+        reader (PdfReader): The document
+
+    Yields:
+        tuple: (width, height) in points, rotated when ``/Rotate`` is 90 or 270
+    """
+    root = document_catalog(reader)['/Pages'].get_object()
+    stack = [(root, {})]
+    visited = set()
+    while stack:
+        node, inherited = stack.pop()
+        node_id = id(node) if node.indirect_reference is None else node.indirect_reference.idnum
+        if node_id in visited:
+            # Page trees must not be cyclic; skip repeated nodes of damaged files
+            continue
+        visited.add(node_id)
+        attributes = dict(inherited)
+        for attribute in INHERITABLE_PAGE_ATTRIBUTES:
+            if attribute != '/Resources' and attribute in node:
+                attributes[attribute] = node[attribute]
+        if node.get('/Type') == '/Page' or '/Kids' not in node:
+            box = attributes.get('/CropBox', attributes.get('/MediaBox', [0, 0, 612, 792]))
+            width = abs(float(box[2]) - float(box[0]))
+            height = abs(float(box[3]) - float(box[1]))
+            if int(attributes.get('/Rotate', 0)) % 180:
+                width, height = height, width
+            yield round(width, 2), round(height, 2)
+            continue
+        # Reversed so that pages come off the stack in document order
+        for kid in reversed(node['/Kids']):
+            stack.append((kid.get_object(), attributes))
+
+
+def group_page_sizes(sizes):
+    """
+    Collapse consecutive pages of equal size into runs.
+
+    Args:
+        sizes (iterable): (width, height) pairs in page order
+
+    Returns:
+        list: Runs with ``first_page`` (1-based), ``count``, ``width`` and ``height``
+    """
+    runs = []
+    for page_number, (width, height) in enumerate(sizes, start=1):
+        if runs and runs[-1]['width'] == width and runs[-1]['height'] == height:
+            runs[-1]['count'] += 1
+        else:
+            runs.append({'first_page': page_number, 'count': 1, 'width': width, 'height': height})
+    return runs
+
+
+def inspect_pdf(stream, size_bytes):
+    """
+    Describe a PDF without reading its content streams.
+
+    Args:
+        stream: Binary file object holding the PDF
+        size_bytes (int): Size of the file
+
+    Returns:
+        dict: ``valid``, ``size_bytes``, ``pdf_version``, ``encrypted``,
+            ``page_count`` and ``page_sizes``; ``error`` for unreadable files
+    """
+    info = {'valid': False, 'size_bytes': size_bytes}
+    try:
+        stream.seek(0)
+        reader = PdfReader(stream)
+        header = reader.pdf_header
+        if isinstance(header, bytes):
+            # Some pypdf versions return the header as bytes
+            header = header.decode('latin-1')
+        info['pdf_version'] = header.removeprefix('%PDF-') or None
+        info['encrypted'] = reader.is_encrypted
+        if reader.is_encrypted:
+            # Page dictionaries of an encrypted file cannot be read without the password
+            try:
+                info['page_count'] = int(reader.trailer['/Root']['/Pages']['/Count'])
+            except (FileNotDecryptedError, KeyError, TypeError, ValueError):
+                info['page_count'] = None
+            info['page_sizes'] = None
+        else:
+            page_sizes = group_page_sizes(iter_page_boxes(reader))
+            info['page_count'] = sum(run['count'] for run in page_sizes)
+            info['page_sizes'] = page_sizes
+        info['valid'] = True
+    except (FileNotDecryptedError, KeyError, AttributeError, IndexError) + PDF_READ_ERRORS as ex:
+        logger.warning("Could not inspect PDF: %s", str(ex))
+        info['error'] = f'Not a readable PDF: {str(ex)}'
+    return info
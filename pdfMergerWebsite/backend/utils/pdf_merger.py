@@ -2,10 +2,25 @@
 PDF Merger utility module.
 
 This module provides functionality to merge multiple PDF files into a single PDF document.
+merge_documents is the merge engine used by both web apps and the batch tool;
+it takes paths, bytes, open files or parsed readers and writes to a path, a
+stream or a callback. Inputs given with their SHA-256 digest are kept parsed
+in a per-process cache, so a cover page or appendix used by many merges is
+parsed once.
 """
+import io
 import os
+import time
 import logging
 from pypdf import PdfReader, PdfWriter
+from pypdf.errors import PyPdfError
+from pypdf.generic import NameObject
+
+from .lru_cache import LRUByteCache
+from .merge_pool import MergePoolBusy
+from .page_spec import PageSpecError, parse_page_ranges, parse_merge_spec, count_pages, get_page_lazily
+from .pdf_dedupe import deduplicate_resources
+from .pdf_output import OutputProfileError, resolve_output_profile, compress_streams, write_with_object_streams
 
 # Get a named logger for this module
 logger = logging.getLogger(__name__)
@@ -19,17 +34,353 @@ if not logger.handlers:
     logger.setLevel(logging.INFO)
 
 
-def merge_pdfs(input_paths, output_path, output_filename=None):
+class PdfInputError(Exception):
+    """An input cannot be merged; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+    def __reduce__(self):
+        # Keep the status code when the error crosses a process boundary
+        return (self.__class__, (self.message, self.status_code))
+
+
+# Errors pypdf and the file layer raise for damaged or unreadable input
+PDF_READ_ERRORS = (PyPdfError, ValueError, TypeError, IOError, OSError, RuntimeError, SyntaxError)
+
+# Parsed inputs of this process by content digest; disabled until configure_document_cache
+document_cache = LRUByteCache(0, name='parsed document cache')
+
+
+def configure_document_cache(max_bytes):
+    """
+    Set the byte budget of this process's parsed document cache.
+
+    Each process has its own cache, so pass this as the MergePool initializer
+    to size the caches of the pool processes. Entries are charged the size of
+    the input; the objects pypdf resolves while merging come on top of that.
+
+    Args:
+        max_bytes (int): Budget in input bytes, 0 to disable the cache
+    """
+    document_cache.clear()
+    document_cache.max_bytes = max(0, int(max_bytes))
+
+
+class _CountingWriter:
+    """
+    Sink adapter that counts the bytes written.
+
+    ``tell`` reports the count, so pypdf computes correct offsets for streams
+    that cannot tell, such as sockets, or that already hold other data, and
+    the output size is known without statting the file afterwards.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.raw.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.bytes_written
+
+    def flush(self):
+        flush = getattr(self.raw, 'flush', None)
+        if flush is not None:
+            flush()
+
+
+def open_pdf_reader(name, source):
+    """
+    Parse and validate one input PDF.
+
+    Args:
+        name (str): Name of the input, used in error messages
+        source: Path, PDF bytes or a binary file object; a file object that
+            cannot seek is read into memory first
+
+    Returns:
+        PdfReader: Reader for the input
+
+    Raises:
+        PdfInputError: If the input is encrypted or not a readable PDF
+    """
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        elif isinstance(source, (str, os.PathLike)):
+            source = os.fspath(source)
+        elif getattr(source, 'seekable', lambda: True)():
+            source.seek(0)
+        else:
+            source = io.BytesIO(source.read())
+        pdf_reader = PdfReader(source)
+        # Check if PDF is encrypted
+        if pdf_reader.is_encrypted:
+            logger.error("Encrypted PDF detected: %s", name)
+            raise PdfInputError(
+                f'PDF file {name} is encrypted. Please remove password protection before uploading.'
+            )
+        logger.debug("Successfully read PDF with %d pages", count_pages(pdf_reader))
+        return pdf_reader
+    except ModuleNotFoundError as crypto_error:
+        if "PyCryptodome" in str(crypto_error):
+            logger.error("Missing PyCryptodome dependency for encrypted PDF: %s", str(crypto_error))
+            raise PdfInputError(
+                'This PDF requires cryptography support. Please contact the administrator.', 500
+            ) from crypto_error
+        raise
+    except PermissionError as ex:
+        logger.error("No read permission for file: %s", name)
+        raise PdfInputError(f'Cannot read file {name}') from ex
+    except PDF_READ_ERRORS as ex:
+        logger.error("Invalid PDF file %s: %s", name, str(ex))
+        raise PdfInputError(f'Invalid PDF file {name}: {str(ex)}') from ex
+
+
+def _checkout_reader(name, source, digest):
+    """
+    Take the parsed reader of an input out of the document cache, or parse it.
+
+    The reader is removed from the cache while a merge uses it, because a
+    PdfReader cannot be shared between threads; the merge puts it back when
+    it is done. A parsed input is given its own copy of the bytes, so the
+    cached reader does not depend on the caller's file staying open.
+
+    Returns:
+        tuple: The reader, the size to charge it in the cache, and whether it was cached
+    """
+    cached = document_cache.take(digest)
+    if cached is not None:
+        return cached + (True,)
+    if isinstance(source, (str, os.PathLike)):
+        try:
+            with open(source, 'rb') as source_file:
+                source = source_file.read()
+        except PermissionError as ex:
+            logger.error("No read permission for file: %s", name)
+            raise PdfInputError(f'Cannot read file {name}') from ex
+        except OSError as ex:
+            raise PdfInputError(f'Invalid PDF file {name}: {str(ex)}') from ex
+    elif not isinstance(source, (bytes, bytearray, memoryview)):
+        if getattr(source, 'seekable', lambda: False)():
+            source.seek(0)
+        source = source.read()
+    return open_pdf_reader(name, source), len(source), False
+
+
+def select_pages(pdf_readers, merge_spec=None):
+    """
+    Work out which pages of which readers make up the merged document.
+
+    Args:
+        pdf_readers (list): Readers in input order
+        merge_spec (list, optional): [file_index, pages] segments from
+            page_spec.parse_merge_spec; every page of every input when omitted
+
+    Returns:
+        list: (reader, page indices or None for all pages) pairs in output order
+
+    Raises:
+        PdfInputError: If a page range does not fit its input
+    """
+    if merge_spec is None:
+        return [(reader, None) for reader in pdf_readers]
+    selection = []
+    for file_index, pages in merge_spec:
+        reader = pdf_readers[file_index]
+        try:
+            selection.append((reader, None if pages is None else parse_page_ranges(pages, count_pages(reader))))
+        except PageSpecError as ex:
+            raise PdfInputError(f'Invalid page selection for file {file_index + 1}: {str(ex)}') from ex
+    return selection
+
+
+def write_merged_pdf(pdf_readers, output, progress=None, merge_options=None):
+    """
+    Append the selected pages of the readers to a new document and write it out.
+
+    Pages named by a page range are looked up individually, so only the
+    selected part of each page tree is read.
+
+    Args:
+        pdf_readers (list): Readers in input order
+        output: Binary file object the merged PDF is written to
+        progress (callable, optional): Called with (pages_done, pages_total, phase)
+        merge_options (dict, optional): ``merge_spec`` segments selecting and ordering
+            pages (see select_pages), ``dedupe`` to share identical resources, and
+            ``profile`` with an optional ``compression_level`` (see pdf_output)
+
+    Returns:
+        int: Number of pages written
+
+    Raises:
+        PdfInputError: If a page range or output profile is invalid
+    """
+    merge_options = merge_options or {}
+    try:
+        settings = resolve_output_profile(merge_options.get('profile', 'fast'), merge_options.get('compression_level'))
+    except OutputProfileError as ex:
+        raise PdfInputError(str(ex)) from ex
+    selection = select_pages(pdf_readers, merge_options.get('merge_spec'))
+    pages_total = sum(count_pages(reader) if indices is None else len(indices) for reader, indices in selection)
+    pdf_writer = PdfWriter()
+    pages_done = 0
+    for reader, indices in selection:
+        if indices is None:
+            pages = ((page, {}) for page in reader.pages)
+        else:
+            pages = (get_page_lazily(reader, index) for index in indices)
+        for page, inherited in pages:
+            # Set on the looked-up copy, never on the reader's page dictionary
+            page.update({NameObject(attribute): value for attribute, value in inherited.items()})
+            pdf_writer.add_page(page)
+            pages_done += 1
+            if progress:
+                progress(pages_done, pages_total, 'merging')
+    if merge_options.get('dedupe') or settings['dedupe']:
+        if progress:
+            progress(pages_done, pages_total, 'deduplicating')
+        deduplicate_resources(pdf_writer)
+    if settings['compression_level'] is not None:
+        if progress:
+            progress(pages_done, pages_total, 'compressing')
+        compress_streams(pdf_writer, settings['compression_level'], recompress=settings['recompress'])
+    if progress:
+        progress(pages_done, pages_total, 'writing')
+    if settings['object_streams']:
+        write_with_object_streams(pdf_writer, output, settings['compression_level'])
+    else:
+        pdf_writer.write(output)
+    return pages_done
+
+
+def merge_documents(sources, sink=None, merge_options=None, progress=None):
+    """
+    Merge PDFs from any kind of source into any kind of sink.
+
+    This is the single merge engine; merge_pdfs, the web apps and the batch
+    tool all go through it. It is a top-level function so that it can run in a
+    MergePool process, as long as its sources and sink can be pickled.
+
+    Args:
+        sources (list): Inputs in order, each a path, PDF bytes, a binary file object,
+            a PdfReader, or a (name, any of those) pair naming it in error messages;
+            a (name, source, SHA-256 hex digest) triple also uses the document cache
+        sink: Where the merged PDF goes: None to return its bytes, a path, a writable
+            binary stream (``tell`` is not needed), or a callable given the bytes once,
+            for example to put them into a store
+        merge_options (dict, optional): Output options, see write_merged_pdf
+        progress (callable, optional): Called with (pages_done, pages_total, phase)
+
+    Returns:
+        dict: ``pages`` and ``size_bytes`` of the merged PDF, ``data`` with its bytes
+            when ``sink`` is None, and ``cache_hits`` and ``cache_misses`` counting the
+            inputs found and not found in the document cache if it was looked up
+
+    Raises:
+        PdfInputError: If an input cannot be merged
+        OSError: If the sink cannot be written
+    """
+    pdf_readers = []
+    # Readers taken from or destined for the document cache, by digest
+    checked_out = {}
+    cache_hits = 0
+    for index, source in enumerate(sources):
+        name, source, digest = (source + (None,))[:3] if isinstance(source, tuple) else (None, source, None)
+        if isinstance(source, PdfReader):
+            pdf_readers.append(source)
+            continue
+        if name is None:
+            name = os.path.basename(source) if isinstance(source, (str, os.PathLike)) else f'input {index + 1}'
+        if digest is None or not document_cache.enabled:
+            pdf_readers.append(open_pdf_reader(name, source))
+        elif digest in checked_out:
+            # The same input twice in one merge shares its reader
+            pdf_readers.append(checked_out[digest][0])
+        else:
+            pdf_reader, size_bytes, cached = _checkout_reader(name, source, digest)
+            checked_out[digest] = (pdf_reader, size_bytes)
+            cache_hits += cached
+            pdf_readers.append(pdf_reader)
+
+    if isinstance(sink, (str, os.PathLike)):
+        with open(sink, 'wb') as output_file:
+            output = _CountingWriter(output_file)
+            pages = write_merged_pdf(pdf_readers, output, progress, merge_options)
+        result = {'pages': pages, 'size_bytes': output.bytes_written}
+    elif hasattr(sink, 'write'):
+        output = _CountingWriter(sink)
+        pages = write_merged_pdf(pdf_readers, output, progress, merge_options)
+        output.flush()
+        result = {'pages': pages, 'size_bytes': output.bytes_written}
+    else:
+        output_buffer = io.BytesIO()
+        pages = write_merged_pdf(pdf_readers, output_buffer, progress, merge_options)
+        # getvalue() hands over the buffer without copying it
+        data = output_buffer.getvalue()
+        if sink is not None:
+            sink(data)
+            result = {'pages': pages, 'size_bytes': len(data)}
+        else:
+            result = {'pages': pages, 'size_bytes': len(data), 'data': data}
+
+    # Readers go back only after a successful merge, so a failure cannot leave one half-used
+    for digest, (pdf_reader, size_bytes) in checked_out.items():
+        document_cache.put(digest, (pdf_reader, size_bytes), size_bytes)
+    if checked_out:
+        result['cache_hits'] = cache_hits
+        result['cache_misses'] = len(checked_out) - cache_hits
+    return result
+
+
+def merge_pdf_documents(documents, merge_options=None, progress=None):
+    """
+    Merge in-memory PDF documents and return the merged bytes.
+
+    Shorthand for merge_documents without a sink, usable as a MergePool task.
+
+    Args:
+        documents (list): (name, PDF bytes or binary file object) pairs in input order
+        merge_options (dict, optional): Output options, see write_merged_pdf
+        progress (callable, optional): Called with (pages_done, pages_total, phase)
+
+    Returns:
+        bytes: The merged PDF document
+
+    Raises:
+        PdfInputError: If an input cannot be merged
+    """
+    return merge_documents(documents, None, merge_options, progress)['data']
+
+
+def merge_pdfs(input_paths, output_path, output_filename=None, pool=None, merge_spec=None, dedupe=False,
+               profile='fast', compression_level=None):
     """
     Merge multiple PDF files into a single PDF file.
 
     Args:
-        input_paths (list): List of paths to PDF files to merge
+        input_paths (list): List of paths to PDF files to merge; any other source
+            merge_documents accepts works too, and must be picklable with a pool
         output_path (str): Path where the merged PDF should be saved
         output_filename (str, optional): Custom filename for the merged PDF
+        pool (MergePool, optional): Pool to run the merge in instead of this thread
+        merge_spec (list, optional): Segments such as ``[{"file": 1, "pages": "1-3"}, {"file": 0}]``
+            selecting and reordering pages; every page of every file when omitted
+        dedupe (bool): Store resources shared by several inputs only once
+        profile (str): Output profile, ``fast``, ``balanced`` or ``smallest``
+        compression_level (int, optional): zlib level 1-9 overriding the profile's level
 
     Returns:
-        dict: Dictionary with success status, path, and error message if any
+        dict: Dictionary with success status, path, and error message if any;
+            on success also ``pages``, ``size_bytes`` and ``merge_seconds``, and when the
+            pool is full ``retry_after`` in seconds
     """
     try:
         # Validate input paths
@@ -41,8 +392,19 @@ def merge_pdfs(input_paths, output_path, output_filename=None):
                 'error': 'At least two PDF files are required for merging'
             }
 
-        # Check if all input files exist without path restrictions
-        missing_files = [path for path in input_paths if not os.path.exists(path)]
+        # One stat per input path finds missing and empty files; whether a file
+        # can be read is found out when the merge opens it
+        missing_files = []
+        empty_files = []
+        for source in input_paths:
+            path = source[1] if isinstance(source, tuple) else source
+            if not isinstance(path, (str, os.PathLike)):
+                continue
+            try:
+                if os.stat(path).st_size == 0:
+                    empty_files.append(os.fspath(path))
+            except FileNotFoundError:
+                missing_files.append(os.fspath(path))
         if missing_files:
             missing_list = ', '.join(missing_files)
             logger.error("The following files do not exist: %s", missing_list)
@@ -52,50 +414,37 @@ def merge_pdfs(input_paths, output_path, output_filename=None):
                 'error': 'The following files do not exist: ' + missing_list
             }
 
-        # Initialize PDF writer
-        pdf_writer = PdfWriter()
-
-        # Read and append each PDF
-        for path in input_paths:
+        try:
+            resolve_output_profile(profile, compression_level)
+        except OutputProfileError as ex:
+            logger.error("Invalid output profile: %s", str(ex))
+            return {
+                'success': False,
+                'path': None,
+                'error': str(ex)
+            }
+        merge_options = {'dedupe': bool(dedupe), 'profile': profile}
+        if compression_level is not None:
+            merge_options['compression_level'] = compression_level
+        if merge_spec is not None:
             try:
-                logger.info("Processing file: %s", path)
-
-                # Check if file is readable
-                if not os.access(path, os.R_OK):
-                    logger.error("No read permission for file: %s", path)
-                    return {
-                        'success': False,
-                        'path': None,
-                        'error': 'Cannot read file ' + os.path.basename(path)
-                    }
-
-                # Check if file size is not zero
-                if os.path.getsize(path) == 0:
-                    logger.error("File is empty: %s", path)
-                    return {
-                        'success': False,
-                        'path': None,
-                        'error': 'File is empty: ' + os.path.basename(path)
-                    }
-
-                # Try to open and read the PDF file
-                with open(path, 'rb') as pdf_file:
-                    pdf_reader = PdfReader(pdf_file)
-                    page_count = len(pdf_reader.pages)
-                    logger.info("Found %d pages in %s", page_count, path)
-
-                    # Add each page to the writer
-                    for page in pdf_reader.pages:
-                        pdf_writer.add_page(page)
-
-            except (IOError, OSError, ValueError, TypeError) as ex:
-                logger.error("Error processing file %s: %s", path, str(ex))
+                merge_options['merge_spec'] = parse_merge_spec(merge_spec, len(input_paths))
+            except PageSpecError as ex:
+                logger.error("Invalid merge spec: %s", str(ex))
                 return {
                     'success': False,
                     'path': None,
-                    'error': 'Error processing ' + os.path.basename(path) + ': ' + str(ex)
+                    'error': 'Invalid merge spec: ' + str(ex)
                 }
 
+        if empty_files:
+            logger.error("File is empty: %s", empty_files[0])
+            return {
+                'success': False,
+                'path': None,
+                'error': 'File is empty: ' + os.path.basename(empty_files[0])
+            }
+
         # Handle custom filename if provided
         final_output_path = output_path
         if output_filename:
@@ -109,27 +458,35 @@ def merge_pdfs(input_paths, output_path, output_filename=None):
 
         # Write the merged PDF
         logger.info("Writing merged PDF to: %s", final_output_path)
+        started = time.monotonic()
         try:
-            with open(final_output_path, 'wb') as output_file:
-                pdf_writer.write(output_file)
-        except (IOError, OSError) as ex:
-            logger.error("Error writing merged PDF to %s: %s", final_output_path, str(ex))
+            if pool is None:
+                merged = merge_documents(input_paths, final_output_path, merge_options)
+            else:
+                merged = pool.run(merge_documents, list(input_paths), final_output_path, merge_options)
+        except MergePoolBusy as ex:
             return {
                 'success': False,
                 'path': None,
-                'error': 'Error writing output file: ' + str(ex)
+                'error': str(ex),
+                'retry_after': ex.retry_after
             }
-
-        # Verify the file was created
-        if not os.path.exists(final_output_path):
-            logger.error("Output file was not created: %s", final_output_path)
+        except PdfInputError as ex:
             return {
                 'success': False,
                 'path': None,
-                'error': 'Failed to create merged PDF file'
+                'error': ex.message
+            }
+        except (IOError, OSError) as ex:
+            logger.error("Error writing merged PDF to %s: %s", final_output_path, str(ex))
+            return {
+                'success': False,
+                'path': None,
+                'error': 'Error writing output file: ' + str(ex)
             }
 
-        if os.path.getsize(final_output_path) == 0:
+        # The engine counted the bytes it wrote, so the output is not statted again
+        if merged['size_bytes'] == 0:
             logger.error("Output file is empty: %s", final_output_path)
             return {
                 'success': False,
@@ -137,8 +494,18 @@ def merge_pdfs(input_paths, output_path, output_filename=None):
                 'error': 'Output PDF file is empty'
             }
 
-        logger.info("Successfully created merged PDF: %s", final_output_path)
-        return {'success': True, 'path': final_output_path, 'error': None}
+        merge_seconds = round(time.monotonic() - started, 3)
+        size_bytes = merged['size_bytes']
+        logger.info("Successfully created merged PDF: %s (%d bytes, %s profile, %.3fs)",
+                    final_output_path, size_bytes, profile, merge_seconds)
+        return {
+            'success': True,
+            'path': final_output_path,
+            'error': None,
+            'pages': merged['pages'],
+            'size_bytes': size_bytes,
+            'merge_seconds': merge_seconds
+        }
 
     except (IOError, OSError) as ex:
         logger.error("File I/O error while merging PDFs: %s", str(ex))
@@ -0,0 +1,297 @@
+"""
+PDF output profile utility module.
+
+This module trades merge time for output size. A profile picks the zlib level
+content streams are (re)compressed at, whether resources are deduplicated and
+whether the document is written with PDF 1.5 object and cross-reference
+streams, which pypdf's writer does not produce itself.
+"""
+import os
+import zlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pypdf.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject
+)
+from pypdf.errors import PyPdfError
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# fast writes pypdf's default output; the others spend CPU time on a smaller file
+OUTPUT_PROFILES = {
+    'fast': {'compression_level': None, 'recompress': False, 'object_streams': False, 'dedupe': False},
+    'balanced': {'compression_level': 6, 'recompress': False, 'object_streams': True, 'dedupe': False},
+    'smallest': {'compression_level': 9, 'recompress': True, 'object_streams': True, 'dedupe': True},
+}
+
+# Objects packed into one object stream; readers decompress a whole stream to reach one object
+OBJECTS_PER_STREAM = 100
+
+# Below this many bytes of stream data, handing work to threads costs more than it saves
+PARALLEL_DEFLATE_MIN_BYTES = 1024 * 1024
+
+
+class OutputProfileError(ValueError):
+    """An output profile or compression level is not supported."""
+
+
+def resolve_output_profile(profile, compression_level=None):
+    """
+    Look up the settings of an output profile.
+
+    Args:
+        profile (str): One of OUTPUT_PROFILES
+        compression_level (int, optional): zlib level 1-9 overriding the profile's level
+
+    Returns:
+        dict: ``compression_level``, ``recompress``, ``object_streams`` and ``dedupe``
+
+    Raises:
+        OutputProfileError: If the profile or level is unknown
+    """
+    if profile not in OUTPUT_PROFILES:
+        raise OutputProfileError(
+            f"Unknown output profile '{profile}', expected one of {', '.join(OUTPUT_PROFILES)}"
+        )
+    settings = dict(OUTPUT_PROFILES[profile])
+    if compression_level is not None:
+        if isinstance(compression_level, bool) or not isinstance(compression_level, int) \
+                or not 1 <= compression_level <= 9:
+            raise OutputProfileError(f'Compression level must be between 1 and 9, got {compression_level!r}')
+        settings['compression_level'] = compression_level
+    return settings
+
+
+def _stream_payload(obj, recompress):
+    """Return the decoded data of a stream worth (re)compressing, or None to leave it alone."""
+    filters = obj.get('/Filter')
+    if filters is None:
+        return obj.get_data()
+    if not recompress or '/DecodeParms' in obj:
+        # Images and predictor-encoded data are left in their own encoding
+        return None
+    if isinstance(filters, ArrayObject):
+        if len(filters) != 1:
+            return None
+        filters = filters[0]
+    return obj.get_data() if filters == '/FlateDecode' else None
+
+
+def _deflate_stream(obj, data, level):
+    """Build a Flate-encoded copy of a stream holding ``data``."""
+    decoded = DecodedStreamObject()
+    for key, value in obj.items():
+        if key not in ('/Filter', '/DecodeParms', '/Length'):
+            decoded[key] = value
+    decoded.set_data(data)
+    return decoded.flate_encode(level)
+
+
+def compress_streams(pdf_writer, level, recompress=False, max_threads=None):
+    """
+    Flate-compress the streams of a writer before it is written out.
+
+    Unfiltered streams (mostly content streams of generated pages) are always
+    compressed; with ``recompress`` streams that are already plain Flate data
+    are decoded and compressed again at ``level``. A stream is only replaced
+    when the result is smaller. zlib releases the GIL, so large documents are
+    compressed on several threads of the process the merge runs in.
+
+    Args:
+        pdf_writer (PdfWriter): Writer holding the merged pages
+        level (int): zlib compression level
+        recompress (bool): Also recompress existing Flate streams
+        max_threads (int, optional): Upper bound on compression threads; CPU count by default
+
+    Returns:
+        dict: ``streams_compressed``, ``bytes_before`` and ``bytes_after``
+    """
+    # pypdf only exposes its object table privately; write() emits every entry that is not None
+    objects = pdf_writer._objects  # pylint: disable=protected-access
+    candidates = []
+    for index, obj in enumerate(objects):
+        if not isinstance(obj, StreamObject):
+            continue
+        try:
+            data = _stream_payload(obj, recompress)
+        except (PyPdfError, ValueError, NotImplementedError, zlib.error) as ex:
+            logger.debug("Not compressing object %d: %s", index + 1, str(ex))
+            continue
+        if data:
+            candidates.append((index, obj, data))
+
+    total_bytes = sum(len(data) for _, _, data in candidates)
+    threads = min(max_threads or os.cpu_count() or 1, len(candidates))
+    if threads > 1 and total_bytes >= PARALLEL_DEFLATE_MIN_BYTES:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='pdf-deflate') as executor:
+            encoded_streams = list(executor.map(lambda item: _deflate_stream(item[1], item[2], level), candidates))
+    else:
+        encoded_streams = [_deflate_stream(obj, data, level) for _, obj, data in candidates]
+
+    stats = {'streams_compressed': 0, 'bytes_before': 0, 'bytes_after': 0}
+    for (index, obj, _), encoded in zip(candidates, encoded_streams):
+        before = len(obj._data)  # pylint: disable=protected-access
+        after = len(encoded._data)  # pylint: disable=protected-access
+        stats['bytes_before'] += before
+        if after >= before:
+            stats['bytes_after'] += before
+            continue
+        # References resolve through the object table, so swapping the entry is enough
+        encoded.indirect_reference = obj.indirect_reference
+        objects[index] = encoded
+        stats['streams_compressed'] += 1
+        stats['bytes_after'] += after
+    logger.info("Compressed %d of %d streams at level %d (%d -> %d bytes, %d threads)",
+                stats['streams_compressed'], len(candidates), level,
+                stats['bytes_before'], stats['bytes_after'], max(threads, 1))
+    return stats
+
+
+class _ByteCollector(bytearray):
+    """Minimal writable stream for ``write_to_stream``."""
+
+    def write(self, data):
+        self.extend(data)
+        return len(data)
+
+
+def _serialize(obj):
+    """Return the PDF syntax of a direct object."""
+    buffer = _ByteCollector()
+    obj.write_to_stream(buffer)
+    return bytes(buffer)
+
+
+def _xref_field_width(value):
+    """Number of bytes needed to store ``value`` in a cross-reference stream."""
+    return max(1, (value.bit_length() + 7) // 8)
+
+
+def writer_catalog(pdf_writer):
+    """
+    Return the document catalog of a writer.
+
+    Older pypdf releases have no public ``root_object`` on the writer, but
+    every release keeps the catalog in ``_root_object``.
+
+    Args:
+        pdf_writer (PdfWriter): The writer
+
+    Returns:
+        DictionaryObject: The catalog, whose ``indirect_reference`` is set
+    """
+    return pdf_writer._root_object  # pylint: disable=protected-access
+
+
+def write_with_object_streams(pdf_writer, output, level=6, objects_per_stream=OBJECTS_PER_STREAM):
+    """
+    Write a writer's document with object streams and a cross-reference stream.
+
+    Streams are written as regular objects; every other object is packed into
+    Flate-compressed ``/ObjStm`` streams, which removes most of the per-object
+    syntax and lets zlib compress dictionaries together. The cross-reference
+    table becomes a compressed ``/XRef`` stream. The output is PDF 1.5.
+
+    Encrypted writers are written by pypdf, which has to encrypt each object.
+
+    Args:
+        pdf_writer (PdfWriter): Writer holding the merged pages
+        output: Binary file object; only ``write`` and ``tell`` are used
+        level (int): zlib level for the object and cross-reference streams
+        objects_per_stream (int): Objects packed into one object stream
+    """
+    if getattr(pdf_writer, '_encryption', None) or not hasattr(pdf_writer, '_objects'):
+        pdf_writer.write(output)
+        return
+    # pypdf does this at the start of write_stream; outlines and links point at pages through it
+    resolve_links = getattr(pdf_writer, '_resolve_links', None)
+    if resolve_links is not None:
+        resolve_links()
+
+    objects = pdf_writer._objects  # pylint: disable=protected-access
+    header = pdf_writer.pdf_header
+    if isinstance(header, bytes):
+        # Older pypdf releases keep the writer's header as bytes
+        header = header.decode('latin-1')
+    if header < '%PDF-1.5':
+        header = '%PDF-1.5'
+    output.write(header.encode() + b'\n%\xE2\xE3\xCF\xD3\n')
+
+    # entries[idnum] = (type, field2, field3) as in table 18 of ISO 32000-1
+    entries = {0: (0, 0, 65535)}
+    packable = []
+    for idnum, obj in enumerate(objects, start=1):
+        if obj is None:
+            entries[idnum] = (0, 0, 1)
+        elif isinstance(obj, StreamObject):
+            entries[idnum] = (1, output.tell(), 0)
+            output.write(f'{idnum} 0 obj\n'.encode())
+            obj.write_to_stream(output)
+            output.write(b'\nendobj\n')
+        else:
+            packable.append((idnum, obj))
+
+    next_idnum = len(objects) + 1
+    for start in range(0, len(packable), objects_per_stream):
+        batch = packable[start:start + objects_per_stream]
+        stream_idnum = next_idnum
+        next_idnum += 1
+        offsets = []
+        body = bytearray()
+        for position, (idnum, obj) in enumerate(batch):
+            entries[idnum] = (2, stream_idnum, position)
+            offsets.append(f'{idnum} {len(body)}')
+            body += _serialize(obj) + b'\n'
+        index = (' '.join(offsets) + '\n').encode()
+        object_stream = _ByteCollector(f'{stream_idnum} 0 obj\n'.encode())
+        data = zlib.compress(index + bytes(body), level)
+        stream_dict = DictionaryObject({
+            NameObject('/Type'): NameObject('/ObjStm'),
+            NameObject('/N'): NumberObject(len(batch)),
+            NameObject('/First'): NumberObject(len(index)),
+            NameObject('/Filter'): NameObject('/FlateDecode'),
+            NameObject('/Length'): NumberObject(len(data)),
+        })
+        stream_dict.write_to_stream(object_stream)
+        object_stream += b'\nstream\n' + data + b'\nendstream\nendobj\n'
+        entries[stream_idnum] = (1, output.tell(), 0)
+        output.write(bytes(object_stream))
+
+    xref_idnum = next_idnum
+    xref_offset = output.tell()
+    entries[xref_idnum] = (1, xref_offset, 0)
+    size = xref_idnum + 1
+    widths = [1,
+              _xref_field_width(max(field for _, field, _ in entries.values())),
+              _xref_field_width(max(field for _, _, field in entries.values()))]
+    rows = bytearray()
+    for idnum in range(size):
+        entry_type, field2, field3 = entries[idnum]
+        rows += entry_type.to_bytes(widths[0], 'big')
+        rows += field2.to_bytes(widths[1], 'big')
+        rows += field3.to_bytes(widths[2], 'big')
+    data = zlib.compress(bytes(rows), level)
+
+    xref_dict = DictionaryObject({
+        NameObject('/Type'): NameObject('/XRef'),
+        NameObject('/Size'): NumberObject(size),
+        NameObject('/W'): ArrayObject([NumberObject(width) for width in widths]),
+        NameObject('/Root'): writer_catalog(pdf_writer).indirect_reference,
+        NameObject('/Filter'): NameObject('/FlateDecode'),
+        NameObject('/Length'): NumberObject(len(data)),
+    })
+    info = pdf_writer._info  # pylint: disable=protected-access
+    if info is not None:
+        # Older pypdf releases keep the reference itself rather than the dictionary
+        xref_dict[NameObject('/Info')] = info if isinstance(info, IndirectObject) else info.indirect_reference
+    # Older pypdf releases only set the attribute once an ID was generated
+    document_id = getattr(pdf_writer, '_ID', None)
+    if document_id is not None:
+        xref_dict[NameObject('/ID')] = document_id
+    output.write(f'{xref_idnum} 0 obj\n'.encode())
+    xref_dict.write_to_stream(output)
+    output.write(b'\nstream\n' + data + b'\nendstream\nendobj\n')
+    output.write(f'startxref\n{xref_offset}\n%%EOF\n'.encode())
+    logger.info("Wrote %d objects in %d object streams", len(packable),
+                (len(packable) + objects_per_stream - 1) // objects_per_stream)
@@ -0,0 +1,600 @@
+"""
+PDF persistence utility module.
+
+This module stores merged PDFs on disk in append-only segment files with a
+compact offset index, and provides a background persister that batches writes
+so that request handlers never wait on disk I/O.
+"""
+import os
+import struct
+import zlib
+import time
+import fcntl
+import atexit
+import logging
+import threading
+from collections import namedtuple
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Segment record header: magic, id length, filename length, expiration,
+# created_at, data length and CRC32 of the id, filename and data that follow
+RECORD_MAGIC = b'PDFR'
+RECORD_HEADER = struct.Struct('>4sHIddQI')
+
+# Index entry header: magic, id length, filename length, segment name length,
+# data offset, data length, expiration, created_at and the record CRC32
+INDEX_MAGIC = b'PDFI'
+INDEX_HEADER = struct.Struct('>4sHHHQQddI')
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_FILENAME = 'index.bin'
+
+IndexEntry = namedtuple(
+    'IndexEntry',
+    ['segment', 'offset', 'length', 'expiration', 'created_at', 'checksum', 'filename']
+)
+
+
+def _record_checksum(pdf_id, filename, data):
+    """Compute the CRC32 covering a record's ID, filename and PDF bytes."""
+    return zlib.crc32(data, zlib.crc32(filename.encode('utf-8'), zlib.crc32(pdf_id.encode('utf-8'))))
+
+
+class SegmentedPdfStore:
+    """
+    On-disk PDF store made of append-only segment files and an offset index.
+
+    PDF bytes are appended verbatim to the writing process's active segment,
+    so a record costs its own size on disk instead of the 4/3 inflation of
+    base64 inside JSON. For every record a small entry (segment, offset, length,
+    expiry, filename) is appended to a shared index file, which each process
+    keeps in memory. Reading one PDF is then a dictionary lookup plus a single
+    seek and read, independent of how many PDFs are stored.
+
+    Several processes may share a directory: every process appends to its own
+    segments, index appends are serialised with ``flock`` and other processes'
+    entries are picked up by reading the index tail on a lookup miss. A
+    compaction pass drops expired and superseded records from idle segments.
+    """
+
+    def __init__(self, directory, segment_max_bytes=64 * 1024 * 1024, seal_after_seconds=300):
+        """
+        Args:
+            directory (str): Directory holding the segments and the index
+            segment_max_bytes (int): Size at which the active segment is rolled over
+            seal_after_seconds (float): Idle time after which a segment is no longer
+                appended to and becomes eligible for compaction
+        """
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.seal_after_seconds = seal_after_seconds
+        self.index_path = os.path.join(directory, INDEX_FILENAME)
+        self._lock = threading.RLock()
+        self._index = {}
+        self._index_inode = None
+        self._index_offset = 0
+        self._active_segment = None
+        self._active_pid = None
+        self._segment_counter = 0
+        self._compaction_thread = None
+
+    # Locking and index maintenance
+
+    def _flock(self, name, blocking=True):
+        """Open and lock a lock file shared by all processes using the directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, name), 'a+b')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _parse_index(self, index_file, index):
+        """Read complete index entries from the current position into ``index``."""
+        while True:
+            start = index_file.tell()
+            header = index_file.read(INDEX_HEADER.size)
+            if len(header) < INDEX_HEADER.size:
+                index_file.seek(start)
+                return
+            (magic, id_len, filename_len, segment_len, offset, length,
+             expiration, created_at, checksum) = INDEX_HEADER.unpack(header)
+            names = index_file.read(id_len + filename_len + segment_len)
+            if magic != INDEX_MAGIC or len(names) < id_len + filename_len + segment_len:
+                # A torn tail entry is still being written; pick it up next time
+                index_file.seek(start)
+                return
+            pdf_id = names[:id_len].decode('utf-8')
+            filename = names[id_len:id_len + filename_len].decode('utf-8')
+            segment = names[id_len + filename_len:].decode('utf-8')
+            index[pdf_id] = IndexEntry(segment, offset, length, expiration, created_at, checksum, filename)
+
+    def _refresh_index(self):
+        """Read index entries written since the last refresh, or all of them if the index was replaced."""
+        with self._lock:
+            if not os.path.exists(self.index_path):
+                if self._index_inode is not None or self._index:
+                    return
+                self._rebuild_index()
+            try:
+                index_stat = os.stat(self.index_path)
+            except FileNotFoundError:
+                return
+            if index_stat.st_ino != self._index_inode:
+                self._index = {}
+                self._index_offset = 0
+                self._index_inode = index_stat.st_ino
+            if index_stat.st_size == self._index_offset:
+                return
+            with open(self.index_path, 'rb') as index_file:
+                index_file.seek(self._index_offset)
+                self._parse_index(index_file, self._index)
+                self._index_offset = index_file.tell()
+
+    def _rebuild_index(self):
+        """Recreate a missing index by scanning the segment files."""
+        segments = self._segment_names()
+        if not segments:
+            return
+        logger.warning("PDF store index missing in %s, rebuilding from %d segments",
+                       self.directory, len(segments))
+        rebuilt = {}
+        for segment in segments:
+            with open(self._segment_path(segment), 'rb') as segment_file:
+                for pdf_id, entry in self._scan_segment(segment, segment_file):
+                    current = rebuilt.get(pdf_id)
+                    if current is None or entry.created_at >= current.created_at:
+                        rebuilt[pdf_id] = entry
+        lock_file = self._flock('index.lock')
+        try:
+            if not os.path.exists(self.index_path):
+                self._write_index(rebuilt)
+        finally:
+            lock_file.close()
+
+    def _write_index(self, index):
+        """Atomically replace the index file with the given entries."""
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as index_file:
+            for pdf_id, entry in index.items():
+                index_file.write(self._pack_index_entry(pdf_id, entry))
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(temp_path, self.index_path)
+
+    @staticmethod
+    def _pack_index_entry(pdf_id, entry):
+        """Serialise one index entry."""
+        id_bytes = pdf_id.encode('utf-8')
+        filename_bytes = entry.filename.encode('utf-8')
+        segment_bytes = entry.segment.encode('utf-8')
+        return INDEX_HEADER.pack(
+            INDEX_MAGIC, len(id_bytes), len(filename_bytes), len(segment_bytes),
+            entry.offset, entry.length, entry.expiration, entry.created_at, entry.checksum
+        ) + id_bytes + filename_bytes + segment_bytes
+
+    # Segment files
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, segment + SEGMENT_SUFFIX)
+
+    def _segment_names(self):
+        """List segment names in creation order."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _new_segment_name(self, tag=''):
+        self._segment_counter += 1
+        return f"segment-{int(time.time() * 1000):013d}-{os.getpid()}-{self._segment_counter:06d}{tag}"
+
+    def _writable_segment(self):
+        """Return this process's active segment, rolling over to a new one when needed."""
+        segment = self._active_segment
+        if segment is not None and self._active_pid == os.getpid():
+            try:
+                segment_stat = os.stat(self._segment_path(segment))
+                # Idle segments may be compacted by another process, so never reuse them
+                if (segment_stat.st_size < self.segment_max_bytes and
+                        time.time() - segment_stat.st_mtime < self.seal_after_seconds / 2):
+                    return segment
+            except FileNotFoundError:
+                pass
+        self._active_segment = self._new_segment_name()
+        self._active_pid = os.getpid()
+        return self._active_segment
+
+    def _scan_segment(self, segment, segment_file):
+        """
+        Walk the records of an open segment file without reading PDF data.
+
+        Yields:
+            tuple: PDF ID and the IndexEntry describing its record
+        """
+        while True:
+            header = segment_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            magic, id_len, filename_len, expiration, created_at, data_len, checksum = \
+                RECORD_HEADER.unpack(header)
+            if magic != RECORD_MAGIC:
+                logger.error("Corrupt record header in segment %s at offset %d",
+                             segment, segment_file.tell() - RECORD_HEADER.size)
+                return
+            pdf_id = segment_file.read(id_len).decode('utf-8')
+            filename = segment_file.read(filename_len).decode('utf-8')
+            data_offset = segment_file.tell()
+            yield pdf_id, IndexEntry(segment, data_offset, data_len, expiration, created_at, checksum, filename)
+            segment_file.seek(data_offset + data_len)
+
+    @staticmethod
+    def _write_record(segment_file, pdf_id, filename, expiration, created_at, data):
+        """Write one record and return the offset of its PDF data."""
+        id_bytes = pdf_id.encode('utf-8')
+        filename_bytes = filename.encode('utf-8')
+        checksum = _record_checksum(pdf_id, filename, data)
+        segment_file.write(RECORD_HEADER.pack(
+            RECORD_MAGIC, len(id_bytes), len(filename_bytes), expiration, created_at, len(data), checksum
+        ))
+        segment_file.write(id_bytes)
+        segment_file.write(filename_bytes)
+        data_offset = segment_file.tell()
+        segment_file.write(data)
+        return data_offset, checksum
+
+    def _read_entry_data(self, pdf_id, entry):
+        """Read and verify the PDF bytes an index entry points to."""
+        with open(self._segment_path(entry.segment), 'rb') as segment_file:
+            segment_file.seek(entry.offset)
+            data = segment_file.read(entry.length)
+        if len(data) != entry.length or _record_checksum(pdf_id, entry.filename, data) != entry.checksum:
+            logger.error("Checksum mismatch for PDF %s in segment %s", pdf_id, entry.segment)
+            return None
+        return data
+
+    # Public API
+
+    def append(self, entries):
+        """
+        Persist a batch of PDF entries with one fsync per file.
+
+        Args:
+            entries (dict): Mapping of PDF ID to memory store entry
+        """
+        if not entries:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            segment = self._writable_segment()
+            new_entries = {}
+            with open(self._segment_path(segment), 'ab') as segment_file:
+                for pdf_id, entry in entries.items():
+                    created_at = entry.get('created_at', time.time())
+                    with entry['data'].getbuffer() as data:
+                        offset, checksum = self._write_record(
+                            segment_file, pdf_id, entry['filename'], entry['expiration'], created_at, data
+                        )
+                        length = len(data)
+                    new_entries[pdf_id] = IndexEntry(
+                        segment, offset, length, entry['expiration'], created_at, checksum, entry['filename']
+                    )
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+
+            index_bytes = b''.join(self._pack_index_entry(pdf_id, entry) for pdf_id, entry in new_entries.items())
+            lock_file = self._flock('index.lock')
+            try:
+                with open(self.index_path, 'ab') as index_file:
+                    index_file.write(index_bytes)
+                    index_file.flush()
+                    os.fsync(index_file.fileno())
+            finally:
+                lock_file.close()
+            self._refresh_index()
+
+    def get(self, pdf_id, current_time=None):
+        """
+        Read a single PDF.
+
+        Args:
+            pdf_id (str): ID of the PDF to read
+            current_time (float, optional): Reference time for expiry checks
+
+        Returns:
+            dict: Record with data, filename, expiration and created_at, or None
+        """
+        if current_time is None:
+            current_time = time.time()
+        for attempt in range(2):
+            with self._lock:
+                entry = self._index.get(pdf_id)
+                if entry is None:
+                    # Another process may have stored it since our last look
+                    self._refresh_index()
+                    entry = self._index.get(pdf_id)
+            if entry is None or entry.expiration < current_time:
+                return None
+            try:
+                data = self._read_entry_data(pdf_id, entry)
+            except FileNotFoundError:
+                # The segment was compacted away by another process; reload the index once
+                if attempt == 0:
+                    self._refresh_index()
+                    continue
+                return None
+            if data is None:
+                return None
+            return {
+                'data': data,
+                'filename': entry.filename,
+                'expiration': entry.expiration,
+                'created_at': entry.created_at
+            }
+        return None
+
+    def ids(self, current_time=None):
+        """
+        List the IDs of every unexpired PDF, reading only the index.
+
+        Args:
+            current_time (float, optional): Reference time for expiry checks
+
+        Returns:
+            list: PDF IDs
+        """
+        if current_time is None:
+            current_time = time.time()
+        with self._lock:
+            self._refresh_index()
+            return [pdf_id for pdf_id, entry in self._index.items() if entry.expiration >= current_time]
+
+    def load_all(self, current_time=None):
+        """
+        Read every unexpired PDF.
+
+        Args:
+            current_time (float, optional): Reference time for expiry checks
+
+        Returns:
+            dict: Mapping of PDF ID to record with data, filename, expiration and created_at
+        """
+        loaded = {}
+        for pdf_id in self.ids(current_time):
+            record = self.get(pdf_id, current_time)
+            if record is not None:
+                loaded[pdf_id] = record
+        return loaded
+
+    def stats(self):
+        """
+        Report the size of the store.
+
+        Returns:
+            dict: Index entries, segment count and total segment bytes
+        """
+        with self._lock:
+            self._refresh_index()
+            segments = self._segment_names()
+            return {
+                'index_entries': len(self._index),
+                'segments': len(segments),
+                'segment_bytes': sum(
+                    os.path.getsize(self._segment_path(segment)) for segment in segments
+                    if os.path.exists(self._segment_path(segment))
+                )
+            }
+
+    def compact(self, current_time=None, min_dead_ratio=0.5):
+        """
+        Drop expired and superseded records from idle segments.
+
+        Segments that have not been written to for ``seal_after_seconds`` and
+        consist mostly of dead records have their live records copied into a new
+        segment; the index is then rewritten and the old segments are deleted.
+        Only one process compacts a directory at a time.
+
+        Args:
+            current_time (float, optional): Reference time for expiry checks
+            min_dead_ratio (float): Fraction of dead bytes that makes a segment worth rewriting
+
+        Returns:
+            dict: Number of segments removed and bytes reclaimed
+        """
+        result = {'segments_removed': 0, 'bytes_reclaimed': 0}
+        if current_time is None:
+            current_time = time.time()
+        compact_lock = self._flock('compact.lock', blocking=False)
+        if compact_lock is None:
+            return result
+        try:
+            index_lock = self._flock('index.lock')
+            try:
+                with self._lock:
+                    self._refresh_index()
+                    live = {
+                        pdf_id: entry for pdf_id, entry in self._index.items()
+                        if entry.expiration >= current_time
+                    }
+                    live_bytes = {}
+                    for entry in live.values():
+                        live_bytes[entry.segment] = live_bytes.get(entry.segment, 0) + entry.length
+
+                    victims = []
+                    for segment in self._segment_names():
+                        if segment == self._active_segment and self._active_pid == os.getpid():
+                            continue
+                        segment_stat = os.stat(self._segment_path(segment))
+                        if time.time() - segment_stat.st_mtime < self.seal_after_seconds:
+                            continue
+                        dead_ratio = 1 - live_bytes.get(segment, 0) / max(segment_stat.st_size, 1)
+                        if dead_ratio >= min_dead_ratio:
+                            victims.append((segment, segment_stat.st_size))
+
+                    if not victims and len(live) == len(self._index):
+                        return result
+
+                    victim_names = {segment for segment, _ in victims}
+                    moved = {pdf_id: entry for pdf_id, entry in live.items() if entry.segment in victim_names}
+                    if moved:
+                        target = self._new_segment_name('-compacted')
+                        with open(self._segment_path(target), 'ab') as segment_file:
+                            for pdf_id, entry in moved.items():
+                                data = self._read_entry_data(pdf_id, entry)
+                                if data is None:
+                                    del live[pdf_id]
+                                    continue
+                                offset, _ = self._write_record(
+                                    segment_file, pdf_id, entry.filename, entry.expiration, entry.created_at, data
+                                )
+                                live[pdf_id] = entry._replace(segment=target, offset=offset)
+                            segment_file.flush()
+                            os.fsync(segment_file.fileno())
+
+                    self._write_index(live)
+                    for segment, size in victims:
+                        os.remove(self._segment_path(segment))
+                        result['segments_removed'] += 1
+                        result['bytes_reclaimed'] += size
+                    self._refresh_index()
+            finally:
+                index_lock.close()
+        finally:
+            compact_lock.close()
+
+        logger.info("Compacted PDF store: removed %d segments, reclaimed %d bytes",
+                    result['segments_removed'], result['bytes_reclaimed'])
+        return result
+
+    def start_compaction(self, interval_seconds):
+        """
+        Run ``compact`` periodically on a background thread.
+
+        Args:
+            interval_seconds (float): Time between compaction passes
+        """
+        if self._compaction_thread is not None or interval_seconds <= 0:
+            return
+
+        def compaction_loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.compact()
+                except (IOError, OSError) as ex:
+                    logger.error("PDF store compaction failed: %s", str(ex))
+
+        self._compaction_thread = threading.Thread(target=compaction_loop, name='pdf-store-compaction', daemon=True)
+        self._compaction_thread.start()
+
+
+class PdfPersister:
+    """
+    Write-behind persister for the PDF memory store.
+
+    Request handlers call ``mark_dirty`` and return immediately. A single
+    background thread waits for the debounce interval, coalesces everything
+    marked in the meantime (the newest entry per ID wins) and appends it to the
+    on-disk store in one batch. Pending entries are flushed once more at shutdown.
+    """
+
+    def __init__(self, record_log, debounce_seconds=2.0):
+        """
+        Args:
+            record_log (SegmentedPdfStore): Store the entries are written to
+            debounce_seconds (float): How long to collect changes before writing
+        """
+        self.record_log = record_log
+        self.debounce_seconds = max(0.0, float(debounce_seconds))
+        self._dirty = {}
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self.stats = {
+            'flushes': 0,
+            'records_written': 0,
+            'last_flush_seconds': 0.0,
+            'errors': 0
+        }
+
+    def start(self):
+        """Start the background thread and register the shutdown flush."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='pdf-persister', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def mark_dirty(self, pdf_id, entry):
+        """
+        Queue a new or changed entry for writing.
+
+        Args:
+            pdf_id (str): ID of the PDF
+            entry (dict): Memory store entry
+        """
+        with self._condition:
+            self._dirty[pdf_id] = entry
+            self._condition.notify()
+
+    def pending(self):
+        """int: Number of entries waiting to be written."""
+        with self._condition:
+            return len(self._dirty)
+
+    def flush(self):
+        """Write all pending entries now, on the calling thread."""
+        with self._condition:
+            batch, self._dirty = self._dirty, {}
+        if not batch:
+            return
+        start_time = time.perf_counter()
+        try:
+            self.record_log.append(batch)
+        except (IOError, OSError) as ex:
+            self.stats['errors'] += 1
+            logger.error("Failed to persist %d PDFs: %s", len(batch), str(ex))
+            # Put the batch back unless newer versions were queued meanwhile
+            with self._condition:
+                for pdf_id, entry in batch.items():
+                    self._dirty.setdefault(pdf_id, entry)
+            return
+        self.stats['flushes'] += 1
+        self.stats['records_written'] += len(batch)
+        self.stats['last_flush_seconds'] = time.perf_counter() - start_time
+        logger.info("Persisted %d PDFs in %.3f seconds", len(batch), self.stats['last_flush_seconds'])
+
+    def _run(self):
+        """Background loop: wait for work, debounce, flush."""
+        while True:
+            with self._condition:
+                while not self._dirty and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                # Let further changes accumulate before writing
+                deadline = time.monotonic() + self.debounce_seconds
+                while not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def stop(self):
+        """Stop the background thread and flush anything still pending."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        self.flush()
@@ -0,0 +1,188 @@
+"""
+Request profiling utility module.
+
+This module runs selected requests under cProfile, including the part of a
+merge that runs in a MergePool process, and keeps the combined statistics in
+a directory shared by all workers so that any of them can serve a profile.
+"""
+import io
+import os
+import re
+import time
+import marshal
+import pstats
+import cProfile
+import logging
+import secrets
+import itertools
+import threading
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Profile IDs are generated by ProfileStore.save; anything else is rejected before touching the disk
+_PROFILE_ID = re.compile(r'^[0-9a-f]{16}$')
+
+
+class _LoadedStats:
+    """Adapter letting pstats.Stats load statistics marshalled in another process."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        """Nothing to do, the statistics are complete."""
+
+
+def profiled_call(fn, *args, progress=None):
+    """
+    Call a MergePool task under cProfile.
+
+    This is a top-level function so that it can run in a MergePool process.
+
+    Args:
+        fn (callable): Task taking ``*args`` and a ``progress`` keyword
+        progress (callable, optional): Passed on to ``fn``
+
+    Returns:
+        tuple: (result of ``fn``, marshalled profile statistics)
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, progress=progress)
+    profiler.create_stats()
+    return result, marshal.dumps(profiler.stats)
+
+
+class RequestSampler:
+    """
+    Decide which requests to profile.
+
+    A request is profiled when it carries the admin token in the
+    ``X-Profile-Token`` header, or when it is the ``sample_every``-th request
+    this process has seen. Without a token and with sampling off, the check is
+    a single comparison.
+    """
+
+    def __init__(self, token=None, sample_every=0):
+        """
+        Args:
+            token (str, optional): Admin token; header-triggered profiling is off without one
+            sample_every (int): Profile one in this many requests; 0 disables sampling
+        """
+        self.token = token or None
+        self.sample_every = max(0, int(sample_every))
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """bool: True if any request can be profiled."""
+        return self.token is not None or self.sample_every > 0
+
+    def is_authorized(self, header_value):
+        """Return whether a request presented the admin token."""
+        return self.token is not None and header_value is not None \
+            and secrets.compare_digest(header_value.encode(), self.token.encode())
+
+    def should_profile(self, header_value=None):
+        """
+        Decide whether to profile a request.
+
+        Args:
+            header_value (str, optional): Value of the request's ``X-Profile-Token`` header
+
+        Returns:
+            bool: True to profile the request
+        """
+        if not self.enabled:
+            return False
+        if self.is_authorized(header_value):
+            return True
+        if self.sample_every:
+            with self._lock:
+                return next(self._counter) % self.sample_every == 0
+        return False
+
+
+class ProfileStore:
+    """Directory of saved profiles in pstats format, pruned to the newest ``max_profiles``."""
+
+    def __init__(self, directory, max_profiles=50):
+        """
+        Args:
+            directory (str): Where profiles are written; shared by all workers
+            max_profiles (int): Number of profiles to keep
+        """
+        self.directory = directory
+        self.max_profiles = max(1, int(max_profiles))
+
+    def path(self, profile_id):
+        """
+        Return the file of a profile.
+
+        Returns:
+            str: Path of the ``.prof`` file, or None for a malformed ID
+        """
+        if not _PROFILE_ID.match(profile_id or ''):
+            return None
+        return os.path.join(self.directory, f'{profile_id}.prof')
+
+    def save(self, profiler, worker_stats=(), label=''):
+        """
+        Combine a request's profile with those of its pool tasks and store it.
+
+        Args:
+            profiler (cProfile.Profile): Profile of the request handler
+            worker_stats (iterable): Marshalled statistics returned by profiled_call
+            label (str): Description logged with the profile ID
+
+        Returns:
+            str: ID to retrieve the profile with
+        """
+        stats = pstats.Stats(profiler)
+        for data in worker_stats:
+            stats.add(_LoadedStats(marshal.loads(data)))
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = secrets.token_hex(8)
+        stats.dump_stats(self.path(profile_id))
+        logger.info("Saved profile %s for %s (%.3f seconds)", profile_id, label, stats.total_tt)
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        """Delete the oldest profiles beyond ``max_profiles``."""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.prof')]
+        except OSError:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[self.max_profiles:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def report(self, profile_id, sort='cumulative', limit=60):
+        """
+        Render a stored profile as text.
+
+        Args:
+            profile_id (str): ID returned by save
+            sort (str): pstats sort key such as ``cumulative`` or ``tottime``
+            limit (int): Number of functions to list
+
+        Returns:
+            str: The pstats report, or None if there is no such profile
+
+        Raises:
+            KeyError: If ``sort`` is not a pstats sort key
+        """
+        path = self.path(profile_id)
+        if path is None or not os.path.exists(path):
+            return None
+        output = io.StringIO()
+        stats = pstats.Stats(path, stream=output)
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(path)))
+        output.write(f'Profile {profile_id} recorded {created}\n')
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
@@ -0,0 +1,369 @@
+"""
+Shared PDF store utility module.
+
+This module provides dictionary-like stores for PDFs and merge job status, and
+the admission token buckets, backed by a SQLite database in WAL mode, so that
+every worker process on a host sees the same data.
+"""
+import io
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections.abc import MutableMapping
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pdfs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    expiration REAL NOT NULL,
+    created_at REAL NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pdfs_expiration ON pdfs (expiration);
+"""
+
+# Default of pop() telling "no default given" apart from None
+_MISSING = object()
+
+
+class SqliteBackedStore:
+    """
+    Base class holding per-thread, per-process SQLite connections.
+
+    SQLite connections must not be shared across threads or inherited over
+    fork, so every thread of every process opens its own connection lazily.
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000):
+        """
+        Args:
+            path (str): Location of the database file
+            busy_timeout_ms (int): How long a writer waits for a concurrent writer
+        """
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connection(self):
+        """Return the connection owned by the current thread and process."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+class SqlitePdfStore(SqliteBackedStore, MutableMapping):
+    """
+    PDF store shared between processes through a SQLite database file.
+
+    The store behaves like the in-memory ``pdf_memory_store`` dictionary: keys
+    are PDF IDs and values are entries with ``data`` (a BytesIO), ``filename``,
+    ``expiration``, ``created_at`` and ``size_bytes``. WAL journaling lets
+    readers in all workers proceed while one worker writes.
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000):
+        """
+        Args:
+            path (str): Location of the database file
+            busy_timeout_ms (int): How long a writer waits for a concurrent writer
+        """
+        super().__init__(path, busy_timeout_ms)
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    @staticmethod
+    def _row_to_entry(row):
+        """Build a store entry from a (filename, expiration, created_at, size_bytes, data) row."""
+        filename, expiration, created_at, size_bytes, data = row
+        return {
+            'data': io.BytesIO(data),
+            'filename': filename,
+            'expiration': expiration,
+            'created_at': created_at,
+            'size_bytes': size_bytes
+        }
+
+    def __getitem__(self, pdf_id):
+        row = self._connection().execute(
+            'SELECT filename, expiration, created_at, size_bytes, data FROM pdfs WHERE id = ?',
+            (pdf_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(pdf_id)
+        return self._row_to_entry(row)
+
+    def __setitem__(self, pdf_id, entry):
+        with entry['data'].getbuffer() as data:
+            with self._connection() as connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO pdfs (id, filename, expiration, created_at, size_bytes, data) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (pdf_id, entry['filename'], entry['expiration'],
+                     entry.get('created_at', time.time()), len(data), data)
+                )
+
+    def __delitem__(self, pdf_id):
+        with self._connection() as connection:
+            cursor = connection.execute('DELETE FROM pdfs WHERE id = ?', (pdf_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(pdf_id)
+
+    def pop(self, pdf_id, default=_MISSING):
+        """
+        Remove a PDF and return its entry.
+
+        One DELETE ... RETURNING statement, unlike MutableMapping.pop's lookup
+        followed by a delete, so a row another worker deletes in between gives
+        ``default`` rather than a KeyError.
+
+        Args:
+            pdf_id (str): ID of the PDF
+            default: Returned if there is no such PDF
+
+        Returns:
+            dict: The removed entry, or ``default``
+
+        Raises:
+            KeyError: If there is no such PDF and no default was given
+        """
+        with self._connection() as connection:
+            rows = connection.execute(
+                'DELETE FROM pdfs WHERE id = ? RETURNING filename, expiration, created_at, size_bytes, data',
+                (pdf_id,)
+            ).fetchall()
+        if not rows:
+            if default is _MISSING:
+                raise KeyError(pdf_id)
+            return default
+        return self._row_to_entry(rows[0])
+
+    def __contains__(self, pdf_id):
+        return self._connection().execute(
+            'SELECT 1 FROM pdfs WHERE id = ?', (pdf_id,)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        return iter([row[0] for row in self._connection().execute('SELECT id FROM pdfs')])
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM pdfs').fetchone()[0]
+
+    def replace_if_size(self, pdf_id, expected_size, data):
+        """
+        Replace a PDF's bytes only if it still has the size the caller last saw.
+
+        The check and the write are one UPDATE statement, so of two workers
+        that read the same version only one can replace it.
+
+        Args:
+            pdf_id (str): ID of the PDF
+            expected_size (int): ``size_bytes`` the caller read
+            data (BytesIO): New content
+
+        Returns:
+            bool: True if the PDF was replaced, False if it changed or is gone
+        """
+        with data.getbuffer() as buffer:
+            with self._connection() as connection:
+                cursor = connection.execute(
+                    'UPDATE pdfs SET data = ?, size_bytes = ? WHERE id = ? AND size_bytes = ?',
+                    (buffer, len(buffer), pdf_id, expected_size)
+                )
+        return cursor.rowcount == 1
+
+    def total_bytes(self):
+        """int: Combined size of all stored PDFs."""
+        return self._connection().execute('SELECT COALESCE(SUM(size_bytes), 0) FROM pdfs').fetchone()[0]
+
+    def purge_expired(self, current_time=None):
+        """
+        Delete every PDF whose expiration has passed.
+
+        Uses the expiration index, so the cost depends on the number of expired rows only.
+
+        Args:
+            current_time (float, optional): Reference time for expiry checks
+
+        Returns:
+            list: IDs of the deleted PDFs
+        """
+        if current_time is None:
+            current_time = time.time()
+        with self._connection() as connection:
+            expired_ids = [row[0] for row in connection.execute(
+                'SELECT id FROM pdfs WHERE expiration < ?', (current_time,)
+            )]
+            if expired_ids:
+                connection.execute('DELETE FROM pdfs WHERE expiration < ?', (current_time,))
+        return expired_ids
+
+
+class SqliteJobStatusStore(SqliteBackedStore, MutableMapping):
+    """
+    Merge job status records shared between processes through SQLite.
+
+    Keys are job IDs and values are JSON-serialisable status dictionaries. The
+    table lives in the same database file as the PDFs, so a job queued by one
+    worker can be polled through any other. A record's ``expires_at``, if it
+    has one, is also kept in an indexed column for purge_expired.
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000):
+        """
+        Args:
+            path (str): Location of the database file
+            busy_timeout_ms (int): How long a writer waits for a concurrent writer
+        """
+        super().__init__(path, busy_timeout_ms)
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS merge_jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, expires_at REAL)'
+            )
+            columns = [row[1] for row in connection.execute('PRAGMA table_info(merge_jobs)')]
+            if 'expires_at' not in columns:
+                # Databases created by older releases; their records simply never expire by index
+                connection.execute('ALTER TABLE merge_jobs ADD COLUMN expires_at REAL')
+            connection.execute('CREATE INDEX IF NOT EXISTS merge_jobs_expires_at ON merge_jobs (expires_at)')
+
+    def __getitem__(self, job_id):
+        row = self._connection().execute('SELECT status FROM merge_jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        return json.loads(row[0])
+
+    def __setitem__(self, job_id, status):
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO merge_jobs (id, status, expires_at) VALUES (?, ?, ?)',
+                               (job_id, json.dumps(status), status.get('expires_at')))
+
+    def __delitem__(self, job_id):
+        with self._connection() as connection:
+            cursor = connection.execute('DELETE FROM merge_jobs WHERE id = ?', (job_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(job_id)
+
+    def pop(self, job_id, default=_MISSING):
+        """
+        Remove a job record and return it in one statement; see SqlitePdfStore.pop.
+
+        Raises:
+            KeyError: If there is no such job and no default was given
+        """
+        with self._connection() as connection:
+            rows = connection.execute('DELETE FROM merge_jobs WHERE id = ? RETURNING status', (job_id,)).fetchall()
+        if not rows:
+            if default is _MISSING:
+                raise KeyError(job_id)
+            return default
+        return json.loads(rows[0][0])
+
+    def __iter__(self):
+        return iter([row[0] for row in self._connection().execute('SELECT id FROM merge_jobs')])
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM merge_jobs').fetchone()[0]
+
+    def purge_expired(self, current_time=None):
+        """
+        Delete every job record whose ``expires_at`` has passed.
+
+        Uses the expiration index, so the cost depends on the number of expired records only.
+
+        Args:
+            current_time (float, optional): Reference time for expiry checks
+
+        Returns:
+            int: Number of records deleted
+        """
+        if current_time is None:
+            current_time = time.time()
+        with self._connection() as connection:
+            cursor = connection.execute('DELETE FROM merge_jobs WHERE expires_at < ?', (current_time,))
+        return cursor.rowcount
+
+
+class SqliteTokenBucketStore(SqliteBackedStore):
+    """
+    Admission token buckets shared between processes through SQLite.
+
+    A drop-in for admission.TokenBucketStore, so that a client's CPU budget
+    holds for the host rather than for each gunicorn worker separately. Each
+    refill-and-take runs in one write transaction, so two workers cannot both
+    spend the same tokens. Refill times are wall-clock times, which every
+    process on the host agrees on.
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000, max_clients=10000):
+        """
+        Args:
+            path (str): Location of the database file
+            busy_timeout_ms (int): How long a writer waits for a concurrent writer
+            max_clients (int): Buckets kept before full, idle ones are dropped
+        """
+        super().__init__(path, busy_timeout_ms)
+        self.max_clients = max(1, int(max_clients))
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS admission_buckets '
+                '(client TEXT PRIMARY KEY, tokens REAL NOT NULL, refilled_at REAL NOT NULL)'
+            )
+
+    @staticmethod
+    def _refilled(row, rate, burst, now):
+        """Return the tokens of a (tokens, refilled_at) row at ``now``, a full bucket for no row."""
+        if row is None:
+            return burst
+        tokens, refilled_at = row
+        return min(burst, tokens + max(0.0, now - refilled_at) * rate)
+
+    def take(self, client, cost, rate, burst):
+        """
+        Refill a client's bucket and take ``cost`` from it if it can pay; see TokenBucketStore.take.
+
+        Returns:
+            tuple: (whether the cost was taken, tokens in the bucket before taking it)
+        """
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            # Take the write lock before reading, so the read and the update cannot interleave with another worker
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT tokens, refilled_at FROM admission_buckets WHERE client = ?',
+                                     (client,)).fetchone()
+            if row is None and connection.execute(
+                    'SELECT COUNT(*) FROM admission_buckets').fetchone()[0] >= self.max_clients:
+                connection.execute('DELETE FROM admission_buckets WHERE tokens + (? - refilled_at) * ? >= ?',
+                                   (now, rate, burst))
+            tokens = self._refilled(row, rate, burst, now)
+            taken = tokens >= min(cost, burst)
+            connection.execute('INSERT OR REPLACE INTO admission_buckets (client, tokens, refilled_at) '
+                               'VALUES (?, ?, ?)', (client, tokens - cost if taken else tokens, now))
+        return taken, tokens
+
+    def charge(self, client, cost):
+        """Take ``cost`` from a client's bucket, which may go into debt; a negative cost refunds."""
+        with self._connection() as connection:
+            connection.execute('UPDATE admission_buckets SET tokens = tokens - ? WHERE client = ?', (cost, client))
+
+    def tokens(self, client, rate, burst):
+        """Return the tokens in a client's bucket as of now."""
+        row = self._connection().execute('SELECT tokens, refilled_at FROM admission_buckets WHERE client = ?',
+                                         (client,)).fetchone()
+        return self._refilled(row, rate, burst, time.time())
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM admission_buckets').fetchone()[0]
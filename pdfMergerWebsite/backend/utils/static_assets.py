@@ -0,0 +1,196 @@
+"""
+Static asset utility module.
+
+This module loads the frontend files once at startup and keeps them in memory
+together with a strong ETag and precompressed gzip variants, plus brotli
+variants when the ``brotli`` package is installed. Stylesheets and scripts
+are also published under a name containing their content hash, and HTML
+pages are rewritten to reference those names, so that browsers can cache
+them for good while a changed file still reaches them under a new name.
+"""
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are built
+    brotli = None
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Files larger than this are left to be served from disk
+MAX_ASSET_BYTES = 1024 * 1024
+
+# Compressing smaller files saves less than the Content-Encoding header costs
+MIN_COMPRESS_BYTES = 256
+
+# Types worth compressing; images and fonts are compressed already
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/manifest+json',
+                      'image/svg+xml')
+
+# Extensions of assets published under a hashed name as well
+HASHED_EXTENSIONS = ('.css', '.js')
+
+# Digits of the content hash put into hashed names
+HASH_LENGTH = 10
+
+# src and href attributes of HTML pages, to point them at hashed names
+_REFERENCE_PATTERN = re.compile(r'''((?:src|href)=["'])(/?)([^"'?#:]+)(["'])''')
+
+
+class StaticAsset:
+    """
+    One frontend file held in memory.
+
+    Attributes:
+        path (str): Path relative to the asset root, with forward slashes
+        content_type (str): Content-Type header value
+        etag (str): Unquoted strong ETag of the uncompressed content
+        variants (dict): Body by content coding, ``identity`` always present
+        hashed_path (str): Path under which the asset may be cached forever, or None
+    """
+
+    def __init__(self, path, data, content_type):
+        self.path = path
+        self.content_type = content_type
+        self.etag = hashlib.sha256(data).hexdigest()
+        self.variants = {'identity': data}
+        self.hashed_path = None
+        if len(data) >= MIN_COMPRESS_BYTES and content_type.startswith(COMPRESSIBLE_TYPES):
+            # mtime=0 keeps the gzip bytes, and so any cache keyed on them, stable across restarts
+            compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed['br'] = brotli.compress(data, quality=11)
+            for coding, body in compressed.items():
+                if len(body) < len(data):
+                    self.variants[coding] = body
+
+    @property
+    def compressible(self):
+        """bool: Whether the asset has compressed variants, and so varies by Accept-Encoding."""
+        return len(self.variants) > 1
+
+    def negotiate(self, accept_encodings):
+        """
+        Pick the smallest variant the client accepts.
+
+        Args:
+            accept_encodings: Parsed Accept-Encoding header, such as werkzeug's
+                ``request.accept_encodings``; indexing it with a coding gives its quality
+
+        Returns:
+            tuple: (content coding, body, ETag of that variant)
+        """
+        best = 'identity'
+        for coding, body in self.variants.items():
+            if coding != 'identity' and accept_encodings[coding] > 0 \
+                    and len(body) < len(self.variants[best]):
+                best = coding
+        # A strong ETag names one representation, so compressed variants get their own
+        etag = self.etag if best == 'identity' else f'{self.etag}-{best}'
+        return best, self.variants[best], etag
+
+
+class StaticAssetBundle:
+    """
+    The frontend files of a directory, loaded and compressed once.
+
+    Files beyond MAX_ASSET_BYTES and files added after loading are not part
+    of the bundle; callers serve those from disk as before.
+    """
+
+    def __init__(self, root):
+        """
+        Load every file under a directory.
+
+        Args:
+            root (str): Directory holding the frontend
+        """
+        self.root = root
+        self._assets = {}
+        self._hashed = {}
+        self.load()
+
+    def load(self):
+        """Read, fingerprint and compress the files under the root again."""
+        assets = {}
+        pages = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                full_path = os.path.join(directory, filename)
+                path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                try:
+                    if os.path.getsize(full_path) > MAX_ASSET_BYTES:
+                        continue
+                    with open(full_path, 'rb') as asset_file:
+                        data = asset_file.read()
+                except OSError as ex:
+                    logger.warning("Cannot load static asset %s: %s", full_path, str(ex))
+                    continue
+                content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                if content_type.startswith('text/') or content_type in ('application/javascript',
+                                                                         'application/json'):
+                    content_type += '; charset=utf-8'
+                if path.endswith('.html'):
+                    pages.append((path, data, content_type))
+                else:
+                    assets[path] = StaticAsset(path, data, content_type)
+
+        hashed = {}
+        for path, asset in assets.items():
+            if path.endswith(HASHED_EXTENSIONS):
+                stem, extension = os.path.splitext(path)
+                asset.hashed_path = f'{stem}.{asset.etag[:HASH_LENGTH]}{extension}'
+                hashed[asset.hashed_path] = asset
+        # Pages are loaded last, once the hashed names they should reference are known
+        for path, data, content_type in pages:
+            assets[path] = StaticAsset(path, self._rewrite_references(path, data, assets), content_type)
+
+        self._assets, self._hashed = assets, hashed
+        logger.info("Loaded %d static assets (%d bytes, brotli %s)", len(assets),
+                    sum(len(asset.variants['identity']) for asset in assets.values()),
+                    'available' if brotli is not None else 'not installed')
+
+    @staticmethod
+    def _rewrite_references(page_path, data, assets):
+        """Point the src and href attributes of a page at the hashed names of the assets they load."""
+        page_dir = os.path.dirname(page_path)
+
+        def replace(match):
+            prefix, slash, reference, suffix = match.groups()
+            path = reference if slash else os.path.normpath(os.path.join(page_dir, reference)).replace(os.sep, '/')
+            asset = assets.get(path)
+            if asset is None or asset.hashed_path is None:
+                return match.group(0)
+            hashed_reference = asset.hashed_path if slash else \
+                os.path.relpath(asset.hashed_path, page_dir or '.').replace(os.sep, '/')
+            return f'{prefix}{slash}{hashed_reference}{suffix}'
+
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data
+        return _REFERENCE_PATTERN.sub(replace, text).encode('utf-8')
+
+    def get(self, path):
+        """
+        Look up an asset by its path or hashed path.
+
+        Args:
+            path (str): Path relative to the root, with forward slashes
+
+        Returns:
+            tuple: (StaticAsset, whether ``path`` is the hashed name), or (None, False)
+        """
+        asset = self._hashed.get(path)
+        if asset is not None:
+            return asset, True
+        return self._assets.get(path), False
+
+    def __len__(self):
+        return len(self._assets)
@@ -0,0 +1,136 @@
+"""
+PDF streaming utility module.
+
+This module lets a merged PDF be sent to the client while it is still being
+written: pypdf writes into a file-like object that hands fixed-size chunks to
+the response generator through a bounded queue.
+"""
+import io
+import queue
+import logging
+import threading
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Sentinel marking the end of the chunk stream
+_END = object()
+
+
+class ChunkQueueWriter(io.RawIOBase):
+    """
+    Write-only stream that forwards its data as chunks on a bounded queue.
+
+    Writes are gathered into chunks of ``chunk_size`` bytes. When the queue is
+    full the writer blocks, so a slow client throttles the merge instead of
+    letting output pile up in memory. ``tell`` reports the number of bytes
+    written, which is all pypdf needs to compute cross-reference offsets.
+    """
+
+    def __init__(self, chunk_queue, chunk_size=64 * 1024, tee=None):
+        """
+        Args:
+            chunk_queue (queue.Queue): Queue the chunks are put on
+            chunk_size (int): Size of the chunks handed to the queue
+            tee (file-like, optional): Also receives every byte written
+        """
+        super().__init__()
+        self.chunk_queue = chunk_queue
+        self.chunk_size = max(1, int(chunk_size))
+        self.tee = tee
+        self._buffer = bytearray()
+        self._position = 0
+        self.cancelled = threading.Event()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        if self.cancelled.is_set():
+            raise BrokenPipeError('Client stopped reading the merged PDF')
+        self._buffer += data
+        self._position += len(data)
+        if self.tee is not None:
+            self.tee.write(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._put(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _put(self, chunk):
+        """Queue a chunk, giving up if the consumer went away."""
+        while not self.cancelled.is_set():
+            try:
+                self.chunk_queue.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise BrokenPipeError('Client stopped reading the merged PDF')
+
+
+def stream_pdf_write(write_pdf, chunk_size=64 * 1024, max_chunks=8, tee=None, on_complete=None):
+    """
+    Run a PDF write on a producer thread and yield its output as it is produced.
+
+    At most ``max_chunks`` chunks wait between the producer and the consumer,
+    so memory use stays bounded whatever the size of the output.
+
+    Args:
+        write_pdf (callable): Called with a writable stream; writes the whole PDF to it
+        chunk_size (int): Size of the yielded chunks
+        max_chunks (int): Chunks allowed to wait for the consumer
+        tee (file-like, optional): Also receives the complete output
+        on_complete (callable, optional): Called on the producer thread after a successful write
+
+    Yields:
+        bytes: Consecutive chunks of the PDF
+
+    Raises:
+        Exception: Whatever ``write_pdf`` raised, re-raised in the consumer
+    """
+    chunk_queue = queue.Queue(maxsize=max(1, int(max_chunks)))
+    writer = ChunkQueueWriter(chunk_queue, chunk_size, tee)
+    failure = []
+
+    def produce():
+        try:
+            write_pdf(writer)
+            writer.flush()
+            if on_complete is not None:
+                on_complete()
+        except BrokenPipeError:
+            logger.info("Streaming merge cancelled by the client")
+        except Exception as ex:  # pylint: disable=broad-except
+            # Handed to the consumer, which re-raises it in the response generator
+            logger.exception("Streaming merge failed: %s", str(ex))
+            failure.append(ex)
+        finally:
+            while not writer.cancelled.is_set():
+                try:
+                    chunk_queue.put(_END, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+
+    producer = threading.Thread(target=produce, name='pdf-stream-writer', daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is _END:
+                break
+            yield chunk
+        if failure:
+            raise failure[0]
+    finally:
+        # Runs when the response is closed early too; unblocks the producer
+        writer.cancelled.set()
+        producer.join(timeout=5)
@@ -0,0 +1,235 @@
+"""
+Tiered PDF store utility module.
+
+This module provides a dictionary-like PDF store that keeps recently used PDFs
+in memory within a byte budget and spills the least recently used ones to
+files on disk, loading them back into memory when they are downloaded again.
+"""
+import io
+import os
+import uuid
+import shutil
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+
+def _entry_size(entry):
+    """Return the number of bytes an entry's PDF data occupies."""
+    size_bytes = entry.get('size_bytes')
+    if size_bytes is None:
+        with entry['data'].getbuffer() as data:
+            size_bytes = len(data)
+    return size_bytes
+
+
+class TieredPdfStore(MutableMapping):
+    """
+    PDF store with a memory tier bounded in bytes and a disk tier behind it.
+
+    Keys are PDF IDs and values are entries like those of ``pdf_memory_store``:
+    ``data`` (a BytesIO), ``filename``, ``expiration``, ``created_at`` and
+    ``size_bytes``. When the PDFs in memory exceed ``max_memory_bytes`` the
+    least recently stored or read entries are written to ``spill_dir`` and
+    only their metadata stays in memory. Reading a spilled entry promotes it
+    back into memory. A ``max_memory_bytes`` of zero keeps everything in memory.
+    """
+
+    def __init__(self, spill_dir, max_memory_bytes=0):
+        """
+        Args:
+            spill_dir (str): Directory under which this store creates its spill directory
+            max_memory_bytes (int): Byte budget of the memory tier; 0 for no limit
+        """
+        self.max_memory_bytes = max(0, int(max_memory_bytes))
+        self.spill_dir = None
+        self._spill_parent = spill_dir
+        self._memory = OrderedDict()
+        self._disk = {}
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.RLock()
+        self.stats = {'spills': 0, 'promotions': 0, 'disk_reads': 0, 'spill_errors': 0}
+
+    def _spill_path(self):
+        """Return a fresh file path in this store's own spill directory."""
+        if self.spill_dir is None:
+            # Each process gets its own directory, so workers never touch each other's files
+            os.makedirs(self._spill_parent, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix='pdf-spill-', dir=self._spill_parent)
+        return os.path.join(self.spill_dir, uuid.uuid4().hex + '.pdf')
+
+    def _spill_one(self):
+        """Move the least recently used memory entry to the disk tier."""
+        pdf_id, entry = self._memory.popitem(last=False)
+        size_bytes = _entry_size(entry)
+        self._memory_bytes -= size_bytes
+        path = self._spill_path()
+        try:
+            with open(path, 'wb') as spill_file, entry['data'].getbuffer() as data:
+                spill_file.write(data)
+        except OSError as ex:
+            # Keep the entry rather than lose the PDF; the budget is exceeded until the disk recovers
+            logger.error("Could not spill PDF %s to disk: %s", pdf_id, str(ex))
+            self.stats['spill_errors'] += 1
+            self._memory[pdf_id] = entry
+            self._memory.move_to_end(pdf_id, last=False)
+            self._memory_bytes += size_bytes
+            return False
+        metadata = {key: value for key, value in entry.items() if key != 'data'}
+        metadata['size_bytes'] = size_bytes
+        self._disk[pdf_id] = (path, metadata)
+        self._disk_bytes += size_bytes
+        self.stats['spills'] += 1
+        logger.debug("Spilled PDF %s to disk (%d bytes)", pdf_id, size_bytes)
+        return True
+
+    def _enforce_budget(self):
+        """Spill entries until the memory tier fits its budget."""
+        if not self.max_memory_bytes:
+            return
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            if not self._spill_one():
+                break
+
+    def _remove(self, pdf_id):
+        """Drop an ID from both tiers; returns whether it existed."""
+        entry = self._memory.pop(pdf_id, None)
+        if entry is not None:
+            self._memory_bytes -= _entry_size(entry)
+            return True
+        spilled = self._disk.pop(pdf_id, None)
+        if spilled is None:
+            return False
+        path, metadata = spilled
+        self._disk_bytes -= metadata['size_bytes']
+        try:
+            os.remove(path)
+        except OSError as ex:
+            logger.warning("Could not remove spilled PDF %s: %s", path, str(ex))
+        return True
+
+    def __getitem__(self, pdf_id):
+        with self._lock:
+            entry = self._memory.get(pdf_id)
+            if entry is not None:
+                self._memory.move_to_end(pdf_id)
+                return entry
+            spilled = self._disk.get(pdf_id)
+            if spilled is None:
+                raise KeyError(pdf_id)
+            path, metadata = spilled
+            try:
+                with open(path, 'rb') as spill_file:
+                    entry = dict(metadata, data=io.BytesIO(spill_file.read()))
+            except OSError as ex:
+                logger.error("Spilled PDF %s could not be read, dropping it: %s", pdf_id, str(ex))
+                self._remove(pdf_id)
+                raise KeyError(pdf_id) from ex
+            self.stats['disk_reads'] += 1
+            if self.max_memory_bytes and metadata['size_bytes'] > self.max_memory_bytes:
+                # Would push everything else out of memory; serve it from disk each time
+                return entry
+            self._remove(pdf_id)
+            self._memory[pdf_id] = entry
+            self._memory_bytes += metadata['size_bytes']
+            self.stats['promotions'] += 1
+            self._enforce_budget()
+            return entry
+
+    def __setitem__(self, pdf_id, entry):
+        with self._lock:
+            self._remove(pdf_id)
+            self._memory[pdf_id] = entry
+            self._memory_bytes += _entry_size(entry)
+            self._enforce_budget()
+
+    def __delitem__(self, pdf_id):
+        with self._lock:
+            if not self._remove(pdf_id):
+                raise KeyError(pdf_id)
+
+    def __contains__(self, pdf_id):
+        with self._lock:
+            return pdf_id in self._memory or pdf_id in self._disk
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._memory) + list(self._disk))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._memory) + len(self._disk)
+
+    def peek(self, pdf_id, default=None):
+        """
+        Look up an entry without reading spilled data or changing its recency.
+
+        Args:
+            pdf_id (str): ID of the PDF
+            default: Returned if the ID is unknown
+
+        Returns:
+            dict: The entry; spilled entries have ``data`` set to None
+        """
+        with self._lock:
+            entry = self._memory.get(pdf_id)
+            if entry is not None:
+                return entry
+            spilled = self._disk.get(pdf_id)
+            if spilled is None:
+                return default
+            return dict(spilled[1], data=None)
+
+    def replace_if_size(self, pdf_id, expected_size, data):
+        """
+        Replace a PDF's bytes only if it still has the size the caller last saw.
+
+        Args:
+            pdf_id (str): ID of the PDF
+            expected_size (int): ``size_bytes`` the caller read
+            data (BytesIO): New content
+
+        Returns:
+            bool: True if the PDF was replaced, False if it changed or is gone
+        """
+        with self._lock:
+            current = self.peek(pdf_id)
+            # Spilled entries keep size_bytes in their metadata, so this never reads the disk
+            if current is None or _entry_size(current) != expected_size:
+                return False
+            with data.getbuffer() as buffer:
+                size_bytes = len(buffer)
+            self[pdf_id] = dict(current, data=data, size_bytes=size_bytes)
+            return True
+
+    def tier_stats(self):
+        """
+        Report the size of both tiers and the spill and promotion counters.
+
+        Returns:
+            dict: Entries and bytes per tier, the memory budget and the counters
+        """
+        with self._lock:
+            return dict(
+                self.stats,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_bytes,
+                max_memory_bytes=self.max_memory_bytes,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_bytes
+            )
+
+    def close(self):
+        """Delete the spill directory; spilled entries are lost."""
+        with self._lock:
+            self._disk.clear()
+            self._disk_bytes = 0
+            if self.spill_dir is not None:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
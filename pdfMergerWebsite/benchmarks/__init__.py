@@ -0,0 +1,6 @@
+"""
+Benchmark suite for the PDF Merger.
+
+This package generates a deterministic synthetic PDF corpus and times the
+merge, upload, download and persistence paths against it.
+"""
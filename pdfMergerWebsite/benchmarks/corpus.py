@@ -0,0 +1,140 @@
+"""
+Benchmark corpus generator module.
+
+This module writes a deterministic set of synthetic PDFs for the benchmark
+suite. Documents are assembled from raw PDF syntax with a seeded random
+generator, so the same seed and scale always produce byte-identical files and
+benchmark results stay comparable between runs and machines.
+"""
+import os
+import zlib
+import random
+import logging
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Scenario name -> list of (number of files, document spec). Page counts and
+# file counts of "many_small" are multiplied by the corpus scale.
+CORPUS_SCENARIOS = {
+    'page_counts': [(1, {'pages': 1}), (1, {'pages': 10}), (1, {'pages': 50}), (1, {'pages': 200})],
+    'image_heavy': [(4, {'pages': 5, 'image_size': (256, 256)})],
+    'font_heavy': [(4, {'pages': 10, 'fonts': 8, 'font_bytes': 40000})],
+    'many_small': [(50, {'pages': 1})],
+    'huge': [(2, {'pages': 1500, 'text_lines': 60})],
+}
+
+
+def _stream(dictionary, data):
+    """Return the syntax of a stream object with the given extra dictionary entries."""
+    return b'<< %s /Length %d >>\nstream\n%s\nendstream' % (dictionary, len(data), data)
+
+
+def build_pdf(rng, pages, text_lines=40, image_size=None, fonts=1, font_bytes=0):
+    """
+    Assemble one synthetic PDF.
+
+    Args:
+        rng (random.Random): Source of all variable content
+        pages (int): Number of pages
+        text_lines (int): Lines of text drawn on each page
+        image_size (tuple, optional): (width, height) of a noise image placed on every page,
+            each page getting its own image
+        fonts (int): Number of fonts in the page resources
+        font_bytes (int): Size of the embedded font program of each font; 0 for standard fonts
+
+    Returns:
+        bytes: The PDF document
+    """
+    objects = {1: b'<< /Type /Catalog /Pages 2 0 R >>'}
+    next_id = 3
+    font_refs = []
+    for font_index in range(fonts):
+        font_id = next_id
+        if font_bytes:
+            descriptor_id, file_id = font_id + 1, font_id + 2
+            objects[font_id] = (b'<< /Type /Font /Subtype /TrueType /BaseFont /Synthetic%d '
+                                b'/FontDescriptor %d 0 R >>' % (font_index, descriptor_id))
+            objects[descriptor_id] = (b'<< /Type /FontDescriptor /FontName /Synthetic%d /Flags 32 '
+                                      b'/FontFile2 %d 0 R >>' % (font_index, file_id))
+            objects[file_id] = _stream(b'', rng.randbytes(font_bytes))
+            next_id += 3
+        else:
+            objects[font_id] = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+            next_id += 1
+        font_refs.append(b'/F%d %d 0 R' % (font_index, font_id))
+    font_dictionary = b'<< ' + b' '.join(font_refs) + b' >>'
+
+    page_ids = []
+    for page_number in range(pages):
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        words = [b'%08x' % rng.getrandbits(32) for _ in range(text_lines * 6)]
+        lines = [b'BT /F%d 9 Tf 36 %d Td (%s) Tj ET' % (line % fonts, 760 - 12 * line, b' '.join(words[line * 6:line * 6 + 6]))
+                 for line in range(text_lines)]
+        resources = b'/Font ' + font_dictionary
+        if image_size:
+            image_id = next_id
+            next_id += 1
+            width, height = image_size
+            objects[image_id] = _stream(
+                b'/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray /BitsPerComponent 8'
+                % (width, height), rng.randbytes(width * height))
+            resources += b' /XObject << /Im0 %d 0 R >>' % image_id
+            lines.append(b'q %d 0 0 %d 36 36 cm /Im0 Do Q' % (width, height))
+        lines.append(b'BT /F0 8 Tf 300 20 Td (%d) Tj ET' % (page_number + 1))
+        content = zlib.compress(b'\n'.join(lines), 6)
+        objects[content_id] = _stream(b'/Filter /FlateDecode', content)
+        objects[page_id] = (b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R '
+                            b'/Resources << %s >> >>' % (content_id, resources))
+        page_ids.append(page_id)
+    objects[2] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids), pages)
+
+    output = bytearray(b'%PDF-1.7\n%\xE2\xE3\xCF\xD3\n')
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b'%d 0 obj\n%s\nendobj\n' % (object_id, objects[object_id])
+    xref_offset = len(output)
+    size = max(objects) + 1
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for object_id in range(1, size):
+        output += b'%010d 00000 n \n' % offsets[object_id]
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_offset)
+    return bytes(output)
+
+
+def generate_corpus(directory, seed=0, scale=1.0, scenarios=None):
+    """
+    Write the benchmark corpus to a directory.
+
+    Args:
+        directory (str): Where the files are written, one subdirectory per scenario
+        seed (int): Seed of the content; equal seeds give byte-identical corpora
+        scale (float): Multiplier for page counts and for the number of small files
+        scenarios (iterable, optional): Names from CORPUS_SCENARIOS; all of them by default
+
+    Returns:
+        dict: Scenario name -> list of file paths in merge order
+    """
+    corpus = {}
+    for name in scenarios or CORPUS_SCENARIOS:
+        scenario_dir = os.path.join(directory, name)
+        os.makedirs(scenario_dir, exist_ok=True)
+        paths = []
+        for count, spec in CORPUS_SCENARIOS[name]:
+            if name == 'many_small':
+                count = max(2, round(count * scale))
+            spec = dict(spec, pages=max(1, round(spec['pages'] * scale)))
+            for _ in range(count):
+                index = len(paths)
+                # String seeds are hashed deterministically, unlike hash() of a tuple
+                rng = random.Random(f'{seed}:{name}:{index}')
+                path = os.path.join(scenario_dir, f'{name}_{index:03d}.pdf')
+                with open(path, 'wb') as pdf_file:
+                    pdf_file.write(build_pdf(rng, **spec))
+                paths.append(path)
+        corpus[name] = paths
+        logger.info("Generated %d files for scenario %s", len(paths), name)
+    return corpus
@@ -0,0 +1,277 @@
+"""
+Benchmark runner module.
+
+This module times merge_pdfs, the /upload and /download endpoints (through the
+Flask test client) and the persistence save/load path over the synthetic
+corpus, writes the results as JSON and compares them with a stored baseline.
+
+Run it from the pdfMergerWebsite directory::
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --tolerance 0.25
+
+The process exits with status 1 when a benchmark is slower than the baseline
+by more than the tolerance.
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+
+import pypdf
+
+from backend.utils.pdf_merger import merge_pdfs
+from backend.utils.pdf_persistence import SegmentedPdfStore
+
+from .corpus import CORPUS_SCENARIOS, generate_corpus
+
+# Get a named logger for this module
+logger = logging.getLogger(__name__)
+
+# Results format version; bump when result keys change meaning
+RESULTS_VERSION = 1
+
+
+def time_runs(fn, repeat):
+    """
+    Call a function repeatedly and summarise its wall-clock time.
+
+    Args:
+        fn (callable): Called without arguments; may return a dict of extra result fields
+        repeat (int): Number of timed calls
+
+    Returns:
+        dict: ``runs``, ``min_seconds``, ``median_seconds``, ``max_seconds`` and the fields
+            returned by the last call
+    """
+    durations = []
+    extra = {}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extra = fn() or {}
+        durations.append(time.perf_counter() - started)
+    return dict(
+        extra,
+        runs=repeat,
+        min_seconds=round(min(durations), 6),
+        median_seconds=round(statistics.median(durations), 6),
+        max_seconds=round(max(durations), 6)
+    )
+
+
+def bench_merge_pdfs(paths, work_dir):
+    """Benchmark merge_pdfs in this process for one scenario."""
+    output_path = os.path.join(work_dir, 'merged.pdf')
+
+    def run():
+        result = merge_pdfs(paths, output_path)
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        return {'output_bytes': result['size_bytes']}
+    return run
+
+
+def bench_upload(client, server, paths):
+    """Benchmark a synchronous /upload of one scenario, bypassing the merge cache."""
+    documents = []
+    for path in paths:
+        with open(path, 'rb') as pdf_file:
+            documents.append((os.path.basename(path), pdf_file.read()))
+
+    def run():
+        server.merge_result_cache.clear()
+        data = {'files': [(io.BytesIO(content), name) for name, content in documents]}
+        response = client.post('/upload', content_type='multipart/form-data', data=data)
+        if response.status_code != 200:
+            raise RuntimeError(f'/upload answered {response.status_code}: {response.get_data(as_text=True)}')
+        result = response.get_json()
+        run.download_link = result['download_link']
+        return {'input_bytes': sum(len(content) for _, content in documents), 'output_bytes': result['size_bytes']}
+    run.download_link = None
+    return run
+
+
+def bench_download(client, download_link):
+    """Benchmark a full /download of a stored merge."""
+    def run():
+        response = client.get(download_link)
+        if response.status_code != 200:
+            raise RuntimeError(f'/download answered {response.status_code}')
+        return {'output_bytes': len(response.data)}
+    return run
+
+
+def bench_persistence(outputs, work_dir):
+    """
+    Benchmark saving merged outputs to the segmented disk store and loading them back.
+
+    Returns:
+        tuple: (save benchmark, load benchmark)
+    """
+    store_dir = os.path.join(work_dir, 'pdf_store')
+    expiration = time.time() + 3600
+
+    def save():
+        shutil.rmtree(store_dir, ignore_errors=True)
+        store = SegmentedPdfStore(store_dir)
+        store.append({
+            uuid.uuid4().hex[:8]: {'data': io.BytesIO(data), 'filename': f'{name}.pdf',
+                                   'expiration': expiration, 'created_at': time.time()}
+            for name, data in outputs.items()
+        })
+        return {'records': len(outputs), 'bytes': sum(len(data) for data in outputs.values())}
+
+    def load():
+        loaded = SegmentedPdfStore(store_dir).load_all()
+        return {'records': len(loaded), 'bytes': sum(len(record['data']) for record in loaded.values())}
+    return save, load
+
+
+def run_benchmarks(work_dir, seed=0, scale=1.0, repeat=3, scenarios=None, include_server=True):
+    """
+    Generate the corpus and run every benchmark.
+
+    Args:
+        work_dir (str): Scratch directory for the corpus and outputs
+        seed (int): Corpus seed
+        scale (float): Corpus scale, see corpus.generate_corpus
+        repeat (int): Timed calls per benchmark
+        scenarios (iterable, optional): Scenario names; all by default
+        include_server (bool): Also benchmark /upload and /download, which imports the server
+
+    Returns:
+        dict: ``meta`` describing the run and ``results`` keyed by benchmark name
+    """
+    corpus = generate_corpus(os.path.join(work_dir, 'corpus'), seed=seed, scale=scale, scenarios=scenarios)
+    results = {}
+    outputs = {}
+    for name, paths in corpus.items():
+        logger.info("Benchmarking merge_pdfs on %s", name)
+        results[f'merge_pdfs/{name}'] = time_runs(bench_merge_pdfs(paths, work_dir), repeat)
+        with open(os.path.join(work_dir, 'merged.pdf'), 'rb') as merged_file:
+            outputs[name] = merged_file.read()
+
+    if include_server:
+        import server  # pylint: disable=import-outside-toplevel
+        server.app.config['TESTING'] = True
+        server.limiter.enabled = False
+        client = server.app.test_client()
+        for name, paths in corpus.items():
+            logger.info("Benchmarking /upload and /download on %s", name)
+            upload = bench_upload(client, server, paths)
+            results[f'upload/{name}'] = time_runs(upload, repeat)
+            results[f'download/{name}'] = time_runs(bench_download(client, upload.download_link), repeat)
+
+    save, load = bench_persistence(outputs, work_dir)
+    results['persistence/save'] = time_runs(save, repeat)
+    results['persistence/load'] = time_runs(load, repeat)
+
+    return {
+        'meta': {
+            'version': RESULTS_VERSION,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'pypdf': pypdf.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'scale': scale,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+def compare_results(results, baseline, tolerance=0.25):
+    """
+    Compare median times with a baseline run.
+
+    Args:
+        results (dict): Output of run_benchmarks
+        baseline (dict): An earlier output of run_benchmarks
+        tolerance (float): Allowed slowdown, 0.25 meaning 25%
+
+    Returns:
+        list: One dict per benchmark present in both runs with ``name``,
+            ``baseline_seconds``, ``median_seconds``, ``ratio`` and ``regressed``
+    """
+    if (results['meta'].get('seed'), results['meta'].get('scale')) != \
+            (baseline['meta'].get('seed'), baseline['meta'].get('scale')):
+        logger.warning("Baseline was recorded with a different corpus; comparisons are not meaningful")
+    comparison = []
+    for name, result in sorted(results['results'].items()):
+        previous = baseline['results'].get(name)
+        if previous is None or not previous.get('median_seconds'):
+            continue
+        ratio = result['median_seconds'] / previous['median_seconds']
+        comparison.append({
+            'name': name,
+            'baseline_seconds': previous['median_seconds'],
+            'median_seconds': result['median_seconds'],
+            'ratio': round(ratio, 3),
+            'regressed': ratio > 1 + tolerance
+        })
+    return comparison
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--seed', type=int, default=0, help='corpus seed')
+    parser.add_argument('--scale', type=float, default=1.0, help='corpus size multiplier')
+    parser.add_argument('--repeat', type=int, default=3, help='timed calls per benchmark')
+    parser.add_argument('--scenario', action='append', choices=sorted(CORPUS_SCENARIOS),
+                        help='run only this scenario (repeatable)')
+    parser.add_argument('--no-server', action='store_true', help='skip the /upload and /download benchmarks')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--save-baseline', help='write the results as the new baseline to this file')
+    parser.add_argument('--baseline', help='compare with this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before failing')
+    parser.add_argument('--work-dir', help='scratch directory (a temporary one by default)')
+    parser.add_argument('--verbose', action='store_true', help='keep the per-file logging of the merge code')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not args.verbose:
+        # The merge code and server log every file and request at INFO
+        for name in ('backend', 'pdf_merger', 'werkzeug'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pdfmerger-bench-')
+    try:
+        results = run_benchmarks(work_dir, seed=args.seed, scale=args.scale, repeat=args.repeat,
+                                 scenarios=args.scenario, include_server=not args.no_server)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as results_file:
+                json.dump(results, results_file, indent=2, sort_keys=True)
+    if not args.output:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            comparison = compare_results(results, json.load(baseline_file), args.tolerance)
+        for row in comparison:
+            marker = 'REGRESSED' if row['regressed'] else 'ok'
+            sys.stderr.write(f"{row['name']:<32} {row['baseline_seconds']:>10.4f}s -> "
+                             f"{row['median_seconds']:>10.4f}s  x{row['ratio']:<6} {marker}\n")
+        if any(row['regressed'] for row in comparison):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,15 +6,42 @@ import logging
 import time
 import sys
 import base64
-import threading
 import json
-from flask import Flask, request, jsonify, send_file, send_from_directory, render_template, g, redirect
+import hashlib
+import tempfile
+import shutil
+import contextlib
+import atexit
+import functools
+import cProfile
+from flask import (Flask, Request, Response, request, jsonify, send_from_directory, render_template, g, redirect,
+                   make_response, has_request_context)
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.utils import secure_filename
-from pypdf import PdfReader, PdfWriter
 import jinja2  # For jinja2.exceptions.TemplateError
+from backend.utils.lru_cache import LRUByteCache
+from backend.utils.pdf_persistence import SegmentedPdfStore, PdfPersister
+from backend.utils.shared_store import SqlitePdfStore, SqliteJobStatusStore, SqliteTokenBucketStore
+from backend.utils.tiered_store import TieredPdfStore
+from backend.utils.expiry import ExpiryIndex, ExpiryReaper
+from backend.utils.merge_jobs import MergeJobQueue
+from backend.utils.merge_pool import MergePool, MergePoolBusy
+from backend.utils.admission import AdmissionController, AdmissionDenied, cpu_timed_call
+from backend.utils.pdf_merger import (
+    PdfInputError, configure_document_cache, merge_documents, open_pdf_reader, select_pages
+)
+from backend.utils.page_spec import PageSpecError, parse_merge_spec
+from backend.utils.pdf_output import OutputProfileError, resolve_output_profile
+from backend.utils.pdf_append import append_documents
+from backend.utils.chunked_uploads import ChunkedUploadStore, ChunkedUploadError
+from backend.utils.streaming import stream_pdf_write
+from backend.utils.pdf_inspect import inspect_pdf
+from backend.utils.metrics import MetricsRegistry, SIZE_BUCKETS
+from backend.utils.profiling import RequestSampler, ProfileStore, profiled_call
+from backend.utils.http_ranges import resolve_byte_ranges, content_range, iter_buffer, multipart_byteranges
+from backend.utils.static_assets import StaticAssetBundle
 
 # Update your logging format to include more detailed timestamp and process info
 logging.basicConfig(
@@ -99,12 +126,55 @@ OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max upload
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 50 * 1024 * 1024))  # 50MB max upload
+
+# Uploaded files are spooled: kept in memory up to this size, rolled over to disk beyond it
+UPLOAD_SPOOL_MAX_MEMORY = max(1, int(os.environ.get('UPLOAD_SPOOL_MAX_MEMORY', 1024 * 1024)))
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+class NamedSpooledTemporaryFile(tempfile.SpooledTemporaryFile):
+    """Spooled temp file that rolls over to a named file, so merge processes can open it by path."""
+
+    def rollover(self):
+        if self._rolled:
+            return
+        memory_file = self._file
+        self._file = tempfile.NamedTemporaryFile(**self._TemporaryFileArgs)  # pylint: disable=consider-using-with
+        del self._TemporaryFileArgs
+        position = memory_file.tell()
+        self._file.write(memory_file.getvalue())
+        self._file.seek(position, 0)
+        self._rolled = True
+
+class SpooledUploadRequest(Request):
+    """Request that streams each multipart file part into its own spooled temp file."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Werkzeug writes the part into this stream as it parses the body, so the
+        # upload never has to exist as a single bytes object in memory
+        return NamedSpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY, mode='rb+', dir=UPLOAD_FOLDER)
+
+app.request_class = SpooledUploadRequest
+
+# Resumable chunked uploads (/uploads) for files beyond MAX_CONTENT_LENGTH; sessions
+# are assembled under UPLOAD_FOLDER, shared by all workers, and referenced from
+# merge requests by upload_id
+CHUNKED_UPLOAD_MAX_BYTES = int(os.environ.get('CHUNKED_UPLOAD_MAX_BYTES', 1024 * 1024 * 1024))
+CHUNKED_UPLOAD_CHUNK_BYTES = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024))
+CHUNKED_UPLOAD_TTL_SECONDS = float(os.environ.get('CHUNKED_UPLOAD_TTL_SECONDS', 24 * 3600))
+chunked_upload_store = ChunkedUploadStore(
+    os.path.join(UPLOAD_FOLDER, 'chunked'),
+    max_upload_bytes=CHUNKED_UPLOAD_MAX_BYTES,
+    chunk_bytes=CHUNKED_UPLOAD_CHUNK_BYTES,
+    # A chunk travels in one request body
+    max_chunk_bytes=app.config['MAX_CONTENT_LENGTH'],
+    ttl_seconds=CHUNKED_UPLOAD_TTL_SECONDS
+)
+
 # Ensure template directory exists
 template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
 os.makedirs(template_dir, exist_ok=True)
@@ -117,8 +187,11 @@ limiter = Limiter(
     storage_uri="memory://"  # For production, consider Redis
 )
 
-# In-memory PDF storage
-pdf_memory_store = {}
+# In-memory PDF storage; past the byte budget the least recently downloaded PDFs
+# spill to files under OUTPUT_FOLDER and are loaded back when downloaded again
+PDF_MEMORY_BUDGET_BYTES = int(os.environ.get('PDF_MEMORY_BUDGET_BYTES', 256 * 1024 * 1024))  # 0 disables spilling
+pdf_memory_store = TieredPdfStore(os.path.join(OUTPUT_FOLDER, 'spill'), PDF_MEMORY_BUDGET_BYTES)
+atexit.register(pdf_memory_store.close)
 
 # Add these variables near the top of your file, after initializing pdf_memory_store
 pdf_stats = {
@@ -130,8 +203,124 @@ pdf_stats = {
 # Configuration - Add persistence settings
 PERSISTENCE_ENABLED = os.environ.get('PERSISTENCE_ENABLED', 'false').lower() == 'true'
 PDF_EXPIRY_SECONDS = int(os.environ.get('PDF_EXPIRY_SECONDS', 3600))
-PERSISTENCE_FILE = os.path.join('/app/data', 'pdf_store.json')
-PERSISTENCE_INTERVAL = 60  # Save every minute in development
+PERSISTENCE_DIR = os.environ.get('PERSISTENCE_DIR', '/app/data')
+# Segment files plus offset index; one PDF is read with a single seek
+PERSISTENCE_STORE_DIR = os.path.join(PERSISTENCE_DIR, 'pdf_store')
+# JSON store written by older releases, migrated into PERSISTENCE_STORE_DIR on startup
+LEGACY_PERSISTENCE_FILE = os.path.join(PERSISTENCE_DIR, 'pdf_store.json')
+# Seconds to collect new PDFs before the background persister writes them
+PERSISTENCE_DEBOUNCE = float(os.environ.get('PERSISTENCE_DEBOUNCE', 2))
+PERSISTENCE_SEGMENT_MAX_BYTES = int(os.environ.get('PERSISTENCE_SEGMENT_MAX_BYTES', 64 * 1024 * 1024))
+# Seconds between background passes that drop expired PDFs from disk
+PERSISTENCE_COMPACTION_INTERVAL = float(os.environ.get('PERSISTENCE_COMPACTION_INTERVAL', 600))
+
+pdf_disk_store = SegmentedPdfStore(PERSISTENCE_STORE_DIR, segment_max_bytes=PERSISTENCE_SEGMENT_MAX_BYTES)
+pdf_persister = PdfPersister(pdf_disk_store, debounce_seconds=PERSISTENCE_DEBOUNCE)
+
+# PDF store backend: 'memory' keeps PDFs in each worker process, 'sqlite' shares
+# them between all gunicorn workers on the host through a WAL-mode database
+PDF_STORE_BACKEND = os.environ.get('PDF_STORE_BACKEND', 'memory').lower()
+PDF_STORE_PATH = os.environ.get('PDF_STORE_PATH', os.path.join(PERSISTENCE_DIR, 'pdf_store.sqlite3'))
+
+if PDF_STORE_BACKEND == 'sqlite':
+    pdf_memory_store = SqlitePdfStore(PDF_STORE_PATH)
+    logger.info("Using shared SQLite PDF store at %s", PDF_STORE_PATH)
+    if PERSISTENCE_ENABLED:
+        # The database already survives restarts, a second copy on disk adds nothing
+        logger.info("SQLite PDF store is persistent, disabling separate persistence")
+        PERSISTENCE_ENABLED = False
+elif PDF_STORE_BACKEND != 'memory':
+    logger.warning("Unknown PDF_STORE_BACKEND '%s', using in-memory store", PDF_STORE_BACKEND)
+    PDF_STORE_BACKEND = 'memory'
+
+# Asynchronous merge jobs (/upload?async=1); with the shared store any worker can answer a status poll
+MERGE_JOB_WORKERS = int(os.environ.get('MERGE_JOB_WORKERS', 2))
+MERGE_JOB_RETENTION_SECONDS = int(os.environ.get('MERGE_JOB_RETENTION_SECONDS', PDF_EXPIRY_SECONDS))
+merge_job_queue = MergeJobQueue(
+    status_store=SqliteJobStatusStore(PDF_STORE_PATH) if PDF_STORE_BACKEND == 'sqlite' else None,
+    max_workers=MERGE_JOB_WORKERS,
+    retention_seconds=MERGE_JOB_RETENTION_SECONDS
+)
+
+# Merge pool - merges run in worker processes, and requests beyond the queue are answered with 429
+MERGE_POOL_WORKERS = int(os.environ.get('MERGE_POOL_WORKERS', 2))
+MERGE_POOL_QUEUE_SIZE = int(os.environ.get('MERGE_POOL_QUEUE_SIZE', 8))
+# Parsed input documents kept by each merge process, so shared cover pages and appendices
+# are parsed once; the budget applies per process, in input bytes
+DOCUMENT_CACHE_MAX_BYTES = int(os.environ.get('DOCUMENT_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 0 disables
+merge_pool = MergePool(max_workers=MERGE_POOL_WORKERS, max_queued=MERGE_POOL_QUEUE_SIZE,
+                       initializer=configure_document_cache, initargs=(DOCUMENT_CACHE_MAX_BYTES,))
+# Lookups in the document caches of this worker's merges, reported back with each merge result
+document_cache_stats = {'hits': 0, 'misses': 0}
+
+# Merges are admitted by estimated CPU seconds rather than by request count: each client's
+# budget refills at ADMISSION_CLIENT_CPU_SECONDS_PER_MINUTE up to ADMISSION_CLIENT_BURST_CPU_SECONDS,
+# and at most ADMISSION_MAX_INFLIGHT_CPU_SECONDS of merges run or wait in this worker (0 disables either).
+# Client budgets are kept in the SQLite database at ADMISSION_STORE_PATH so that they hold for all
+# workers on the host together (empty keeps them per worker); the in-flight budget stays per worker,
+# as each worker has its own merge pool
+ADMISSION_CLIENT_CPU_SECONDS_PER_MINUTE = float(os.environ.get('ADMISSION_CLIENT_CPU_SECONDS_PER_MINUTE', 60))
+ADMISSION_CLIENT_BURST_CPU_SECONDS = float(os.environ.get('ADMISSION_CLIENT_BURST_CPU_SECONDS', 120))
+ADMISSION_MAX_INFLIGHT_CPU_SECONDS = float(os.environ.get('ADMISSION_MAX_INFLIGHT_CPU_SECONDS',
+                                                          10 * max(1, MERGE_POOL_WORKERS)))
+ADMISSION_STORE_PATH = os.environ.get('ADMISSION_STORE_PATH', PDF_STORE_PATH if PDF_STORE_BACKEND == 'sqlite'
+                                      else os.path.join(tempfile.gettempdir(), 'pdfmerger-admission.sqlite3'))
+merge_admission = AdmissionController(
+    client_rate=ADMISSION_CLIENT_CPU_SECONDS_PER_MINUTE / 60,
+    client_burst=ADMISSION_CLIENT_BURST_CPU_SECONDS,
+    max_inflight=ADMISSION_MAX_INFLIGHT_CPU_SECONDS,
+    workers=MERGE_POOL_WORKERS,
+    bucket_store=SqliteTokenBucketStore(ADMISSION_STORE_PATH) if ADMISSION_STORE_PATH else None
+)
+
+# Output profile used when a merge request names none: fast, balanced or smallest
+OUTPUT_PROFILE = os.environ.get('OUTPUT_PROFILE', 'fast').lower()
+resolve_output_profile(OUTPUT_PROFILE)
+
+# Streaming merges (/upload/stream) - chunk size and how many chunks may wait for a slow client
+MERGE_STREAM_CHUNK_SIZE = int(os.environ.get('MERGE_STREAM_CHUNK_SIZE', 64 * 1024))
+MERGE_STREAM_MAX_CHUNKS = int(os.environ.get('MERGE_STREAM_MAX_CHUNKS', 8))
+
+# Merge result cache - repeat merges of identical inputs reuse the built output
+MERGE_CACHE_MAX_BYTES = int(os.environ.get('MERGE_CACHE_MAX_BYTES', 128 * 1024 * 1024))  # 0 disables
+merge_result_cache = LRUByteCache(MERGE_CACHE_MAX_BYTES, name='merge result cache')
+
+# Inspection results by content hash; entries are small, so a few MB hold thousands of files
+INSPECT_CACHE_MAX_BYTES = int(os.environ.get('INSPECT_CACHE_MAX_BYTES', 8 * 1024 * 1024))  # 0 disables
+inspect_cache = LRUByteCache(INSPECT_CACHE_MAX_BYTES, name='inspect cache')
+
+# Prometheus metrics (/metrics); each worker writes a snapshot to METRICS_DIR every
+# METRICS_FLUSH_INTERVAL seconds and a scrape adds up the snapshots of all workers
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'pdfmerger-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+metrics = MetricsRegistry(METRICS_DIR or None, flush_interval=METRICS_FLUSH_INTERVAL)
+upload_parse_seconds = metrics.histogram(
+    'pdfmerger_upload_parse_seconds', 'Time to receive and validate the uploaded files of a merge request')
+merge_seconds_histogram = metrics.histogram(
+    'pdfmerger_merge_seconds', 'Time to build a merged PDF, cache hits excluded')
+write_seconds_histogram = metrics.histogram(
+    'pdfmerger_write_seconds', 'Time spent serialising merged PDFs')
+download_seconds_histogram = metrics.histogram(
+    'pdfmerger_download_seconds', 'Time from a download request to its last byte being handed to the server')
+download_bytes_histogram = metrics.histogram(
+    'pdfmerger_download_bytes', 'Bytes sent per successful download', buckets=SIZE_BUCKETS)
+
+# On-demand profiling of /upload: requests carrying PROFILING_TOKEN in X-Profile-Token,
+# plus one in PROFILING_SAMPLE_EVERY requests per worker (0 disables sampling)
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+PROFILING_SAMPLE_EVERY = int(os.environ.get('PROFILING_SAMPLE_EVERY', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(OUTPUT_FOLDER, 'profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+request_sampler = RequestSampler(PROFILING_TOKEN, PROFILING_SAMPLE_EVERY)
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES)
+
+# ETags of stored PDFs, so revalidating a download does not hash the document again
+download_etag_cache = LRUByteCache(1024 * 1024, name='download ETag cache')
+
+# Frontend files, loaded and precompressed once; restart the server to pick up edits.
+# Scripts and stylesheets under their hashed names are cached by browsers for a year
+STATIC_ASSET_MAX_AGE = int(os.environ.get('STATIC_ASSET_MAX_AGE', 365 * 24 * 3600))
+static_assets = StaticAssetBundle(app.static_folder)
 
 # Verify upload directory permissions
 try:
@@ -176,6 +365,43 @@ def generate_secure_filename(filename):
     name, ext = os.path.splitext(secure_name)
     return f"{name}_{random_token}{ext}"
 
+def merge_cache_key(input_digests, merge_options):
+    """
+    Build the merge result cache key for a set of inputs.
+
+    Args:
+        input_digests (list): SHA-256 hex digests of the inputs, in merge order
+        merge_options (dict): Options that influence the merged output bytes
+
+    Returns:
+        str: Hex digest identifying the merge result
+    """
+    key_hash = hashlib.sha256()
+    for digest in input_digests:
+        key_hash.update(digest.encode('ascii'))
+        key_hash.update(b'\n')
+    key_hash.update(json.dumps(merge_options, sort_keys=True).encode('utf-8'))
+    return key_hash.hexdigest()
+
+def fingerprint_stream(stream):
+    """
+    Hash a seekable stream in chunks and rewind it.
+
+    Args:
+        stream: Binary file-like object positioned anywhere
+
+    Returns:
+        tuple: SHA-256 hex digest and size in bytes of the stream contents
+    """
+    stream.seek(0)
+    content_hash = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: stream.read(UPLOAD_READ_CHUNK_SIZE), b''):
+        content_hash.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return content_hash.hexdigest(), size
+
 def is_safe_pdf(file_path):
     """
     Validate if a file is a real PDF and not malicious.
@@ -194,15 +420,42 @@ def is_safe_pdf(file_path):
     except (IOError, OSError, FileNotFoundError, PermissionError):
         return False
 
+def static_asset_response(path):
+    """
+    Answer a request for a frontend file from the preloaded assets.
+
+    The variant is chosen by Accept-Encoding. Hashed names may be cached for
+    STATIC_ASSET_MAX_AGE seconds; anything else is revalidated with its ETag.
+
+    Args:
+        path (str): Path relative to the frontend directory
+
+    Returns:
+        Response: The asset or 304, or None if the path is not a preloaded asset
+    """
+    asset, hashed = static_assets.get(path)
+    if asset is None:
+        return None
+    coding, body, etag = asset.negotiate(request.accept_encodings)
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f'public, max-age={STATIC_ASSET_MAX_AGE}, immutable' if hashed else 'no-cache'
+    }
+    if asset.compressible:
+        headers['Vary'] = 'Accept-Encoding'
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    if coding != 'identity':
+        headers['Content-Encoding'] = coding
+    return Response(body, content_type=asset.content_type, headers=headers)
+
 @app.route('/')
 def index():
     """Serve the main page."""
     try:
-        logger.debug("Attempting to serve index.html")
-        # Print the available static files to debug
-        for root, _, files in os.walk('frontend'):
-            logger.debug("Directory: %s", root)
-            logger.debug("Files: %s", files)
+        response = static_asset_response('index.html')
+        if response is not None:
+            return response
         return app.send_static_file('index.html')
     except (FileNotFoundError, IOError, OSError) as e:
         logger.exception("Error serving index.html: %s", str(e))
@@ -220,167 +473,760 @@ def index():
 
 @app.route('/<path:path>')
 def serve_static(path):
-    """Serve static files."""
-    return send_from_directory('frontend', path)
+    """Serve static files, from memory where they were preloaded."""
+    return static_asset_response(path) or send_from_directory('frontend', path)
 
 @app.route('/manifest.json')
 def serve_manifest():
     """Serve the PWA manifest file."""
-    return send_from_directory(app.static_folder, 'manifest.json')
+    return static_asset_response('manifest.json') or send_from_directory(app.static_folder, 'manifest.json')
 
-@app.route('/upload', methods=['POST'])
-@limiter.limit("10 per minute")
-def upload_file():
-    """Handle PDF file uploads and merging."""
+def collect_pdf_uploads(files):
+    """
+    Fingerprint the uploaded PDFs for the merge result cache.
+
+    The spooled upload streams are handed on as they are instead of being copied.
+
+    Args:
+        files (list): FileStorage objects from the request
+
+    Returns:
+        list: (filename, stream, sha256 digest) tuples in upload order
+
+    Raises:
+        PdfInputError: If a file does not have a .pdf extension
+    """
+    pdf_inputs = []
+    for file in files:
+        if not file or not file.filename:
+            continue
+
+        if not file.filename.lower().endswith('.pdf'):
+            logger.error("Invalid file: %s, extension is not .pdf", file.filename)
+            raise PdfInputError(f'Invalid file format: {file.filename}. Only PDF files are allowed.')
+
+        # Log file details for debugging
+        logger.debug("Processing file: %s, content type: %s, size: %d bytes",
+                    file.filename, file.content_type, file.content_length or 0)
+        digest, _ = fingerprint_stream(file.stream)
+        pdf_inputs.append((file.filename, file.stream, digest))
+    return pdf_inputs
+
+def open_chunked_uploads(upload_ids):
+    """
+    Open finalized chunked uploads as merge inputs.
+
+    Their SHA-256 was computed when they were finalized, so they are not hashed again.
+
+    Args:
+        upload_ids (list): IDs returned by POST /uploads
+
+    Returns:
+        list: (filename, file object, sha256 digest) tuples like collect_pdf_uploads
+
+    Raises:
+        PdfInputError: If an upload is unknown, expired or not finalized
+    """
+    pdf_inputs = []
     try:
-        logger.info("Files in request: %s", list(request.files.keys()))
+        for upload_id in upload_ids:
+            pdf_inputs.append(chunked_upload_store.open(upload_id))
+    except ChunkedUploadError as e:
+        close_pdf_inputs(pdf_inputs)
+        raise PdfInputError(e.message, e.status_code) from e
+    # Closed at the end of the request like the uploaded files
+    g.setdefault('chunked_upload_files', []).extend(pdf_file for _, pdf_file, _ in pdf_inputs)
+    return pdf_inputs
+
+@app.teardown_request
+def close_chunked_upload_files(_):
+    """Close the chunked uploads a request opened as merge inputs."""
+    for pdf_file in g.pop('chunked_upload_files', ()):
+        pdf_file.close()
+
+def input_file_path(pdf_stream):
+    """
+    Return the path of an input that is a regular file, such as a chunked upload.
 
-        if 'files' not in request.files:
-            logger.info("No 'files' part in request")
-            return jsonify({'error': 'No files part'}), 400
+    Such inputs are passed on by path rather than copied; spooled request
+    uploads and in-memory buffers give None.
+    """
+    if isinstance(pdf_stream, io.BufferedReader) and isinstance(pdf_stream.name, str):
+        return pdf_stream.name
+    return None
 
-        files = request.files.getlist('files')
-        logger.info("Number of files received: %d", len(files))
+def pool_document(pdf_stream):
+    """
+    Return what a merge process is given for an input: a path, or the bytes.
 
-        if not files or len(files) < 2:
-            logger.info("Need at least 2 files to merge")
-            return jsonify({'error': 'Need at least 2 PDF files to merge'}), 400
+    Regular files and spooled uploads that rolled over to disk are passed by
+    path; the caller keeps them open, and so on disk, until the merge returns.
+    Inputs still held in memory are read out.
+    """
+    path = input_file_path(pdf_stream)
+    if path is not None:
+        return path
+    if isinstance(pdf_stream, NamedSpooledTemporaryFile) and isinstance(pdf_stream.name, str):
+        # The pool process reads the file itself, so nothing may be left in our buffer
+        pdf_stream.flush()
+        return pdf_stream.name
+    pdf_stream.seek(0)
+    return pdf_stream.read()
+
+def time_merge_phases(progress=None):
+    """
+    Wrap a merge progress callback so that the merge and its write phase are timed.
 
-        # Process PDFs entirely in memory
-        pdf_readers = []
+    Args:
+        progress (callable, optional): Callback to forward progress reports to
 
-        for file in files:
-            if not file or not file.filename:
-                continue
+    Returns:
+        tuple: (progress callback for the merge, callable recording the timings once it finished)
+    """
+    started = time.perf_counter()
+    writing_started = []
 
-            if file.filename.lower().endswith('.pdf'):
-                # Log file details for debugging
-                logger.debug("Processing file: %s, content type: %s, size: %d bytes",
-                            file.filename, file.content_type, file.content_length or 0)
+    def record_progress(pages_done, pages_total, phase):
+        if phase == 'writing' and not writing_started:
+            writing_started.append(time.perf_counter())
+        if progress:
+            progress(pages_done, pages_total, phase)
 
-                # Read file directly into memory
-                try:
-                    pdf_content = io.BytesIO(file.read())
-                    # Validate PDF content
-                    try:
-                        pdf_reader = PdfReader(pdf_content)
-                        # Check if PDF is encrypted
-                        if pdf_reader.is_encrypted:
-                            logger.error("Encrypted PDF detected: %s", file.filename)
-                            return jsonify({
-                                'error': f'PDF file {file.filename} is encrypted. Please remove password protection before uploading.'
-                            }), 400
-                        logger.debug("Successfully read PDF with %d pages", len(pdf_reader.pages))
-                        pdf_readers.append(pdf_reader)
-                    except ModuleNotFoundError as crypto_error:
-                        if "PyCryptodome" in str(crypto_error):
-                            logger.error("Missing PyCryptodome dependency for encrypted PDF: %s", str(crypto_error))
-                            return jsonify({
-                                'error': 'This PDF requires cryptography support. Please contact the administrator.'
-                            }), 500
-                        raise
-                except (ValueError, TypeError, IOError, OSError, PermissionError, RuntimeError, SyntaxError) as e:
-                    logger.error("Invalid PDF file %s: %s", file.filename, str(e), exc_info=True)
-                    return jsonify({'error': f'Invalid PDF file {file.filename}: {str(e)}'}), 400
-            else:
-                logger.error("Invalid file: %s, extension is not .pdf", file.filename)
-                return jsonify({'error': f'Invalid file format: {file.filename}. Only PDF files are allowed.'}), 400
-
-        if len(pdf_readers) < 2:
-            logger.error("Not enough valid PDFs found after processing")
-            return jsonify({'error': 'Need at least 2 valid PDF files to merge'}), 400
-
-        # Generate output filename
-        output_filename = request.form.get('output_filename', 'merged_document')
-        if not output_filename:
-            output_filename = 'merged_document'
-        # Add unique ID
-        unique_id = str(uuid.uuid4())[:8]
-        output_filename = f"{output_filename}_{unique_id}.pdf"
-        # Create merged PDF in memory
-        pdf_writer = PdfWriter()
-        # Add all pages from all PDFs
-        for reader in pdf_readers:
-            for page in reader.pages:
-                pdf_writer.add_page(page)
-        # Write PDF to in-memory buffer
-        output_buffer = io.BytesIO()
-        pdf_writer.write(output_buffer)
-        output_buffer.seek(0)  # Important: Reset position to beginning
-        # Store in memory instead of filesystem
-        current_time = time.time()
-        pdf_memory_store[unique_id] = {
-            'data': output_buffer,
-            'filename': output_filename,
-            'expiration': current_time + PDF_EXPIRY_SECONDS
-        }
-        pdf_stats['total_created'] += 1
-        logger.info("Merge successful. Created in-memory PDF with ID: %s (expires in 1 hour)", unique_id)
-        # Save to persistence if enabled
-        if PERSISTENCE_ENABLED:
-            threading.Thread(target=save_pdf_store).start()
-        # Create download link with the unique ID as identifier
-        download_link = f"/download/{unique_id}"
-        return jsonify({
-            'message': 'Files merged successfully',
-            'download_link': download_link
-        })
+    def finish():
+        finished = time.perf_counter()
+        merge_seconds_histogram.observe(finished - started)
+        if writing_started:
+            write_seconds_histogram.observe(finished - writing_started[0])
 
-        # Generate a unique ID using UUID for better uniqueness
-        unique_id = str(uuid.uuid4()).replace('-', '')[:8]
+    return record_progress, finish
 
-        # Make sure the output buffer is at the beginning
-        output_buffer.seek(0)
+def merge_uploaded_pdfs(pdf_inputs, merge_options, progress=None, block=False, ticket=None):
+    """
+    Merge uploaded PDFs, reusing a cached result for identical inputs.
 
-        # Store in memory with clear variable names
-        current_time = time.time()
-        expiration_time = current_time + PDF_EXPIRY_SECONDS
-
-        # Log the PDF data being stored
-        pdf_size = len(output_buffer.getvalue())
-        logger.info(f"Storing PDF {unique_id} in memory: {pdf_size} bytes, expires at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(expiration_time))}")
-
-        # Create full memory store entry
-        pdf_entry = {
-            'data': output_buffer,
-            'filename': output_filename,
-            'expiration': expiration_time,
-            'created_at': current_time,
-            'size_bytes': pdf_size
-        }
+    Cache misses are merged in the merge pool.
 
-        # Store in memory
-        pdf_memory_store[unique_id] = pdf_entry
+    Args:
+        pdf_inputs (list): Tuples returned by collect_pdf_uploads
+        merge_options (dict): Options that influence the merged output bytes
+        progress (callable, optional): Called with (pages_done, pages_total, phase)
+        block (bool): Wait for a free merge pool slot instead of failing fast
+        ticket (AdmissionTicket, optional): Settled with the CPU time the merge took
 
-        # Update stats
-        pdf_stats['total_created'] += 1
+    Returns:
+        tuple: Merged PDF bytes and whether they came from the cache
 
-        # Log the updated memory store size
-        logger.info(f"Memory store now contains {len(pdf_memory_store)} PDFs")
+    Raises:
+        PdfInputError: If an input cannot be merged
+        MergePoolBusy: If ``block`` is false and the merge pool is full
+    """
+    # Identical inputs in the same order produce identical output, so reuse it
+    cache_key = merge_cache_key([digest for _, _, digest in pdf_inputs], merge_options)
+    merged_bytes = merge_result_cache.get(cache_key)
+    if merged_bytes is not None:
+        logger.info("Merge cache hit for %d inputs (key %s)", len(pdf_inputs), cache_key[:12])
+        if ticket is not None:
+            ticket.settle(0)
+        return merged_bytes, True
+
+    # Pool processes cannot share the upload streams, so they get the path of a file on disk, or
+    # the bytes; the digest lets the merge reuse an input it has already parsed
+    documents = []
+    for filename, pdf_stream, digest in pdf_inputs:
+        pdf_stream.seek(0)
+        if merge_pool.inline:
+            documents.append((filename, pdf_stream, digest))
+        else:
+            documents.append((filename, pool_document(pdf_stream), digest))
+    record_progress, finish_timing = time_merge_phases(progress)
+    try:
+        if has_request_context() and 'worker_profiles' in g and not merge_pool.inline:
+            # The request is being profiled; profile the pool process doing the actual merge too
+            (merged, worker_stats), cpu_seconds = merge_pool.run(
+                cpu_timed_call, profiled_call, merge_documents, documents, None, merge_options,
+                progress=record_progress, block=block)
+            g.worker_profiles.append(worker_stats)
+        else:
+            merged, cpu_seconds = merge_pool.run(cpu_timed_call, merge_documents, documents, None, merge_options,
+                                                 progress=record_progress, block=block)
+    except MergePoolBusy:
+        # Nothing ran, so the client pays the request overhead only
+        if ticket is not None:
+            ticket.settle(0)
+        raise
+    finish_timing()
+    if ticket is not None:
+        ticket.settle(cpu_seconds, merged['pages'])
+    document_cache_stats['hits'] += merged.get('cache_hits', 0)
+    document_cache_stats['misses'] += merged.get('cache_misses', 0)
+    merged_bytes = merged['data']
+    merge_result_cache.put(cache_key, merged_bytes, len(merged_bytes))
+    return merged_bytes, False
+
+def store_merged_pdf(unique_id, output_filename, merged_bytes):
+    """
+    Put a merged PDF into the PDF store.
 
-        # Save to persistence immediately if enabled
-        if PERSISTENCE_ENABLED:
-            try:
-                save_pdf_store()
-                logger.info(f"Saved PDF {unique_id} to persistence")
-            except Exception as e:
-                logger.error(f"Failed to save PDF to persistence: {str(e)}")
+    Args:
+        unique_id (str): ID the PDF will be downloadable under
+        output_filename (str): Download filename for the PDF
+        merged_bytes (bytes): The merged PDF document
 
-        # Return clean download link
-        download_url = f"/download/{unique_id}"
+    Returns:
+        str: Download link for the stored PDF
+    """
+    # BytesIO shares the bytes object until written to, so cached output is not copied
+    current_time = time.time()
+    pdf_entry = {
+        'data': io.BytesIO(merged_bytes),
+        'filename': output_filename,
+        'expiration': current_time + PDF_EXPIRY_SECONDS,
+        'created_at': current_time,
+        'size_bytes': len(merged_bytes)
+    }
+    pdf_memory_store[unique_id] = pdf_entry
+    pdf_expiry_reaper.schedule(unique_id, pdf_entry['expiration'])
+    pdf_stats['total_created'] += 1
+    logger.info("Merge successful. Created in-memory PDF with ID: %s (expires in %d seconds)",
+                unique_id, PDF_EXPIRY_SECONDS)
+    # Queue for the background persister if enabled
+    if PERSISTENCE_ENABLED:
+        pdf_persister.mark_dirty(unique_id, pdf_entry)
+    # Create download link with the unique ID as identifier
+    return f"/download/{unique_id}"
+
+def detach_pdf_inputs(pdf_inputs):
+    """
+    Copy upload streams into spooled files owned by the caller.
+
+    Werkzeug closes the request's upload streams when the request ends, so
+    inputs handed to a background job need their own copy.
+
+    Args:
+        pdf_inputs (list): Tuples returned by collect_pdf_uploads
 
-        logger.info(f"Upload successful. Created PDF with ID: {unique_id}, download URL: {download_url}")
+    Returns:
+        list: Tuples of the same shape pointing at the copies
+    """
+    detached = []
+    for filename, pdf_stream, digest in pdf_inputs:
+        path = input_file_path(pdf_stream)
+        if path is not None:
+            # A file on disk is opened again instead of copied; the open file outlives its deletion
+            detached.append((filename, open(path, 'rb'), digest))  # pylint: disable=consider-using-with
+            continue
+        copy = NamedSpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY, mode='w+b', dir=UPLOAD_FOLDER)
+        pdf_stream.seek(0)
+        shutil.copyfileobj(pdf_stream, copy, UPLOAD_READ_CHUNK_SIZE)
+        copy.seek(0)
+        detached.append((filename, copy, digest))
+    return detached
+
+def run_merge_job(pdf_inputs, output_filename, unique_id, merge_options, report_progress, ticket=None):
+    """
+    Merge and store a PDF on a background job thread.
+
+    Args:
+        pdf_inputs (list): Detached input tuples
+        output_filename (str): Download filename for the PDF
+        unique_id (str): ID the PDF will be downloadable under
+        merge_options (dict): Options that influence the merged output bytes
+        report_progress (callable): Progress callback supplied by the job queue
+        ticket (AdmissionTicket, optional): Admission of the merge, settled once it ran
+
+    Returns:
+        dict: Fields added to the finished job's status record
+    """
+    # Jobs wait for a merge pool slot; a PdfInputError ends up as the job's error message
+    started = time.monotonic()
+    merged_bytes, cached = merge_uploaded_pdfs(pdf_inputs, merge_options, progress=report_progress, block=True,
+                                               ticket=ticket)
+    merge_seconds = round(time.monotonic() - started, 3)
+    return {
+        'download_link': store_merged_pdf(unique_id, output_filename, merged_bytes),
+        'cached': cached,
+        'profile': merge_options['profile'],
+        'size_bytes': len(merged_bytes),
+        'merge_seconds': merge_seconds
+    }
+
+def close_pdf_inputs(pdf_inputs):
+    """Close the streams of detached inputs, deleting any rolled-over temp files."""
+    for _, pdf_stream, _ in pdf_inputs:
+        pdf_stream.close()
+
+def parse_merge_request():
+    """
+    Read the uploaded PDFs and output filename of a merge request.
+
+    Returns:
+        tuple: (pdf_inputs, output_filename, unique_id)
+
+    Raises:
+        PdfInputError: If the request does not hold at least two PDF files
+    """
+    # Werkzeug parses the multipart body on first access to request.files
+    with upload_parse_seconds.time():
+        return _parse_merge_request()
+
+def _parse_merge_request():
+    """Body of parse_merge_request, timed by its caller."""
+    logger.info("Files in request: %s", list(request.files.keys()))
+    # Finalized chunked uploads, merged after the files of the request in the order given
+    upload_ids = request.form.getlist('upload_id')
+
+    if 'files' not in request.files and not upload_ids:
+        logger.info("No 'files' part in request")
+        raise PdfInputError('No files part')
+
+    files = request.files.getlist('files')
+    logger.info("Number of files received: %d, chunked uploads referenced: %d", len(files), len(upload_ids))
+
+    if len(files) + len(upload_ids) < 2:
+        logger.info("Need at least 2 files to merge")
+        raise PdfInputError('Need at least 2 PDF files to merge')
+
+    pdf_inputs = collect_pdf_uploads(files) + open_chunked_uploads(upload_ids)
+    if len(pdf_inputs) < 2:
+        logger.error("Not enough valid PDFs found after processing")
+        raise PdfInputError('Need at least 2 valid PDF files to merge')
+
+    # Generate output filename
+    output_filename = request.form.get('output_filename', 'merged_document')
+    if not output_filename:
+        output_filename = 'merged_document'
+    # Add unique ID
+    unique_id = str(uuid.uuid4())[:8]
+    output_filename = f"{output_filename}_{unique_id}.pdf"
+    return pdf_inputs, output_filename, unique_id
+
+def parse_merge_options(input_count):
+    """
+    Read the options of a merge request that change the merged output.
+
+    The optional ``merge_spec`` form field holds a JSON list of segments that
+    select and reorder pages, e.g. ``[{"file": 1, "pages": "1-3"}, {"file": 0, "pages": "-1"}]``.
+    ``dedupe=1`` stores resources that several inputs share, such as fonts, only once.
+    ``profile`` (``fast``, ``balanced`` or ``smallest``, OUTPUT_PROFILE by default)
+    trades merge time for output size, and ``compression_level`` (1-9) overrides
+    the zlib level of the profile.
+
+    Args:
+        input_count (int): Number of uploaded PDFs
+
+    Returns:
+        dict: Merge options, also used in the merge cache key
+
+    Raises:
+        PdfInputError: If the merge spec or output profile is invalid
+    """
+    merge_options = {'profile': (request.form.get('profile') or OUTPUT_PROFILE).lower()}
+    raw_spec = request.form.get('merge_spec')
+    if raw_spec:
+        try:
+            merge_options['merge_spec'] = parse_merge_spec(json.loads(raw_spec), input_count)
+        except (json.JSONDecodeError, PageSpecError) as e:
+            raise PdfInputError(f'Invalid merge spec: {str(e)}') from e
+    if request.form.get('dedupe', '').lower() in ('1', 'true', 'yes', 'on'):
+        merge_options['dedupe'] = True
+    raw_level = request.form.get('compression_level')
+    try:
+        if raw_level:
+            merge_options['compression_level'] = int(raw_level)
+        resolve_output_profile(merge_options['profile'], merge_options.get('compression_level'))
+    except (ValueError, OutputProfileError) as e:
+        raise PdfInputError(f'Invalid output profile: {str(e)}') from e
+    return merge_options
+
+def merge_pool_busy_response(error):
+    """Build the 429 response telling the client when to retry."""
+    response = jsonify({'error': 'Server is busy merging other files, please retry shortly'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def admit_merge(pdf_inputs):
+    """
+    Admit a merge of the given inputs against the client's and this worker's budgets.
+
+    The cost is estimated from the size of each input and, for inputs that
+    were inspected before, their page count from the inspection cache.
+
+    Args:
+        pdf_inputs (list): Tuples returned by collect_pdf_uploads
+
+    Returns:
+        AdmissionTicket: To settle with the measured cost and release when the merge ends
+
+    Raises:
+        AdmissionDenied: If the merge does not fit either budget
+    """
+    inputs = []
+    for _, pdf_stream, digest in pdf_inputs:
+        pdf_stream.seek(0, io.SEEK_END)
+        size_bytes = pdf_stream.tell()
+        pdf_stream.seek(0)
+        info = inspect_cache.peek(digest)
+        inputs.append((size_bytes, info.get('page_count') if info else None))
+    return merge_admission.admit(get_remote_address(), inputs)
+
+def admission_denied_response(error):
+    """Build the 429 response for a merge over the client's or the server's budget."""
+    if error.scope == 'server':
+        message = 'Server is busy merging other files, please retry shortly'
+    else:
+        message = 'Merge budget used up, please retry later'
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def profile_when_requested(view):
+    """
+    Profile a view when the request sampler selects the request.
+
+    The profile covers the view and any merge it runs in the merge pool. Its
+    ID is returned in the ``X-Profile-ID`` header; fetch it from ``/profiles/<id>``.
+    Requests that are not selected pay for one sampler check only.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not request_sampler.should_profile(request.headers.get('X-Profile-Token')):
+            return view(*args, **kwargs)
+        profiler = cProfile.Profile()
+        g.worker_profiles = []
+        response = make_response(profiler.runcall(view, *args, **kwargs))
+        try:
+            response.headers['X-Profile-ID'] = profile_store.save(profiler, g.worker_profiles, request.path)
+        except OSError as e:
+            logger.error("Could not save profile of %s: %s", request.path, str(e))
+        return response
+    return wrapper
 
+@app.route('/upload', methods=['POST'])
+@limiter.exempt
+@profile_when_requested
+def upload_file():
+    """
+    Handle PDF file uploads and merging.
+
+    With ``?async=1`` the merge is queued and a job ID is returned at once;
+    poll ``/jobs/<job_id>`` for progress and the download link.
+    """
+    try:
+        pdf_inputs, output_filename, unique_id = parse_merge_request()
+        merge_options = parse_merge_options(len(pdf_inputs))
+        ticket = admit_merge(pdf_inputs)
+
+        if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+            # The queued job keeps its share of the in-flight budget until it has run
+            def finish_job():
+                close_pdf_inputs(job_inputs)
+                ticket.release()
+
+            try:
+                job_inputs = detach_pdf_inputs(pdf_inputs)
+                job_id = merge_job_queue.submit(
+                    lambda report_progress: run_merge_job(
+                        job_inputs, output_filename, unique_id, merge_options, report_progress, ticket
+                    ),
+                    cleanup=finish_job
+                )
+            except BaseException:
+                ticket.release()
+                raise
+            return jsonify({
+                'message': 'Merge queued',
+                'job_id': job_id,
+                'status_url': f"/jobs/{job_id}"
+            }), 202
+
+        started = time.monotonic()
+        with ticket:
+            merged_bytes, cached = merge_uploaded_pdfs(pdf_inputs, merge_options, ticket=ticket)
+        merge_seconds = round(time.monotonic() - started, 3)
+        download_link = store_merged_pdf(unique_id, output_filename, merged_bytes)
         return jsonify({
-            'success': True,
             'message': 'Files merged successfully',
-            'download_url': download_url
+            'download_link': download_link,
+            'cached': cached,
+            'profile': merge_options['profile'],
+            'size_bytes': len(merged_bytes),
+            'merge_seconds': merge_seconds
         })
 
+    except PdfInputError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except MergePoolBusy as e:
+        return merge_pool_busy_response(e)
+    except AdmissionDenied as e:
+        return admission_denied_response(e)
     except Exception as e:
         logger.exception(f"Error in upload handler: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/upload/stream', methods=['POST'])
+@limiter.exempt
+def upload_and_stream():
+    """
+    Merge uploaded PDFs and stream the result as it is written.
+
+    The response starts as soon as the first chunk of output exists, and at
+    most MERGE_STREAM_MAX_CHUNKS chunks are buffered for a slow client. With
+    ``?store=1`` the output is also kept in the PDF store under the ID in the
+    ``X-PDF-ID`` header, downloadable from ``X-Download-Link`` once the
+    response has completed. Identical merges are served from the merge cache.
+    """
+    stream_admission = contextlib.ExitStack()
+    try:
+        pdf_inputs, output_filename, unique_id = parse_merge_request()
+        merge_options = parse_merge_options(len(pdf_inputs))
+        store_output = request.args.get('store', '').lower() in ('1', 'true', 'yes')
+        cache_key = merge_cache_key([digest for _, _, digest in pdf_inputs], merge_options)
+        headers = {'Content-Disposition': f'attachment; filename="{secure_filename(output_filename)}"'}
+        if store_output:
+            headers['X-PDF-ID'] = unique_id
+            headers['X-Download-Link'] = f"/download/{unique_id}"
+
+        ticket = admit_merge(pdf_inputs)
+        stream_admission.callback(ticket.release)
+        cached_bytes = merge_result_cache.get(cache_key)
+        if cached_bytes is not None:
+            ticket.settle(0)
+            stream_admission.close()
+            if store_output:
+                store_merged_pdf(unique_id, output_filename, cached_bytes)
+            headers['Content-Length'] = str(len(cached_bytes))
+            chunks = (cached_bytes[start:start + MERGE_STREAM_CHUNK_SIZE]
+                      for start in range(0, len(cached_bytes), MERGE_STREAM_CHUNK_SIZE))
+            return Response(chunks, mimetype='application/pdf', headers=headers)
+
+        # The request's upload streams are closed before the response body is
+        # produced, so the merge reads from copies the stream closes when it ends
+        stream_inputs = detach_pdf_inputs(pdf_inputs)
+        stream_admission.callback(close_pdf_inputs, stream_inputs)
+        # Parsing errors are still answered with a status code before streaming starts
+        pdf_readers = [open_pdf_reader(filename, pdf_stream) for filename, pdf_stream, _ in stream_inputs]
+        select_pages(pdf_readers, merge_options.get('merge_spec'))
+        stream_admission.enter_context(merge_pool.admit())
+    except PdfInputError as e:
+        stream_admission.close()
+        return jsonify({'error': e.message}), e.status_code
+    except MergePoolBusy as e:
+        ticket.settle(0)
+        stream_admission.close()
+        return merge_pool_busy_response(e)
+    except AdmissionDenied as e:
+        stream_admission.close()
+        return admission_denied_response(e)
+    except Exception as e:
+        stream_admission.close()
+        logger.exception(f"Error in streaming upload handler: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    tee = io.BytesIO() if store_output else None
+    record_progress, finish_timing = time_merge_phases()
+
+    def finish_stream():
+        finish_timing()
+        if tee is not None:
+            # getvalue() hands over the buffer without copying it
+            merged_bytes = tee.getvalue()
+            merge_result_cache.put(cache_key, merged_bytes, len(merged_bytes))
+            store_merged_pdf(unique_id, output_filename, merged_bytes)
+
+    def write_merged(output):
+        # Runs on the stream's writer thread, whose CPU time is the merge's
+        cpu_started = time.thread_time()
+        merged = merge_documents(pdf_readers, output, merge_options, record_progress)
+        ticket.settle(time.thread_time() - cpu_started, merged['pages'])
+        return merged
+
+    def generate():
+        with stream_admission:
+            yield from stream_pdf_write(
+                write_merged,
+                chunk_size=MERGE_STREAM_CHUNK_SIZE,
+                max_chunks=MERGE_STREAM_MAX_CHUNKS,
+                tee=tee,
+                on_complete=finish_stream
+            )
+
+    response = Response(generate(), mimetype='application/pdf', headers=headers)
+    # Releases the pool slot and input copies even if the body is never iterated
+    response.call_on_close(stream_admission.close)
+    return response
+
+@app.route('/append/<pdf_id>', methods=['POST'])
+@limiter.exempt
+@profile_when_requested
+def append_to_pdf(pdf_id):
+    """
+    Append uploaded PDFs to a stored merge.
+
+    The new pages are added as an incremental update after the stored bytes,
+    which are neither parsed beyond the page tree root nor written again. The
+    PDF keeps its ID, download link and expiration. An append that races
+    another one on the same PDF is answered with 409 and can be retried.
+    """
+    try:
+        pdf_entry = pdf_memory_store.get(pdf_id)
+        if not pdf_entry and PERSISTENCE_ENABLED and recover_from_persistence(pdf_id):
+            pdf_entry = pdf_memory_store.get(pdf_id)
+        if not pdf_entry:
+            return jsonify({'error': f'PDF {pdf_id} not found'}), 404
+        if pdf_entry['expiration'] < time.time():
+            return jsonify({'error': f'PDF {pdf_id} has expired'}), 410
+
+        with upload_parse_seconds.time():
+            pdf_inputs = collect_pdf_uploads(request.files.getlist('files'))
+        if not pdf_inputs:
+            raise PdfInputError('Need at least 1 PDF file to append')
+
+        # getvalue() shares the stored bytes rather than copying them
+        existing = pdf_entry['data'].getvalue()
+        documents = []
+        for filename, pdf_stream, _ in pdf_inputs:
+            pdf_stream.seek(0)
+            documents.append((filename, pdf_stream if merge_pool.inline else pool_document(pdf_stream)))
+        started = time.monotonic()
+        record_progress, finish_timing = time_merge_phases()
+        with admit_merge(pdf_inputs) as ticket:
+            try:
+                appended, cpu_seconds = merge_pool.run(cpu_timed_call, append_documents, existing, documents,
+                                                       progress=record_progress)
+            except MergePoolBusy:
+                ticket.settle(0)
+                raise
+            ticket.settle(cpu_seconds, appended['pages_added'])
+        finish_timing()
+        merge_seconds = round(time.monotonic() - started, 3)
+
+        appended_bytes = existing + appended['update']
+        updated_entry = dict(pdf_entry, data=io.BytesIO(appended_bytes), size_bytes=len(appended_bytes))
+        # Appends only ever grow a PDF, so an unchanged size means nobody appended in between.
+        # The store checks and replaces in one step, across workers for the SQLite store
+        if not pdf_memory_store.replace_if_size(pdf_id, len(existing), updated_entry['data']):
+            return jsonify({'error': f'PDF {pdf_id} changed while appending, please retry'}), 409
+        if PERSISTENCE_ENABLED:
+            pdf_persister.mark_dirty(pdf_id, updated_entry)
+        logger.info("Appended %d pages to PDF %s (%d bytes added)",
+                    appended['pages_added'], pdf_id, len(appended['update']))
+        return jsonify({
+            'message': 'Files appended successfully',
+            'download_link': f"/download/{pdf_id}",
+            'pages_added': appended['pages_added'],
+            'page_count': appended['page_count'],
+            'size_bytes': len(appended_bytes),
+            'appended_bytes': len(appended['update']),
+            'merge_seconds': merge_seconds
+        })
+
+    except PdfInputError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except MergePoolBusy as e:
+        return merge_pool_busy_response(e)
+    except AdmissionDenied as e:
+        return admission_denied_response(e)
+    except Exception as e:
+        logger.exception(f"Error in append handler: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/uploads', methods=['POST'])
+@limiter.limit("30 per minute")
+def create_chunked_upload():
+    """
+    Start a resumable chunked upload.
+
+    The JSON body gives ``filename`` and ``size`` in bytes, and optionally
+    ``chunk_size`` and the ``sha256`` of the whole file. The client then PUTs
+    each chunk to ``/uploads/<upload_id>/chunks/<index>`` with its SHA-256 in
+    the ``X-Chunk-SHA256`` header, checks ``/uploads/<upload_id>`` for the
+    ``received_offset`` to resume from after an interruption, and finalizes
+    with ``POST /uploads/<upload_id>/complete``. Merge requests then name the
+    upload in an ``upload_id`` form field.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        status = chunked_upload_store.create(body.get('filename'), body.get('size'),
+                                             body.get('chunk_size'), body.get('sha256'))
+    except ChunkedUploadError as e:
+        return jsonify({'error': e.message}), e.status_code
+    status['status_url'] = f"/uploads/{status['upload_id']}"
+    return jsonify(status), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+@limiter.limit("120 per minute")
+def chunked_upload_status(upload_id):
+    """Report which chunks of an upload have arrived and where to resume."""
+    try:
+        return jsonify(chunked_upload_store.status(upload_id))
+    except ChunkedUploadError as e:
+        return jsonify({'error': e.message}), e.status_code
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@limiter.limit("600 per minute")
+def put_upload_chunk(upload_id, index):
+    """Store one chunk of an upload; the request body is the chunk."""
+    try:
+        status = chunked_upload_store.write_chunk(upload_id, index, request.stream,
+                                                  request.headers.get('X-Chunk-SHA256'))
+    except ChunkedUploadError as e:
+        return jsonify({'error': e.message}), e.status_code
+    return jsonify(status)
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+@limiter.limit("30 per minute")
+def complete_chunked_upload(upload_id):
+    """Verify that an upload is complete and make it available to merges."""
+    try:
+        return jsonify(chunked_upload_store.finalize(upload_id))
+    except ChunkedUploadError as e:
+        return jsonify({'error': e.message}), e.status_code
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+@limiter.limit("30 per minute")
+def delete_chunked_upload(upload_id):
+    """Abandon an upload and delete what has been received."""
+    if not chunked_upload_store.delete(upload_id):
+        return jsonify({'error': f'Unknown upload {upload_id}'}), 404
+    return '', 204
+
+@app.route('/inspect', methods=['POST'])
+@limiter.limit("60 per minute")
+def inspect_files():
+    """
+    Describe uploaded PDFs without merging them.
+
+    Page count, page sizes, encryption and version come from the trailer,
+    cross-reference table and page tree only. Results are cached by content
+    hash, so inspecting a file again costs no more than hashing it.
+    """
+    if 'files' not in request.files:
+        return jsonify({'error': 'No files part'}), 400
+
+    results = []
+    for file in request.files.getlist('files'):
+        if not file or not file.filename:
+            continue
+        digest, size = fingerprint_stream(file.stream)
+        info = inspect_cache.get(digest)
+        cached = info is not None
+        if not cached:
+            info = inspect_pdf(file.stream, size)
+            inspect_cache.put(digest, info, len(json.dumps(info)))
+        results.append(dict(info, filename=file.filename, sha256=digest, cached=cached))
+
+    if not results:
+        return jsonify({'error': 'No files selected'}), 400
+    return jsonify({'files': results})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the status, progress and result of an asynchronous merge job."""
+    status = merge_job_queue.get(job_id)
+    if status is None:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
+    return jsonify(status)
+
 @app.route('/recover/<pdf_id>')
 def recover_pdf(pdf_id):
     """Try to recover a PDF that's not found in memory but might exist in persistence."""
@@ -394,22 +1240,16 @@ def recover_pdf(pdf_id):
 
         # Log persistence status
         logger.info(f"Persistence enabled: {PERSISTENCE_ENABLED}")
-        logger.info(f"Persistence file exists: {os.path.exists(PERSISTENCE_FILE)}")
+        logger.info(f"Persistence store exists: {os.path.exists(PERSISTENCE_STORE_DIR)}")
 
         # If persistence is enabled, try to load from disk
         if PERSISTENCE_ENABLED:
-            if os.path.exists(PERSISTENCE_FILE):
+            if os.path.exists(PERSISTENCE_STORE_DIR):
                 try:
-                    # Load fresh from disk each time
-                    with open(PERSISTENCE_FILE, 'r', encoding='utf-8') as file_handle:
-                        serializable_store = json.load(file_handle)
-
-                    logger.info(f"Loaded persistence file with {len(serializable_store)} entries")
-
-                    # Check if PDF exists in the persistence file
-                    if pdf_id in serializable_store:
-                        pdf_data = serializable_store[pdf_id]
-                        logger.info(f"Found PDF {pdf_id} in persistence file")
+                    # Look up the single record without loading the rest of the store
+                    pdf_data = pdf_disk_store.get(pdf_id, current_time=0)
+                    if pdf_data:
+                        logger.info(f"Found PDF {pdf_id} in persistence store")
 
                         # Check if it's expired
                         current_time = time.time()
@@ -418,30 +1258,25 @@ def recover_pdf(pdf_id):
                             logger.info(f"PDF {pdf_id} expired {time_expired:.1f} seconds ago")
                             return redirect(f"/download-expired/{pdf_id}")
 
-                        # Recover the PDF data
-                        logger.info(f"Decoding PDF data from base64")
-                        pdf_bytes = base64.b64decode(pdf_data['data_base64'])
-                        pdf_buffer = io.BytesIO(pdf_bytes)
-                        pdf_buffer.seek(0)
-
                         # Add back to memory store
                         pdf_memory_store[pdf_id] = {
-                            'data': pdf_buffer,
+                            'data': io.BytesIO(pdf_data['data']),
                             'filename': pdf_data['filename'],
                             'expiration': pdf_data['expiration'],
+                            'created_at': pdf_data['created_at'],
+                            'size_bytes': len(pdf_data['data']),
                             'recovered': True
                         }
+                        pdf_expiry_reaper.schedule(pdf_id, pdf_data['expiration'])
 
                         logger.info(f"Successfully recovered PDF {pdf_id} from persistence")
                         return redirect(f"/download/{pdf_id}")
                     else:
-                        logger.error(f"PDF {pdf_id} not found in persistence file")
-                except json.JSONDecodeError as json_err:
-                    logger.error(f"Error parsing persistence file: {str(json_err)}")
-                except Exception as e:
+                        logger.error(f"PDF {pdf_id} not found in persistence store")
+                except (IOError, OSError, ValueError) as e:
                     logger.exception(f"Error recovering from persistence: {str(e)}")
             else:
-                logger.error(f"Persistence file not found: {PERSISTENCE_FILE}")
+                logger.error(f"Persistence store not found: {PERSISTENCE_STORE_DIR}")
         else:
             logger.warning("Persistence is disabled, cannot recover PDF from disk")
 
@@ -463,10 +1298,41 @@ def download_not_found(pdf_id):
     """Show a user-friendly page for PDFs that are not found."""
     return render_template('not_found.html', pdf_id=pdf_id)
 
+def pdf_content_etag(unique_id, pdf_entry, pdf_buffer):
+    """
+    Return the strong ETag of a stored PDF.
+
+    The SHA-256 of the content is computed once per stored version and remembered,
+    so repeat downloads and revalidations do not hash the document again.
+
+    Args:
+        unique_id (str): ID of the PDF
+        pdf_entry (dict): Store entry of the PDF
+        pdf_buffer (memoryview): The PDF content
+
+    Returns:
+        str: Unquoted ETag value
+    """
+    version_key = f"{unique_id}:{pdf_entry.get('created_at')}:{len(pdf_buffer)}"
+    etag = download_etag_cache.get(version_key)
+    if etag is None:
+        etag = hashlib.sha256(pdf_buffer).hexdigest()
+        download_etag_cache.put(version_key, etag, len(version_key) + len(etag))
+    return etag
+
+def observe_download(response, started, size_bytes):
+    """Record latency and size of a download once its response has been sent."""
+    def record():
+        download_seconds_histogram.observe(time.perf_counter() - started)
+        download_bytes_histogram.observe(size_bytes)
+    response.call_on_close(record)
+    return response
+
 # Modify your download_file function to include more detailed logging
 @app.route('/download/<unique_id>', methods=['GET'])
 def download_file(unique_id):
     """Serve the merged PDF file for download."""
+    started = time.perf_counter()
     try:
         # Clean up any file extension if present
         unique_id = unique_id.split('.')[0]
@@ -491,84 +1357,187 @@ def download_file(unique_id):
         # Step 3: If still not found, return a user-friendly error
         if not pdf_entry:
             logger.error(f"PDF with ID {unique_id} not found in memory store or persistence")
-            return render_template('pdf_not_found.html', pdf_id=unique_id)
+            return render_template('file_not_found.html', file_id=unique_id,
+                                   message='This PDF does not exist or is no longer available.'), 404
 
         # Step 4: Check if PDF has expired
         current_time = time.time()
         if pdf_entry['expiration'] < current_time:
             logger.warning(f"PDF {unique_id} has expired, expired {current_time - pdf_entry['expiration']:.1f} seconds ago")
-            # Remove from memory store
-            del pdf_memory_store[unique_id]
-            pdf_stats['total_expired'] += 1
-            return render_template('pdf_expired.html', pdf_id=unique_id)
+            # Remove from memory store; the reaper may have got there first
+            if pdf_memory_store.pop(unique_id, None) is not None:
+                pdf_stats['total_expired'] += 1
+            pdf_expiry_reaper.discard(unique_id)
+            return render_template('expired.html', pdf_id=unique_id), 410
 
         # Step 5: Get data from the entry
         pdf_data = pdf_entry['data']
         filename = pdf_entry['filename']
 
         # Step 6: Validate PDF data
-        if not hasattr(pdf_data, 'getvalue'):
+        if not hasattr(pdf_data, 'getbuffer'):
             logger.error(f"PDF data for ID {unique_id} is not a BytesIO object: {type(pdf_data)}")
             return jsonify({'error': 'Invalid PDF data format in memory'}), 500
 
-        pdf_size = len(pdf_data.getvalue())
+        # A view of the stored buffer; ranges are sliced from it without copying the document
+        pdf_buffer = pdf_data.getbuffer()
+        pdf_size = len(pdf_buffer)
         if pdf_size == 0:
             logger.error(f"PDF with ID {unique_id} has zero bytes")
             return jsonify({'error': 'PDF file is empty'}), 500
 
-        # Step 7: Reset buffer position
-        pdf_data.seek(0)
+        # Step 7: Common headers; clients may cache but must revalidate with the ETag
+        etag = pdf_content_etag(unique_id, pdf_entry, pdf_buffer)
+        headers = {
+            'ETag': f'"{etag}"',
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': 'private, no-cache',
+            'Content-Disposition': f'attachment; filename="{secure_filename(filename)}"',
+            'X-PDF-ID': unique_id
+        }
 
-        # Step 8: Create response with proper headers
+        # Step 8: Conditional request - the client already has this content
+        if request.if_none_match.contains_weak(etag):
+            logger.info(f"PDF {unique_id} not modified")
+            return Response(status=304, headers=headers)
+
+        # Step 9: Range request, unless If-Range names a different version
+        ranges = None
+        if_range = request.if_range
+        if request.range is not None and (if_range.etag is None and if_range.date is None or if_range.etag == etag):
+            ranges = resolve_byte_ranges(request.range, pdf_size)
+        if ranges == []:
+            headers['Content-Range'] = f'bytes */{pdf_size}'
+            return Response(status=416, headers=headers)
+        if ranges and len(ranges) == 1:
+            start, stop = ranges[0]
+            logger.info(f"Serving PDF {unique_id}: bytes {start}-{stop - 1} of {pdf_size}")
+            headers['Content-Range'] = content_range(start, stop, pdf_size)
+            headers['Content-Length'] = str(stop - start)
+            return observe_download(Response(iter_buffer(pdf_buffer, start, stop), status=206,
+                                             mimetype='application/pdf', headers=headers), started, stop - start)
+        if ranges:
+            boundary = secrets.token_hex(16)
+            body_length, body = multipart_byteranges(pdf_buffer, ranges, boundary, 'application/pdf')
+            logger.info(f"Serving PDF {unique_id}: {len(ranges)} ranges of {pdf_size} bytes")
+            headers['Content-Length'] = str(body_length)
+            return observe_download(Response(body, status=206, headers=headers,
+                                             content_type=f'multipart/byteranges; boundary={boundary}'),
+                                    started, body_length)
+
+        # Step 10: The whole document
         logger.info(f"Serving PDF {unique_id}: {filename}, {pdf_size} bytes")
-        response = send_file(
-            pdf_data,
-            mimetype='application/pdf',
-            download_name=filename,
-            as_attachment=True
-        )
-
-        # Step 9: Add custom headers to prevent caching issues
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        response.headers['X-PDF-ID'] = unique_id
-
-        logger.info(f"Successfully serving PDF {unique_id}")
-        return response
+        headers['Content-Length'] = str(pdf_size)
+        return observe_download(Response(iter_buffer(pdf_buffer, 0, pdf_size), mimetype='application/pdf',
+                                         headers=headers), started, pdf_size)
 
     except Exception as e:
         logger.exception(f"Error in download handler: {str(e)}")
         return render_template('error.html', message=f"Error downloading file: {str(e)}"), 500
 
-@app.before_request
-def cleanup_expired_pdfs():
-    """Remove PDFs from memory that are older than 1 hour."""
-    current_time = time.time()
-
-    # Don't run cleanup on every request - only every 60 seconds
-    if current_time - pdf_stats['last_cleanup'] < 60:
-        return
+def expire_pdfs(pdf_ids, current_time):
+    """
+    Remove expired PDFs from the store; called by the expiry reaper thread.
 
+    Args:
+        pdf_ids (list): IDs whose scheduled expiration has passed
+        current_time (float): Time the reaper pass started
+    """
     pdf_stats['last_cleanup'] = current_time
 
-    # Get list of expired IDs to avoid dictionary size change during iteration
-    expired_ids = [
-        pdf_id for pdf_id in list(pdf_memory_store.keys())
-        if pdf_memory_store[pdf_id].get('expiration', 0) < current_time
-    ]
-
-    # Remove expired entries
-    for pdf_id in expired_ids:
-        logger.info("Removing expired PDF with ID: %s", pdf_id)
-        del pdf_memory_store[pdf_id]
-        pdf_stats['total_expired'] += 1
+    if isinstance(pdf_memory_store, SqlitePdfStore):
+        # Indexed delete in the shared database; no PDF data is read
+        expired_ids = pdf_memory_store.purge_expired(current_time)
+    else:
+        expired_ids = []
+        for pdf_id in pdf_ids:
+            # Peek so that checking a spilled PDF neither reads it back nor counts as a download
+            entry = pdf_memory_store.peek(pdf_id)
+            # The ID may have been replaced by a recovered copy with a later expiry
+            if entry is not None and entry['expiration'] <= current_time:
+                logger.info("Removing expired PDF with ID: %s", pdf_id)
+                pdf_memory_store.pop(pdf_id, None)
+                expired_ids.append(pdf_id)
+
+    pdf_stats['total_expired'] += len(expired_ids)
 
     # Log summary if any PDFs were expired
     if expired_ids:
         logger.info("Cleanup summary: Removed %d PDFs, %d active PDFs remain",
                    len(expired_ids), len(pdf_memory_store))
 
+# Expire PDFs from a background thread in deadline order instead of scanning the
+# store inside user requests. Other workers also write to the shared SQLite
+# store, so with that backend the reaper additionally sweeps it every minute.
+pdf_expiry_reaper = ExpiryReaper(
+    ExpiryIndex(),
+    on_expired=expire_pdfs,
+    sweep=(lambda current_time: expire_pdfs([], current_time)) if PDF_STORE_BACKEND == 'sqlite' else None,
+    sweep_interval=60
+)
+pdf_expiry_reaper.start()
+
+def pdf_store_bytes():
+    """Return the combined size of the stored PDFs."""
+    if isinstance(pdf_memory_store, TieredPdfStore):
+        tiers = pdf_memory_store.tier_stats()
+        return tiers['memory_bytes'] + tiers['disk_bytes']
+    return pdf_memory_store.total_bytes()
+
+# Workers share the SQLite store and all report its totals, so those gauges take the maximum
+store_aggregate = 'max' if PDF_STORE_BACKEND == 'sqlite' else 'sum'
+metrics.gauge('pdfmerger_store_entries', 'PDFs held in the PDF store', lambda: len(pdf_memory_store),
+              aggregate=store_aggregate)
+metrics.gauge('pdfmerger_store_bytes', 'Bytes of PDFs held in the PDF store', pdf_store_bytes,
+              aggregate=store_aggregate)
+metrics.gauge('pdfmerger_persistence_save_seconds', 'Duration of the last persistence flush',
+              lambda: pdf_persister.stats.get('last_flush_seconds') if PERSISTENCE_ENABLED else None,
+              aggregate='max')
+metrics.gauge('pdfmerger_expiry_lag_seconds', 'How late the expiry reaper removed the last expired PDF',
+              lambda: pdf_expiry_reaper.stats['last_lag_seconds'], aggregate='max')
+metrics.counter('pdfmerger_document_cache_hits_total', 'Merge inputs found already parsed in a document cache',
+                lambda: document_cache_stats['hits'])
+metrics.counter('pdfmerger_document_cache_misses_total', 'Merge inputs that had to be parsed',
+                lambda: document_cache_stats['misses'])
+metrics.gauge('pdfmerger_admission_inflight_cpu_seconds', 'Estimated CPU seconds of admitted merges not yet done',
+              lambda: merge_admission.snapshot()['inflight_cpu_seconds'])
+metrics.start()
+
+@app.route('/profiles/<profile_id>')
+def get_profile(profile_id):
+    """
+    Return a stored profile, to holders of the profiling token or in debug mode.
+
+    ``?format=pstats`` downloads the raw statistics for pstats or snakeviz;
+    otherwise a text report sorted by ``?sort=`` (default ``cumulative``) is
+    returned with the top ``?limit=`` functions.
+    """
+    if not (app.debug or request_sampler.is_authorized(request.headers.get('X-Profile-Token'))):
+        return jsonify({'error': 'Profiling token required'}), 403
+    path = profile_store.path(profile_id)
+    if path is None or not os.path.exists(path):
+        return jsonify({'error': f'Unknown profile {profile_id}'}), 404
+    if request.args.get('format') == 'pstats':
+        with open(path, 'rb') as profile_file:
+            data = profile_file.read()
+        return Response(data, mimetype='application/octet-stream', headers={
+            'Content-Disposition': f'attachment; filename="{profile_id}.prof"'
+        })
+    try:
+        report = profile_store.report(profile_id, request.args.get('sort', 'cumulative'),
+                                      request.args.get('limit', 60, type=int))
+    except KeyError:
+        return jsonify({'error': 'Unknown sort key'}), 400
+    if report is None:
+        return jsonify({'error': f'Unknown profile {profile_id}'}), 404
+    return Response(report, mimetype='text/plain')
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    """Expose metrics of all workers in the Prometheus text format."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/error')
 def error_page():
     """Render the error page."""
@@ -636,80 +1605,28 @@ def bad_request(e):
     logger.warning("Bad request: %s", str(e))
     return render_template('error.html', message="Bad request"), 400
 
-def save_pdf_store():
-    """Save the PDF store to disk for persistence."""
-    if not PERSISTENCE_ENABLED:
-        return
-
-    try:
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(PERSISTENCE_FILE), exist_ok=True)
-
-        # Create a copy of the store with serializable data
-        serializable_store = {}
-        for pdf_id, pdf_data in pdf_memory_store.items():
-            # Skip if already expired
-            if pdf_data['expiration'] < time.time():
-                continue
-
-            # Convert BytesIO to base64 string for serialization
-            pdf_bytes = pdf_data['data'].getvalue()
-            serializable_store[pdf_id] = {
-                'data_base64': base64.b64encode(pdf_bytes).decode('utf-8'),
-                'filename': pdf_data['filename'],
-                'expiration': pdf_data['expiration'],
-                'created_at': pdf_data.get('created_at', time.time()),
-                'size_bytes': len(pdf_bytes)
-            }
-
-        # Write to a temporary file first to avoid corruption
-        temp_file = PERSISTENCE_FILE + '.tmp'
-        with open(temp_file, 'w') as f:
-            json.dump(serializable_store, f)
-
-        # Rename to the actual file (atomic operation)
-        os.replace(temp_file, PERSISTENCE_FILE)
-
-        logger.info(f"Successfully saved PDF store to disk ({len(serializable_store)} items)")
-    except Exception as e:
-        logger.error(f"Failed to save PDF store: {str(e)}")
-
 def recover_from_persistence(pdf_id):
     """Try to recover a specific PDF from persistence storage."""
-    if not PERSISTENCE_ENABLED or not os.path.exists(PERSISTENCE_FILE):
+    if not PERSISTENCE_ENABLED or not os.path.exists(PERSISTENCE_STORE_DIR):
         logger.warning(f"Cannot recover PDF {pdf_id}: persistence disabled or file not found")
         return False
 
     try:
-        with open(PERSISTENCE_FILE, 'r') as f:
-            serializable_store = json.load(f)
-
-        # Check if PDF exists in the persistence file
-        if pdf_id not in serializable_store:
-            logger.warning(f"PDF {pdf_id} not found in persistence file")
-            return False
-
-        pdf_data = serializable_store[pdf_id]
-
-        # Check if it's expired
-        if pdf_data['expiration'] < time.time():
-            logger.warning(f"PDF {pdf_id} is expired in persistence file")
+        pdf_data = pdf_disk_store.get(pdf_id)
+        if pdf_data is None:
+            logger.warning(f"PDF {pdf_id} not found in persistence store or expired")
             return False
 
-        # Recover the PDF data
-        pdf_bytes = base64.b64decode(pdf_data['data_base64'])
-        pdf_buffer = io.BytesIO(pdf_bytes)
-        pdf_buffer.seek(0)
-
         # Add back to memory store
         pdf_memory_store[pdf_id] = {
-            'data': pdf_buffer,
+            'data': io.BytesIO(pdf_data['data']),
             'filename': pdf_data['filename'],
             'expiration': pdf_data['expiration'],
-            'created_at': pdf_data.get('created_at', time.time() - 3600),
-            'size_bytes': len(pdf_bytes),
+            'created_at': pdf_data['created_at'],
+            'size_bytes': len(pdf_data['data']),
             'recovered': True
         }
+        pdf_expiry_reaper.schedule(pdf_id, pdf_data['expiration'])
 
         logger.info(f"Successfully recovered PDF {pdf_id} from persistence")
         return True
@@ -718,48 +1635,57 @@ def recover_from_persistence(pdf_id):
         logger.exception(f"Error recovering PDF {pdf_id} from persistence: {str(e)}")
         return False
 
-def load_pdf_store():
-    """Load the PDF store from disk."""
-    # Create a new dictionary instead of modifying the global variable
-    loaded_store = {}
-
-    if not PERSISTENCE_ENABLED or not os.path.exists(PERSISTENCE_FILE):
-        return loaded_store
+def migrate_legacy_pdf_store():
+    """Convert the JSON+base64 store of older releases into the binary record log."""
+    if not os.path.exists(LEGACY_PERSISTENCE_FILE) or pdf_disk_store.ids():
+        return
 
     try:
-        with open(PERSISTENCE_FILE, 'r', encoding='utf-8') as file_handle:
+        with open(LEGACY_PERSISTENCE_FILE, 'r', encoding='utf-8') as file_handle:
             serializable_store = json.load(file_handle)
 
-        # Convert the serialized data back to BytesIO objects
-        loaded_store = {}
         current_time = time.time()
-
+        migrated_store = {}
         for pdf_id, pdf_data in serializable_store.items():
-            # Skip expired entries
             if pdf_data['expiration'] < current_time:
                 continue
+            migrated_store[pdf_id] = {
+                'data': io.BytesIO(base64.b64decode(pdf_data['data_base64'])),
+                'filename': pdf_data['filename'],
+                'expiration': pdf_data['expiration'],
+                'created_at': pdf_data.get('created_at', current_time)
+            }
+
+        pdf_disk_store.append(migrated_store)
+        os.replace(LEGACY_PERSISTENCE_FILE, LEGACY_PERSISTENCE_FILE + '.migrated')
+        logger.info("Migrated %d PDFs from %s", len(migrated_store), LEGACY_PERSISTENCE_FILE)
+    except (IOError, OSError, ValueError, TypeError, KeyError, base64.binascii.Error) as e:
+        logger.error("Failed to migrate legacy PDF store: %s", str(e))
+
+def load_pdf_store():
+    """Load the PDF store from disk."""
+    # Create a new dictionary instead of modifying the global variable
+    loaded_store = {}
 
-            # Convert base64 back to BytesIO
-            pdf_bytes = base64.b64decode(pdf_data['data_base64'])
-            pdf_buffer = io.BytesIO(pdf_bytes)
-            pdf_buffer.seek(0)  # Important: Reset position to beginning
+    if not PERSISTENCE_ENABLED or not os.path.exists(PERSISTENCE_STORE_DIR):
+        return loaded_store
 
+    try:
+        for pdf_id, pdf_data in pdf_disk_store.load_all().items():
             loaded_store[pdf_id] = {
-                'data': pdf_buffer,
+                'data': io.BytesIO(pdf_data['data']),
                 'filename': pdf_data['filename'],
-                'expiration': pdf_data['expiration']
+                'expiration': pdf_data['expiration'],
+                'created_at': pdf_data['created_at'],
+                'size_bytes': len(pdf_data['data']),
+                'restored': True
             }
 
         logger.info("Successfully loaded PDF store from disk (%d valid items)", len(loaded_store))
         return loaded_store
-    except (IOError, OSError, ValueError, TypeError, KeyError, json.JSONDecodeError, base64.binascii.Error) as e:
+    except (IOError, OSError, ValueError, UnicodeDecodeError) as e:
         logger.error("Failed to load PDF store: %s", str(e))
         return {}
-# Initialize persistence at startup
-if PERSISTENCE_ENABLED:
-    pdf_memory_store.update(load_pdf_store())
-    # Start the save timer
-    threading.Timer(PERSISTENCE_INTERVAL, save_pdf_store).start()
 
 @app.route('/api/debug/pdfs')
 def debug_pdfs():
@@ -802,6 +1728,18 @@ def debug_csp():
     </html>
     """
 
+def peek_pdf_entries():
+    """
+    List the stored PDFs without reading spilled ones back into memory.
+
+    Returns:
+        list: (pdf_id, entry) pairs; ``data`` is None for PDFs on the disk tier
+    """
+    if not isinstance(pdf_memory_store, TieredPdfStore):
+        return list(pdf_memory_store.items())
+    entries = ((pdf_id, pdf_memory_store.peek(pdf_id)) for pdf_id in list(pdf_memory_store))
+    return [(pdf_id, entry) for pdf_id, entry in entries if entry is not None]
+
 @app.route('/debug/memory-store')
 def debug_memory_store():
     """Debug endpoint to view the PDF memory store."""
@@ -813,7 +1751,7 @@ def debug_memory_store():
     store_info = {}
     current_time = time.time()
 
-    for pdf_id, data in pdf_memory_store.items():
+    for pdf_id, data in peek_pdf_entries():
         expires_in = data['expiration'] - current_time
         store_info[pdf_id] = {
             'filename': data['filename'],
@@ -826,7 +1764,8 @@ def debug_memory_store():
     return jsonify({
         'active_pdfs': len(pdf_memory_store),
         'pdf_store': store_info,
-        'pdf_stats': pdf_stats
+        'pdf_stats': pdf_stats,
+        'merge_cache': merge_result_cache.stats()
     })
 
 # Add this debug route to help us inspect what's going on
@@ -841,18 +1780,20 @@ def debug_pdf_store():
         "memory_store_size": len(pdf_memory_store),
         "memory_store_keys": list(pdf_memory_store.keys()),
         "pdf_stats": pdf_stats,
+        "merge_cache": merge_result_cache.stats(),
         "persistence_enabled": PERSISTENCE_ENABLED,
-        "persistence_file": PERSISTENCE_FILE,
-        "persistence_file_exists": os.path.exists(PERSISTENCE_FILE)
+        "persistence_store": PERSISTENCE_STORE_DIR,
+        "persistence_store_exists": os.path.exists(PERSISTENCE_STORE_DIR)
     }
 
-    # Try to load the persistence file
-    if PERSISTENCE_ENABLED and os.path.exists(PERSISTENCE_FILE):
+    # Read the persistence index (no PDF data is loaded)
+    if PERSISTENCE_ENABLED and os.path.exists(PERSISTENCE_STORE_DIR):
         try:
-            with open(PERSISTENCE_FILE, 'r') as f:
-                persistence_data = json.load(f)
-            result["persistence_store_size"] = len(persistence_data)
-            result["persistence_store_keys"] = list(persistence_data.keys())
+            persistence_keys = pdf_disk_store.ids()
+            result["persistence_store_size"] = len(persistence_keys)
+            result["persistence_store_keys"] = persistence_keys
+            result["persistence_pending"] = pdf_persister.pending()
+            result["persistence_disk"] = pdf_disk_store.stats()
         except Exception as e:
             result["persistence_error"] = str(e)
 
@@ -867,7 +1808,7 @@ def log_pdf_store_status():
         expired_count = 0
 
         # Check for soon-to-expire PDFs
-        for pdf_id, data in pdf_memory_store.items():
+        for pdf_id, data in peek_pdf_entries():
             expiry_time = data.get('expiration', 0)
             time_left = expiry_time - current_time
 
@@ -887,6 +1828,21 @@ def log_pdf_store_status():
     except Exception as e:
         logger.error(f"Error logging PDF store status: {str(e)}")
 
+def document_cache_report():
+    """
+    Summarise the document cache lookups of this worker's merges.
+
+    Returns:
+        dict: ``hits``, ``misses``, ``hit_rate`` and the per-process ``max_bytes``
+    """
+    lookups = document_cache_stats['hits'] + document_cache_stats['misses']
+    return {
+        'hits': document_cache_stats['hits'],
+        'misses': document_cache_stats['misses'],
+        'hit_rate': round(document_cache_stats['hits'] / lookups, 4) if lookups else 0.0,
+        'max_bytes': DOCUMENT_CACHE_MAX_BYTES
+    }
+
 @app.route('/health')
 def health_check():
     """Health check endpoint for Docker healthcheck."""
@@ -897,18 +1853,28 @@ def health_check():
         # Check if persistence is working
         persistence_ok = True
         if PERSISTENCE_ENABLED:
-            persistence_ok = os.path.exists(os.path.dirname(PERSISTENCE_FILE))
+            persistence_ok = os.path.exists(os.path.dirname(PERSISTENCE_STORE_DIR))
 
         return jsonify({
             'status': 'healthy',
             'timestamp': time.time(),
             'pdf_store': {
+                'backend': PDF_STORE_BACKEND,
                 'size': store_size,
-                'stats': pdf_stats
+                'stats': pdf_stats,
+                'merge_cache': merge_result_cache.stats(),
+                'inspect_cache': inspect_cache.stats(),
+                'document_cache': document_cache_report(),
+                'tiers': pdf_memory_store.tier_stats() if isinstance(pdf_memory_store, TieredPdfStore) else None,
+                'expiry': dict(pdf_expiry_reaper.stats, scheduled=len(pdf_expiry_reaper.index))
             },
+            'merge_pool': merge_pool.snapshot(),
+            'admission': merge_admission.snapshot(),
             'persistence': {
                 'enabled': PERSISTENCE_ENABLED,
-                'working': persistence_ok
+                'working': persistence_ok,
+                'pending': pdf_persister.pending(),
+                'stats': pdf_persister.stats
             }
         })
     except Exception as e:
@@ -920,52 +1886,16 @@ def health_check():
 # Initialize persistence mechanism
 if PERSISTENCE_ENABLED:
     # Load existing PDFs at startup
-    try:
-        logger.info(f"Loading persistent PDF store from {PERSISTENCE_FILE}")
-        if os.path.exists(PERSISTENCE_FILE):
-            with open(PERSISTENCE_FILE, 'r') as f:
-                serializable_store = json.load(f)
-
-            loaded_count = 0
-            expired_count = 0
-            current_time = time.time()
-
-            for pdf_id, pdf_data in serializable_store.items():
-                # Skip expired entries
-                if pdf_data['expiration'] < current_time:
-                    expired_count += 1
-                    continue
-
-                # Convert base64 back to BytesIO
-                pdf_bytes = base64.b64decode(pdf_data['data_base64'])
-                pdf_buffer = io.BytesIO(pdf_bytes)
-                pdf_buffer.seek(0)
-
-                pdf_memory_store[pdf_id] = {
-                    'data': pdf_buffer,
-                    'filename': pdf_data['filename'],
-                    'expiration': pdf_data['expiration'],
-                    'created_at': pdf_data.get('created_at', time.time() - 3600),
-                    'size_bytes': len(pdf_bytes),
-                    'restored': True
-                }
-                loaded_count += 1
-
-            logger.info(f"Loaded {loaded_count} PDFs from persistence ({expired_count} expired entries skipped)")
-        else:
-            logger.info("No persistence file found, starting with empty PDF store")
-    except Exception as e:
-        logger.error(f"Error loading PDF store: {str(e)}")
-
-    # Start the periodic save timer
-    save_interval = int(os.environ.get('PERSISTENCE_INTERVAL', 60))
-    logger.info(f"Starting persistence timer with {save_interval} second interval")
-
-    def periodic_save():
-        save_pdf_store()
-        threading.Timer(save_interval, periodic_save).start()
-
-    threading.Timer(save_interval, periodic_save).start()
+    logger.info(f"Loading persistent PDF store from {PERSISTENCE_STORE_DIR}")
+    migrate_legacy_pdf_store()
+    for restored_id, restored_entry in load_pdf_store().items():
+        pdf_memory_store[restored_id] = restored_entry
+        pdf_expiry_reaper.schedule(restored_id, restored_entry['expiration'])
+
+    # Start the write-behind persister; it flushes once more at shutdown
+    logger.info(f"Starting PDF persister with {PERSISTENCE_DEBOUNCE} second debounce")
+    pdf_persister.start()
+    pdf_disk_store.start_compaction(PERSISTENCE_COMPACTION_INTERVAL)
 
 if __name__ == '__main__':
     # Use environment variables for host and port
@@ -0,0 +1,115 @@
+"""
+Unit tests for cost-based admission control.
+
+This module verifies that clients are charged by estimated and then measured
+CPU time, that one client cannot take the whole in-flight budget, and that
+the per-page rates follow the measured merges.
+"""
+import unittest
+
+from pdfMergerWebsite.backend.utils.admission import AdmissionController, AdmissionDenied, cpu_timed_call
+
+MB = 1024 * 1024
+
+
+def _busy_task(loops, progress=None):
+    """Pool-style task burning some CPU."""
+    return sum(i * i for i in range(loops))
+
+
+class TestAdmissionController(unittest.TestCase):
+    """Test cases for AdmissionController."""
+
+    def _controller(self, **kwargs):
+        """Build a controller whose buckets barely refill during a test."""
+        options = {'client_rate': 1e-6, 'client_burst': 10, 'max_inflight': 0,
+                   'cpu_seconds_per_page': 0.01, 'bytes_per_page': MB, 'overhead_seconds': 0}
+        options.update(kwargs)
+        return AdmissionController(**options)
+
+    def test_estimate_uses_known_pages_and_bytes(self):
+        """Test that page counts are used where known and derived from the size otherwise."""
+        controller = self._controller()
+        estimate = controller.estimate([(3 * MB, None), (100, 40)])
+        self.assertEqual(estimate['pages'], 43)
+        self.assertAlmostEqual(estimate['cpu_seconds'], 0.43)
+
+    def test_heavy_client_runs_out_before_light_one(self):
+        """Test that large merges use up a client's bucket while another client is unaffected."""
+        controller = self._controller()
+        for _ in range(2):
+            with controller.admit('heavy', [(400 * MB, None)]) as ticket:
+                ticket.settle(4.0, 400)
+        with self.assertRaises(AdmissionDenied) as denied:
+            controller.admit('heavy', [(400 * MB, None)])
+        self.assertEqual(denied.exception.scope, 'client')
+        self.assertGreater(denied.exception.retry_after, 1000)
+
+        # The same number of requests with small inputs is fine
+        for _ in range(3):
+            with controller.admit('light', [(2 * MB, None)]) as ticket:
+                ticket.settle(0.02, 2)
+        self.assertAlmostEqual(controller.client_tokens('heavy'), 2.0, places=3)
+        self.assertEqual(controller.snapshot()['rejected_client'], 1)
+
+    def test_measured_cost_replaces_estimate(self):
+        """Test that a merge cheaper than estimated refunds the difference, and a dearer one goes into debt."""
+        controller = self._controller()
+        with controller.admit('client', [(500 * MB, None)]) as ticket:
+            self.assertAlmostEqual(controller.client_tokens('client'), 5.0, places=3)
+            ticket.settle(1.0)
+        self.assertAlmostEqual(controller.client_tokens('client'), 9.0, places=3)
+
+        with controller.admit('client', [(MB, None)]) as ticket:
+            ticket.settle(12.0)
+        self.assertLess(controller.client_tokens('client'), 0)
+        with self.assertRaises(AdmissionDenied):
+            controller.admit('client', [(MB, None)])
+
+    def test_oversized_merge_needs_a_full_bucket(self):
+        """Test that a merge costing more than the bucket holds is admitted only when the bucket is full."""
+        controller = self._controller()
+        with controller.admit('client', [(5000 * MB, None)]):
+            pass
+        with self.assertRaises(AdmissionDenied):
+            controller.admit('client', [(5000 * MB, None)])
+
+    def test_inflight_budget_and_client_share(self):
+        """Test that one client cannot hold more than its share of the in-flight budget."""
+        controller = self._controller(client_rate=0, max_inflight=10, client_share=0.5, workers=2)
+        first = controller.admit('a', [(400 * MB, None)])
+        with self.assertRaises(AdmissionDenied) as denied:
+            controller.admit('a', [(200 * MB, None)])
+        self.assertEqual(denied.exception.scope, 'server')
+        second = controller.admit('b', [(400 * MB, None)])
+        with self.assertRaises(AdmissionDenied):
+            controller.admit('c', [(300 * MB, None)])
+        self.assertEqual(controller.snapshot()['inflight_cpu_seconds'], 8.0)
+
+        first.release()
+        first.release()
+        controller.admit('c', [(300 * MB, None)]).release()
+        second.release()
+        self.assertEqual(controller.snapshot()['inflight_cpu_seconds'], 0.0)
+        # With nothing in flight even a merge beyond the whole budget gets in
+        controller.admit('a', [(5000 * MB, None)]).release()
+
+    def test_rates_follow_measured_merges(self):
+        """Test that settled merges move the per-page CPU and size estimates."""
+        controller = self._controller()
+        for _ in range(30):
+            with controller.admit('client', [(10 * MB, None)]) as ticket:
+                ticket.settle(0.02, 20)
+        snapshot = controller.snapshot()
+        self.assertAlmostEqual(snapshot['cpu_seconds_per_page'], 0.001, places=4)
+        self.assertAlmostEqual(snapshot['bytes_per_page'] / MB, 0.5, places=2)
+
+    def test_cpu_timed_call(self):
+        """Test that the wrapped task's result and a CPU time come back."""
+        result, cpu_seconds = cpu_timed_call(_busy_task, 200000)
+        self.assertEqual(result, _busy_task(200000))
+        self.assertGreater(cpu_seconds, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
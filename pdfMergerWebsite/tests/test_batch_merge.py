@@ -0,0 +1,135 @@
+"""
+Unit tests for batch merging.
+
+This module verifies manifest parsing, that a batch resumes from its
+checkpoint, that an unexpected error fails only its own job, and that jobs run
+in pool processes.
+"""
+import unittest
+import os
+import json
+import tempfile
+import shutil
+from unittest import mock
+
+from pypdf import PdfReader, PdfWriter
+
+from pdfMergerWebsite.backend.utils import batch_merge
+from pdfMergerWebsite.backend.utils.batch_merge import (
+    BatchManifestError, load_manifest, load_checkpoint, run_batch
+)
+
+
+class TestBatchMerge(unittest.TestCase):
+    """Test cases for the batch merge tool."""
+
+    def setUp(self):
+        """Set up input PDFs and a CSV manifest with two jobs."""
+        self.temp_dir = tempfile.mkdtemp()
+        for name, pages in (('a.pdf', 1), ('b.pdf', 2), ('c.pdf', 3)):
+            writer = PdfWriter()
+            for _ in range(pages):
+                writer.add_blank_page(width=72, height=72)
+            with open(os.path.join(self.temp_dir, name), 'wb') as pdf_file:
+                writer.write(pdf_file)
+        self.manifest = os.path.join(self.temp_dir, 'manifest.csv')
+        self._write_manifest([('one', 'a.pdf', 'out/one.pdf'), ('one', 'b.pdf', 'out/one.pdf'),
+                              ('two', 'c.pdf', 'out/two.pdf'), ('two', 'a.pdf', 'out/two.pdf')])
+        self.checkpoint = os.path.join(self.temp_dir, 'batch.checkpoint')
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _write_manifest(self, rows):
+        """Write a CSV manifest with the given (job, input, output) rows."""
+        with open(self.manifest, 'w', encoding='utf-8') as manifest_file:
+            manifest_file.write('job,input,output\n')
+            for row in rows:
+                manifest_file.write(','.join(row) + '\n')
+
+    def test_load_manifest(self):
+        """Test that CSV and JSON manifests give the same jobs with resolved paths."""
+        jobs = load_manifest(self.manifest)
+        self.assertEqual([job['job'] for job in jobs], ['one', 'two'])
+        self.assertEqual(jobs[1]['inputs'], [os.path.join(self.temp_dir, 'c.pdf'),
+                                             os.path.join(self.temp_dir, 'a.pdf')])
+        self.assertEqual(jobs[0]['output'], os.path.join(self.temp_dir, 'out', 'one.pdf'))
+
+        json_manifest = os.path.join(self.temp_dir, 'manifest.json')
+        with open(json_manifest, 'w', encoding='utf-8') as manifest_file:
+            json.dump([{'job': 'one', 'inputs': ['a.pdf', 'b.pdf'], 'output': 'out/one.pdf'},
+                       {'job': 'two', 'inputs': ['c.pdf', 'a.pdf'], 'output': 'out/two.pdf'}], manifest_file)
+        self.assertEqual(load_manifest(json_manifest), jobs)
+
+    def test_invalid_manifest(self):
+        """Test that single-input jobs, conflicting outputs and string inputs are rejected."""
+        self._write_manifest([('one', 'a.pdf', 'one.pdf')])
+        with self.assertRaises(BatchManifestError):
+            load_manifest(self.manifest)
+        self._write_manifest([('one', 'a.pdf', 'one.pdf'), ('one', 'b.pdf', 'other.pdf')])
+        with self.assertRaises(BatchManifestError):
+            load_manifest(self.manifest)
+
+        json_manifest = os.path.join(self.temp_dir, 'manifest.json')
+        with open(json_manifest, 'w', encoding='utf-8') as manifest_file:
+            json.dump([{'job': 'one', 'inputs': 'a.pdf', 'output': 'one.pdf'}], manifest_file)
+        with self.assertRaises(BatchManifestError):
+            load_manifest(json_manifest)
+
+    def test_resume_from_checkpoint(self):
+        """Test that finished jobs are skipped and failed ones retried on the next run."""
+        os.rename(os.path.join(self.temp_dir, 'c.pdf'), os.path.join(self.temp_dir, 'c.bak'))
+        jobs = load_manifest(self.manifest)
+
+        summary = run_batch(jobs, self.checkpoint, workers=0)
+        self.assertEqual((summary['succeeded'], summary['failed'], summary['skipped']), (1, 1, 0))
+        self.assertEqual(summary['pages'], 3)
+        self.assertEqual(load_checkpoint(self.checkpoint), {'one'})
+
+        # An interrupted write leaves a partial line behind
+        with open(self.checkpoint, 'a', encoding='utf-8') as checkpoint_file:
+            checkpoint_file.write('{"job": "tw')
+        os.rename(os.path.join(self.temp_dir, 'c.bak'), os.path.join(self.temp_dir, 'c.pdf'))
+
+        summary = run_batch(jobs, self.checkpoint, workers=0)
+        self.assertEqual((summary['succeeded'], summary['failed'], summary['skipped']), (1, 0, 1))
+        self.assertEqual(load_checkpoint(self.checkpoint), {'one', 'two'})
+        self.assertEqual(len(PdfReader(os.path.join(self.temp_dir, 'out', 'two.pdf')).pages), 4)
+
+    def test_unexpected_error_fails_only_its_job(self):
+        """Test that an exception raised by a merge is recorded and the batch carries on."""
+        real_merge_pdfs = batch_merge.merge_pdfs
+
+        def merge_pdfs(input_paths, output_path, **options):
+            if output_path.endswith('one.pdf'):
+                raise RuntimeError('disk on fire')
+            return real_merge_pdfs(input_paths, output_path, **options)
+
+        with mock.patch.object(batch_merge, 'merge_pdfs', merge_pdfs), \
+                self.assertLogs(batch_merge.logger, 'ERROR'):
+            summary = run_batch(load_manifest(self.manifest), self.checkpoint, workers=0)
+
+        self.assertEqual((summary['succeeded'], summary['failed']), (1, 1))
+        with open(self.checkpoint, encoding='utf-8') as checkpoint_file:
+            records = {record['job']: record for record in map(json.loads, checkpoint_file)}
+        self.assertFalse(records['one']['success'])
+        self.assertEqual(records['one']['error'], 'RuntimeError: disk on fire')
+        self.assertEqual(records['one']['output_bytes'], 0)
+        self.assertTrue(records['two']['success'])
+
+    def test_jobs_run_in_pool_processes(self):
+        """Test a batch merged by pool processes."""
+        summary = run_batch(load_manifest(self.manifest), self.checkpoint, workers=2,
+                            merge_options={'profile': 'balanced'})
+        with open(self.checkpoint, encoding='utf-8') as checkpoint_file:
+            errors = [record['error'] for record in map(json.loads, checkpoint_file) if not record['success']]
+        self.assertEqual(errors, [])
+        self.assertEqual(summary['succeeded'], 2)
+        self.assertEqual(summary['pages'], 7)
+        self.assertGreater(summary['mb_per_second'], 0)
+        self.assertEqual(len(PdfReader(os.path.join(self.temp_dir, 'out', 'one.pdf')).pages), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
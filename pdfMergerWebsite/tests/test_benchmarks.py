@@ -0,0 +1,75 @@
+"""
+Unit tests for the benchmark suite.
+
+This module verifies that the synthetic corpus is deterministic and readable,
+and that a comparison with a baseline flags regressions beyond the tolerance.
+"""
+import unittest
+import os
+import tempfile
+import shutil
+
+from pypdf import PdfReader
+
+from pdfMergerWebsite.benchmarks.corpus import generate_corpus
+from pdfMergerWebsite.benchmarks.run_benchmarks import compare_results
+
+
+def _run(medians, seed=0, scale=1.0):
+    """Build a minimal run_benchmarks result with the given median times."""
+    return {
+        'meta': {'seed': seed, 'scale': scale},
+        'results': {name: {'median_seconds': seconds} for name, seconds in medians.items()}
+    }
+
+
+class TestCorpus(unittest.TestCase):
+    """Test cases for the corpus generator."""
+
+    def setUp(self):
+        """Set up a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_same_seed_gives_identical_files(self):
+        """Test that two corpora with the same seed are byte-identical and readable."""
+        scenarios = ['page_counts', 'image_heavy']
+        first = generate_corpus(os.path.join(self.temp_dir, 'a'), seed=7, scale=0.1, scenarios=scenarios)
+        second = generate_corpus(os.path.join(self.temp_dir, 'b'), seed=7, scale=0.1, scenarios=scenarios)
+        for name in scenarios:
+            self.assertEqual(len(first[name]), len(second[name]))
+            for path_a, path_b in zip(first[name], second[name]):
+                with open(path_a, 'rb') as file_a, open(path_b, 'rb') as file_b:
+                    self.assertEqual(file_a.read(), file_b.read())
+
+        page_counts = [len(PdfReader(path).pages) for path in first['page_counts']]
+        self.assertEqual(page_counts, [1, 1, 5, 20])
+
+    def test_different_seed_changes_content(self):
+        """Test that the seed changes the generated content."""
+        first = generate_corpus(os.path.join(self.temp_dir, 'a'), seed=1, scale=0.1, scenarios=['many_small'])
+        second = generate_corpus(os.path.join(self.temp_dir, 'b'), seed=2, scale=0.1, scenarios=['many_small'])
+        with open(first['many_small'][0], 'rb') as file_a, open(second['many_small'][0], 'rb') as file_b:
+            self.assertNotEqual(file_a.read(), file_b.read())
+
+
+class TestCompareResults(unittest.TestCase):
+    """Test cases for compare_results."""
+
+    def test_regressions_beyond_tolerance_are_flagged(self):
+        """Test that only benchmarks slower than the tolerance are marked as regressed."""
+        baseline = _run({'merge_pdfs/huge': 1.0, 'upload/huge': 1.0, 'persistence/save': 1.0})
+        results = _run({'merge_pdfs/huge': 1.2, 'upload/huge': 1.5, 'download/huge': 0.1})
+
+        comparison = {row['name']: row for row in compare_results(results, baseline, tolerance=0.25)}
+        self.assertEqual(set(comparison), {'merge_pdfs/huge', 'upload/huge'})
+        self.assertFalse(comparison['merge_pdfs/huge']['regressed'])
+        self.assertTrue(comparison['upload/huge']['regressed'])
+        self.assertEqual(comparison['upload/huge']['ratio'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+Unit tests for resumable chunked uploads.
+
+This module verifies that chunks arrive in any order, that bad chunks are
+rejected without counting as received, that the resume offset follows the
+contiguous prefix, and that finalizing verifies the assembled file.
+"""
+import unittest
+import io
+import hashlib
+import tempfile
+import shutil
+import threading
+
+from pdfMergerWebsite.backend.utils.chunked_uploads import ChunkedUploadError, ChunkedUploadStore
+
+# 10 bytes with chunks of 4: chunks 0-1 are full, chunk 2 holds the last 2 bytes
+DOCUMENT = b'%PDF-1.7\n\n'
+
+
+def _sha256(data):
+    """Return the hex SHA-256 of some bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class TestChunkedUploadStore(unittest.TestCase):
+    """Test cases for ChunkedUploadStore."""
+
+    def setUp(self):
+        """Set up a store in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = ChunkedUploadStore(self.temp_dir, max_upload_bytes=100, max_chunk_bytes=8)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _put(self, upload_id, index, data=None, sha256=None):
+        """Send a chunk of DOCUMENT, or the given bytes."""
+        if data is None:
+            data = DOCUMENT[index * 4:index * 4 + 4]
+        return self.store.write_chunk(upload_id, index, io.BytesIO(data), sha256 or _sha256(data))
+
+    def test_out_of_order_chunks_and_resume_offset(self):
+        """Test that the resume offset covers only chunks received without a gap."""
+        upload_id = self.store.create('scan.pdf', len(DOCUMENT), chunk_size=4, sha256=_sha256(DOCUMENT))['upload_id']
+        status = self._put(upload_id, 2)
+        self.assertEqual((status['received_chunks'], status['received_offset']), (1, 0))
+        self.assertEqual(status['missing_chunks'], [0, 1])
+
+        with self.assertRaises(ChunkedUploadError) as context:
+            self.store.finalize(upload_id)
+        self.assertEqual(context.exception.status_code, 409)
+
+        self.assertEqual(self._put(upload_id, 0)['received_offset'], 4)
+        self.assertEqual(self._put(upload_id, 1)['received_offset'], len(DOCUMENT))
+
+        status = self.store.finalize(upload_id)
+        self.assertTrue(status['complete'])
+        self.assertEqual(status['sha256'], _sha256(DOCUMENT))
+        filename, pdf_file, digest = self.store.open(upload_id)
+        with pdf_file:
+            self.assertEqual((filename, pdf_file.read(), digest), ('scan.pdf', DOCUMENT, _sha256(DOCUMENT)))
+
+    def test_bad_chunks_are_not_counted(self):
+        """Test that a wrong checksum or length leaves the chunk missing, also when it was received before."""
+        upload_id = self.store.create('scan.pdf', len(DOCUMENT), chunk_size=4)['upload_id']
+        self._put(upload_id, 0)
+        for data, sha256, status_code in ((b'%PDX', _sha256(b'%PDF'), 422), (b'%P', None, 400)):
+            with self.assertRaises(ChunkedUploadError) as context:
+                self._put(upload_id, 0, data, sha256)
+            self.assertEqual(context.exception.status_code, status_code)
+            self.assertEqual(self.store.status(upload_id)['received_chunks'], 0)
+        with self.assertRaises(ChunkedUploadError) as context:
+            self._put(upload_id, 3, b'xx')
+        self.assertEqual(context.exception.status_code, 416)
+
+    def test_whole_file_checks(self):
+        """Test that finalizing rejects a digest mismatch and files that are not PDFs."""
+        upload_id = self.store.create('scan.pdf', 8, chunk_size=8, sha256=_sha256(b'nope'))['upload_id']
+        self._put(upload_id, 0, DOCUMENT[:8])
+        with self.assertRaises(ChunkedUploadError) as context:
+            self.store.finalize(upload_id)
+        self.assertEqual(context.exception.status_code, 422)
+
+        upload_id = self.store.create('scan.pdf', 4, chunk_size=4)['upload_id']
+        self._put(upload_id, 0, b'text')
+        with self.assertRaises(ChunkedUploadError):
+            self.store.finalize(upload_id)
+        with self.assertRaises(ChunkedUploadError):
+            self.store.create('scan.pdf', 101)
+        with self.assertRaises(ChunkedUploadError):
+            self.store.create('scan.txt', 10)
+
+    def test_finalize_waits_for_chunks_being_written(self):
+        """Test that a chunk resent during finalizing is hashed with the file, and one sent later is refused."""
+        upload_id = self.store.create('scan.pdf', len(DOCUMENT), chunk_size=4)['upload_id']
+        for index in range(3):
+            self._put(upload_id, index)
+        reading = threading.Event()
+        release = threading.Event()
+        resent = b'-2.0'
+
+        class SlowStream(io.BytesIO):
+            """Request body that stalls until the test lets it go on."""
+            def read(self, size=-1):
+                reading.set()
+                release.wait(5)
+                return super().read(size)
+
+        writer = threading.Thread(target=self.store.write_chunk,
+                                  args=(upload_id, 1, SlowStream(resent), _sha256(resent)))
+        writer.start()
+        reading.wait(5)
+        results = []
+        finalizer = threading.Thread(target=lambda: results.append(self.store.finalize(upload_id)))
+        finalizer.start()
+        finalizer.join(0.2)
+        self.assertTrue(finalizer.is_alive())
+        release.set()
+        writer.join(5)
+        finalizer.join(5)
+
+        expected = DOCUMENT[:4] + resent + DOCUMENT[8:]
+        self.assertEqual(results[0]['sha256'], _sha256(expected))
+        _, pdf_file, _ = self.store.open(upload_id)
+        with pdf_file:
+            self.assertEqual(pdf_file.read(), expected)
+        with self.assertRaises(ChunkedUploadError) as context:
+            self._put(upload_id, 1)
+        self.assertEqual(context.exception.status_code, 409)
+
+    def test_expired_sessions_are_purged(self):
+        """Test that sessions past their expiration are deleted."""
+        upload_id = self.store.create('scan.pdf', 4, chunk_size=4)['upload_id']
+        self.assertEqual(self.store.purge_expired(current_time=0), 0)
+        self.assertEqual(self.store.purge_expired(current_time=float('inf')), 1)
+        with self.assertRaises(ChunkedUploadError) as context:
+            self.store.status(upload_id)
+        self.assertEqual(context.exception.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
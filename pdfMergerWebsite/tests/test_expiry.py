@@ -0,0 +1,57 @@
+"""
+Unit tests for the PDF expiry index and reaper.
+
+This module verifies deadline ordering, rescheduling and discarding in the
+expiry index, and that the reaper thread expires PDFs without being polled.
+"""
+import unittest
+import time
+import threading
+
+from pdfMergerWebsite.backend.utils.expiry import ExpiryIndex, ExpiryReaper
+
+
+class TestExpiry(unittest.TestCase):
+    """Test cases for the expiry index and reaper."""
+
+    def test_pop_expired_in_deadline_order(self):
+        """Test that only due IDs are popped, earliest first."""
+        index = ExpiryIndex()
+        index.schedule('late', 300)
+        index.schedule('early', 100)
+        index.schedule('middle', 200)
+
+        self.assertEqual(index.pop_expired(250), [('early', 100), ('middle', 200)])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.next_expiration(), 300)
+
+    def test_rescheduled_and_discarded_ids(self):
+        """Test that stale heap items are ignored."""
+        index = ExpiryIndex()
+        index.schedule('moved', 100)
+        index.schedule('moved', 500)
+        index.schedule('dropped', 150)
+        index.discard('dropped')
+
+        self.assertEqual(index.pop_expired(200), [])
+        self.assertEqual(index.next_expiration(), 500)
+
+    def test_reaper_thread_expires_without_requests(self):
+        """Test that the background thread wakes up for a newly scheduled deadline."""
+        expired = []
+        done = threading.Event()
+
+        def on_expired(pdf_ids, _):
+            expired.extend(pdf_ids)
+            done.set()
+
+        reaper = ExpiryReaper(ExpiryIndex(), on_expired, sweep_interval=60)
+        reaper.start()
+        try:
+            reaper.schedule('soon', time.time() + 0.05)
+            self.assertTrue(done.wait(2))
+        finally:
+            reaper.stop()
+
+        self.assertEqual(expired, ['soon'])
+        self.assertEqual(reaper.stats['expired'], 1)
@@ -0,0 +1,122 @@
+"""
+Unit tests for the merge pool utility.
+
+This module verifies that merges run in worker processes with their progress
+forwarded, that the pool initializer runs where the tasks do, that input
+errors keep their status code across the process boundary, that the pool
+recovers from a dead process, and that a full pool rejects work with a
+Retry-After estimate.
+"""
+import unittest
+import os
+import io
+import signal
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from pypdf import PdfReader, PdfWriter
+
+from pdfMergerWebsite.backend.utils.merge_pool import MergePool, MergePoolBusy
+from pdfMergerWebsite.backend.utils.pdf_merger import PdfInputError, merge_pdf_documents
+
+
+def _make_pdf_bytes(pages):
+    """Build a PDF document with the given number of blank pages."""
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _set_test_variable(value):
+    """Pool initializer used by the tests."""
+    os.environ['MERGE_POOL_TEST_INIT'] = value
+
+
+def _read_test_variable(progress):
+    """Pool task returning the variable set by the pool initializer in the test."""
+    return os.environ.get('MERGE_POOL_TEST_INIT')
+
+
+def _kill_worker(progress):
+    """Pool task that kills the pool process running it."""
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+class TestMergePool(unittest.TestCase):
+    """Test cases for the process-backed merge pool."""
+
+    def test_merges_in_worker_process(self):
+        """Test that a merge runs in the pool and reports every page."""
+        pool = MergePool(max_workers=1, max_queued=0)
+        progress = []
+        try:
+            merged = pool.run(merge_pdf_documents, [('a.pdf', _make_pdf_bytes(2)), ('b.pdf', _make_pdf_bytes(1))],
+                              progress=lambda *args: progress.append(args))
+        finally:
+            pool.shutdown()
+
+        self.assertEqual(len(PdfReader(io.BytesIO(merged)).pages), 3)
+        self.assertEqual(progress[-1], (3, 3, 'writing'))
+        self.assertEqual(pool.snapshot()['completed'], 1)
+
+    def test_input_errors_cross_the_process_boundary(self):
+        """Test that an invalid input surfaces as a PdfInputError with its status code."""
+        pool = MergePool(max_workers=1, max_queued=0)
+        try:
+            with self.assertRaises(PdfInputError) as raised:
+                pool.run(merge_pdf_documents, [('bad.pdf', b'not a pdf'), ('a.pdf', _make_pdf_bytes(1))])
+        finally:
+            pool.shutdown()
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertIn('bad.pdf', raised.exception.message)
+
+    def test_initializer_runs_in_worker_process(self):
+        """Test that the initializer prepares each pool process, or this process when inline."""
+        pool = MergePool(max_workers=1, max_queued=0, initializer=_set_test_variable, initargs=('worker',))
+        try:
+            self.assertNotIn('MERGE_POOL_TEST_INIT', os.environ)
+            self.assertEqual(pool.run(_read_test_variable), 'worker')
+        finally:
+            pool.shutdown()
+
+        inline_pool = MergePool(max_workers=0, initializer=_set_test_variable, initargs=('inline',))
+        self.addCleanup(os.environ.pop, 'MERGE_POOL_TEST_INIT', None)
+        self.assertEqual(inline_pool.run(_read_test_variable), 'inline')
+
+    def test_recovers_after_a_pool_process_dies(self):
+        """Test that a killed pool process fails its task and the next merge still succeeds."""
+        pool = MergePool(max_workers=1, max_queued=0)
+        try:
+            with self.assertRaises(BrokenProcessPool):
+                pool.run(_kill_worker)
+            merged = pool.run(merge_pdf_documents, [('a.pdf', _make_pdf_bytes(2))])
+        finally:
+            pool.shutdown()
+
+        self.assertEqual(len(PdfReader(io.BytesIO(merged)).pages), 2)
+        self.assertEqual(pool.snapshot()['failed'], 1)
+        self.assertEqual(pool.snapshot()['completed'], 1)
+
+    def test_full_pool_rejects_with_retry_after(self):
+        """Test that work beyond the pool capacity is turned away."""
+        pool = MergePool(max_workers=0, max_queued=0)
+        started, release = threading.Event(), threading.Event()
+
+        def hold_slot(progress):
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=pool.run, args=(hold_slot,))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(MergePoolBusy) as raised:
+                pool.run(hold_slot)
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(pool.snapshot()['rejected'], 1)
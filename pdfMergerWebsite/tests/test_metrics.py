@@ -0,0 +1,96 @@
+"""
+Unit tests for the metrics registry.
+
+This module verifies histogram bucketing, the Prometheus text rendering and
+the aggregation of snapshots written by several worker processes.
+"""
+import unittest
+import os
+import json
+import tempfile
+import shutil
+
+from pdfMergerWebsite.backend.utils.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for MetricsRegistry."""
+
+    def setUp(self):
+        """Set up a registry writing snapshots to a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry = MetricsRegistry(self.temp_dir)
+        self.histogram = self.registry.histogram('merge_seconds', 'Merge time', buckets=(0.1, 1.0))
+        self.entries = 3
+        self.registry.gauge('store_entries', 'Stored PDFs', lambda: self.entries)
+        self.registry.gauge('lag_seconds', 'Reaper lag', lambda: 0.5, aggregate='max')
+        self.registry.counter('cache_hits_total', 'Cache hits', lambda: 2)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _write_worker_snapshot(self, pid, snapshot):
+        """Pretend another worker of this server instance wrote a snapshot."""
+        path = os.path.join(self.temp_dir, f'metrics-{os.getppid()}-{pid}.json')
+        with open(path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+
+    def test_render_single_process(self):
+        """Test that observations land in cumulative buckets."""
+        for value in (0.05, 0.5, 5):
+            self.histogram.observe(value)
+        text = self.registry.render()
+
+        self.assertIn('# TYPE merge_seconds histogram', text)
+        self.assertIn('merge_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('merge_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('merge_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('merge_seconds_count 3', text)
+        self.assertIn('merge_seconds_sum 5.55', text)
+        self.assertIn('store_entries 3.0', text)
+        self.assertIn('# TYPE cache_hits_total counter', text)
+        self.assertIn('cache_hits_total 2.0', text)
+        self.assertIn('# TYPE store_entries gauge', text)
+        with self.assertRaises(ValueError):
+            self.registry.counter('cache_hits', 'Cache hits', lambda: 2)
+
+    def test_snapshots_of_workers_are_combined(self):
+        """Test that histograms and sum gauges add up and max gauges take the maximum."""
+        self.histogram.observe(0.05)
+        other_worker = {
+            'histograms': {'merge_seconds': {'buckets': [0.1, 1.0], 'counts': [0, 2, 1], 'sum': 7.0}},
+            'counters': {'cache_hits_total': 5.0},
+            'gauges': {'store_entries': 4.0, 'lag_seconds': 2.0}
+        }
+        # PID 1 always exists, so its gauges count as those of a live worker
+        self._write_worker_snapshot(1, other_worker)
+
+        collected = self.registry.collect()
+        histogram = collected['histograms']['merge_seconds']
+        self.assertEqual(histogram['counts'], [1, 2, 1])
+        self.assertAlmostEqual(histogram['sum'], 7.05)
+        self.assertEqual(collected['gauges']['store_entries'], 7.0)
+        self.assertEqual(collected['gauges']['lag_seconds'], 2.0)
+        self.assertEqual(collected['counters']['cache_hits_total'], 7.0)
+        # The scrape also wrote this process's own snapshot
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, f'metrics-{os.getppid()}-{os.getpid()}.json')))
+
+    def test_exited_workers_are_dropped(self):
+        """Test that a dead worker's snapshot neither counts nor survives the scrape."""
+        dead_pid = 2 ** 22 + 7
+        self._write_worker_snapshot(dead_pid, {
+            'histograms': {'merge_seconds': {'buckets': [0.1, 1.0], 'counts': [5, 0, 0], 'sum': 0.25}},
+            'counters': {'cache_hits_total': 40.0},
+            'gauges': {'store_entries': 100.0}
+        })
+
+        collected = self.registry.collect()
+        self.assertEqual(collected['histograms']['merge_seconds']['counts'], [0, 0, 0])
+        self.assertEqual(collected['counters']['cache_hits_total'], 2.0)
+        self.assertEqual(collected['gauges']['store_entries'], 3.0)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, f'metrics-{os.getppid()}-{dead_pid}.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Unit tests for the page selection utilities.
+
+This module verifies page-range parsing, merge spec validation and page lookup
+in nested page trees without flattening them.
+"""
+import unittest
+import io
+from pypdf import PdfReader
+
+from pdfMergerWebsite.backend.utils.page_spec import (PageSpecError, parse_page_ranges, parse_merge_spec,
+                                                      count_pages, get_page_lazily)
+from pdfMergerWebsite.backend.utils.pdf_inspect import inspect_pdf
+from pdfMergerWebsite.backend.utils.pdf_merger import merge_documents
+
+
+def _nested_tree_pdf():
+    """
+    Build a PDF whose five pages sit in two intermediate /Pages nodes.
+
+    The first node sets the /MediaBox its pages inherit; page N draws the
+    number N so that pages can be told apart.
+    """
+    objects = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 5 >>',
+        3: b'<< /Type /Pages /Parent 2 0 R /Kids [5 0 R 6 0 R] /Count 2 /MediaBox [0 0 100 100] >>',
+        4: b'<< /Type /Pages /Parent 2 0 R /Kids [7 0 R 8 0 R 9 0 R] /Count 3 /MediaBox [0 0 300 300] >>',
+    }
+    for page_number in range(1, 6):
+        page_id, content_id = 4 + page_number, 9 + page_number
+        parent = 3 if page_number <= 2 else 4
+        objects[page_id] = f'<< /Type /Page /Parent {parent} 0 R /Contents {content_id} 0 R >>'.encode()
+        content = f'% page {page_number}'.encode()
+        objects[content_id] = b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content)
+
+    output = io.BytesIO()
+    output.write(b'%PDF-1.7\n')
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = output.tell()
+        output.write(b'%d 0 obj\n%s\nendobj\n' % (object_id, objects[object_id]))
+    xref_offset = output.tell()
+    output.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for object_id in sorted(objects):
+        output.write(b'%010d 00000 n \n' % offsets[object_id])
+    output.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset))
+    return output.getvalue()
+
+
+class TestPageSpec(unittest.TestCase):
+    """Test cases for page ranges, merge specs and lazy page lookup."""
+
+    def test_parse_page_ranges(self):
+        """Test single pages, ranges, open ends, negative numbers and descending ranges."""
+        self.assertEqual(parse_page_ranges('1-3,10,-1', 12), [0, 1, 2, 9, 11])
+        self.assertEqual(parse_page_ranges('4-', 6), [3, 4, 5])
+        self.assertEqual(parse_page_ranges('-3--1', 6), [3, 4, 5])
+        self.assertEqual(parse_page_ranges('3-1, 2', 5), [2, 1, 0, 1])
+
+    def test_parse_page_ranges_rejects_bad_input(self):
+        """Test that malformed and out-of-range specifications raise PageSpecError."""
+        for spec in ('0', '7', '1-9', '-8', 'a-b', '1,,2', ''):
+            with self.assertRaises(PageSpecError, msg=spec):
+                parse_page_ranges(spec, 6)
+
+    def test_parse_merge_spec(self):
+        """Test that segments are normalised and unknown files are rejected."""
+        self.assertEqual(parse_merge_spec([{'file': 1, 'pages': '1-3'}, {'file': 0}], 2),
+                         [[1, '1-3'], [0, None]])
+        for spec in ([], [{'file': 2}], [{'file': '0'}], [{'file': 0, 'pages': 3}], [{'file': 0, 'extra': 1}]):
+            with self.assertRaises(PageSpecError, msg=repr(spec)):
+                parse_merge_spec(spec, 2)
+
+    def test_lazy_lookup_in_nested_tree(self):
+        """Test that pages are found through nested nodes and their inherited attributes returned."""
+        reader = PdfReader(io.BytesIO(_nested_tree_pdf()))
+
+        self.assertEqual(count_pages(reader), 5)
+        fourth, fourth_inherited = get_page_lazily(reader, 3)
+        second, second_inherited = get_page_lazily(reader, 1)
+
+        self.assertIn(b'page 4', fourth['/Contents'].get_object().get_data())
+        self.assertEqual([float(value) for value in fourth_inherited['/MediaBox']], [0, 0, 300, 300])
+        self.assertEqual([float(value) for value in second_inherited['/MediaBox']], [0, 0, 100, 100])
+        # The reader's own page dictionary is left as it was in the file
+        self.assertNotIn('/MediaBox', fourth.indirect_reference.get_object())
+        # The page tree was never flattened
+        self.assertIsNone(reader.flattened_pages)
+
+    def test_selected_pages_keep_inherited_attributes(self):
+        """Test that pages selected from a nested tree are merged with the sizes they inherit."""
+        merged = merge_documents([_nested_tree_pdf()], merge_options={'merge_spec': [[0, '4,2']]})
+
+        widths = [float(page.mediabox.width) for page in PdfReader(io.BytesIO(merged['data'])).pages]
+        self.assertEqual(widths, [300, 100])
+
+    def test_inspection_reads_inherited_sizes_only(self):
+        """Test that inspection groups inherited page sizes without flattening the tree."""
+        document = _nested_tree_pdf()
+        info = inspect_pdf(io.BytesIO(document), len(document))
+
+        self.assertTrue(info['valid'])
+        self.assertEqual(info['page_count'], 5)
+        self.assertEqual(info['page_sizes'], [
+            {'first_page': 1, 'count': 2, 'width': 100, 'height': 100},
+            {'first_page': 3, 'count': 3, 'width': 300, 'height': 300}
+        ])
@@ -0,0 +1,66 @@
+"""
+Unit tests for appending to PDFs with incremental updates.
+
+This module verifies that appended pages follow the existing ones in order,
+that the existing bytes are kept, and that both cross-reference formats are
+continued in kind.
+"""
+import unittest
+import io
+
+from pypdf import PdfReader, PdfWriter
+
+from pdfMergerWebsite.backend.utils.pdf_merger import PdfInputError, merge_documents
+from pdfMergerWebsite.backend.utils.pdf_append import append_documents
+
+
+def _make_pdf_bytes(widths):
+    """Build a PDF with one blank page per width."""
+    writer = PdfWriter()
+    for width in widths:
+        writer.add_blank_page(width=width, height=100)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class TestAppendDocuments(unittest.TestCase):
+    """Test cases for append_documents."""
+
+    def _check_appends(self, profile):
+        """Append twice to a merge written with a profile and check the pages."""
+        document = merge_documents([_make_pdf_bytes([100, 101]), _make_pdf_bytes([102])],
+                                   merge_options={'profile': profile})['data']
+        first = append_documents(document, [('a.pdf', _make_pdf_bytes([200, 201]))])
+        self.assertEqual((first['pages_added'], first['page_count']), (2, 5))
+        document += first['update']
+        second = append_documents(document, [('b.pdf', _make_pdf_bytes([300])), ('c.pdf', _make_pdf_bytes([301]))])
+        document += second['update']
+
+        reader = PdfReader(io.BytesIO(document), strict=True)
+        self.assertEqual([float(page.mediabox.width) for page in reader.pages],
+                         [100, 101, 102, 200, 201, 300, 301])
+        return first['update']
+
+    def test_append_with_xref_table(self):
+        """Test that a document with a cross-reference table gets a table section."""
+        update = self._check_appends('fast')
+        self.assertIn(b'\nxref\n', update)
+        self.assertIn(b'/Prev', update)
+
+    def test_append_with_xref_stream(self):
+        """Test that a document with a cross-reference stream gets a stream section."""
+        update = self._check_appends('balanced')
+        self.assertIn(b'/XRef', update)
+        self.assertNotIn(b'\nxref\n', update)
+
+    def test_invalid_documents(self):
+        """Test that a damaged stored document and a damaged input are rejected."""
+        with self.assertRaises(PdfInputError):
+            append_documents(b'not a pdf', [('a.pdf', _make_pdf_bytes([100]))])
+        with self.assertRaises(PdfInputError):
+            append_documents(_make_pdf_bytes([100]), [('bad.pdf', b'not a pdf')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Unit tests for resource deduplication.
+
+This module verifies that resources repeated across merged inputs are stored
+once in the output and that the pages still reference intact copies.
+"""
+import unittest
+import io
+import random
+from pypdf import PdfReader
+
+from pdfMergerWebsite.backend.utils.pdf_merger import merge_pdf_documents
+
+
+def _pdf_with_shared_resources(label):
+    """
+    Build a one-page PDF with an image and an embedded font file.
+
+    The image and font are byte-for-byte the same for every label; only the
+    page content, which draws the label, differs between documents.
+    """
+    image = bytes(random.Random(7).getrandbits(8) for _ in range(20000))
+    font_file = bytes(random.Random(11).getrandbits(8) for _ in range(10000))
+    content = f'BT /F1 12 Tf 10 10 Td ({label}) Tj ET /Im0 Do'.encode()
+    objects = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        3: (b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents 4 0 R '
+            b'/Resources << /XObject << /Im0 5 0 R >> /Font << /F1 6 0 R >> >> >>'),
+        4: b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content),
+        5: (b'<< /Type /XObject /Subtype /Image /Width 100 /Height 200 /ColorSpace /DeviceGray '
+            b'/BitsPerComponent 8 /Length %d >>\nstream\n%s\nendstream' % (len(image), image)),
+        6: b'<< /Type /Font /Subtype /TrueType /BaseFont /Demo /FontDescriptor 7 0 R >>',
+        7: b'<< /Type /FontDescriptor /FontName /Demo /Flags 32 /FontFile2 8 0 R >>',
+        8: b'<< /Length %d >>\nstream\n%s\nendstream' % (len(font_file), font_file),
+    }
+    output = io.BytesIO()
+    output.write(b'%PDF-1.7\n')
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = output.tell()
+        output.write(b'%d 0 obj\n%s\nendobj\n' % (object_id, objects[object_id]))
+    xref_offset = output.tell()
+    output.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for object_id in sorted(objects):
+        output.write(b'%010d 00000 n \n' % offsets[object_id])
+    output.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset))
+    return output.getvalue()
+
+
+class TestPdfDedupe(unittest.TestCase):
+    """Test cases for cross-input resource deduplication."""
+
+    def test_shared_resources_are_stored_once(self):
+        """Test that identical images and fonts from different inputs are merged."""
+        documents = [(f'doc{index}.pdf', _pdf_with_shared_resources(f'page {index}')) for index in range(3)]
+
+        plain = merge_pdf_documents(documents)
+        deduplicated = merge_pdf_documents(documents, {'dedupe': True})
+
+        # Two of the three image and font file copies disappear
+        self.assertLess(len(deduplicated), len(plain) - 2 * 29000)
+        pages = PdfReader(io.BytesIO(deduplicated)).pages
+        self.assertEqual(len(pages), 3)
+        images = [page['/Resources']['/XObject'].raw_get('/Im0') for page in pages]
+        fonts = [page['/Resources']['/Font'].raw_get('/F1') for page in pages]
+        self.assertEqual(len({image.idnum for image in images}), 1)
+        self.assertEqual(len({font.idnum for font in fonts}), 1)
+        # Pages keep their own content
+        self.assertIn(b'page 2', pages[2]['/Contents'].get_object().get_data())
+        self.assertEqual(len(images[0].get_object().get_data()), 20000)
@@ -5,13 +5,27 @@ This module contains tests that verify the functionality of the merge_pdfs funct
 including successful merges, custom filenames, and error handling.
 """
 import unittest
+import io
 import os
 import tempfile
 import shutil
 from pypdf import PdfReader, PdfWriter
 
 # Import the merge_pdfs function
-from pdfMergerWebsite.backend.utils.pdf_merger import merge_pdfs
+from pdfMergerWebsite.backend.utils.pdf_merger import (
+    PdfInputError, configure_document_cache, document_cache, merge_documents, merge_pdfs
+)
+
+
+class _WriteOnlyStream:
+    """Socket-like sink that can neither tell nor seek."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
 
 
 class TestPDFMerger(unittest.TestCase):
@@ -98,6 +112,7 @@ class TestPDFMerger(unittest.TestCase):
         self.assertIsNone(result['error'])
         self.assertTrue(os.path.exists(result['path']))
         self.assertTrue(os.path.getsize(result['path']) > 0, "Merged PDF file is empty")
+        self.assertEqual(result['pages'], len(pdf1.pages) + len(pdf2.pages))
 
     def test_merge_pdfs_with_custom_filename(self):
         """Test merging PDFs with a custom filename."""
@@ -132,3 +147,85 @@ class TestPDFMerger(unittest.TestCase):
 
         self.assertFalse(result['success'])
         self.assertIsNotNone(result['error'])
+
+    def test_merge_pdfs_with_merge_spec(self):
+        """Test that a merge spec selects and reorders pages across files."""
+        three_pages = os.path.join(self.test_dir, 'three.pdf')
+        writer = PdfWriter()
+        for width in (101, 102, 103):
+            writer.add_blank_page(width=width, height=200)
+        with open(three_pages, 'wb') as outfile:
+            writer.write(outfile)
+        output_path = os.path.join(self.test_dir, 'merged.pdf')
+
+        result = merge_pdfs([self.test_file1, three_pages], output_path,
+                            merge_spec=[{'file': 1, 'pages': '-1,1'}, {'file': 0}])
+
+        self.assertTrue(result['success'], result['error'])
+        widths = [float(page.mediabox.width) for page in PdfReader(output_path).pages]
+        self.assertEqual(widths, [103, 101, 200])
+
+        invalid = merge_pdfs([self.test_file1, three_pages], output_path,
+                             merge_spec=[{'file': 1, 'pages': '4'}])
+        self.assertFalse(invalid['success'])
+        self.assertIn('Page 4', invalid['error'])
+
+    def test_merge_documents_sources_and_sinks(self):
+        """Test that paths, bytes, open files and named pairs merge into every kind of sink."""
+        with open(self.test_file2, 'rb') as file2:
+            data = file2.read()
+        with open(self.test_file1, 'rb') as file1:
+            sources = [self.test_file1, data, ('third.pdf', file1), ('fourth.pdf', io.BytesIO(data))]
+            returned = merge_documents(sources)
+            self.assertEqual(returned['pages'], 4)
+            self.assertEqual(returned['size_bytes'], len(returned['data']))
+
+            stream = _WriteOnlyStream()
+            written = merge_documents(sources, stream)
+            self.assertEqual(b''.join(stream.chunks), returned['data'])
+            self.assertEqual(written, {'pages': 4, 'size_bytes': len(returned['data'])})
+
+            output_path = os.path.join(self.test_dir, 'engine.pdf')
+            self.assertEqual(merge_documents(sources, output_path)['size_bytes'], os.path.getsize(output_path))
+            self.assertEqual(len(PdfReader(output_path).pages), 4)
+
+            stored = {}
+            merge_documents(sources, lambda merged: stored.update(merged=merged))
+            self.assertEqual(stored['merged'], returned['data'])
+
+        with self.assertRaises(PdfInputError) as context:
+            merge_documents([self.test_file1, ('broken.pdf', b'not a pdf')])
+        self.assertIn('broken.pdf', context.exception.message)
+
+    def test_merge_pdfs_empty_file(self):
+        """Test that an empty input is reported by name."""
+        empty_file = os.path.join(self.test_dir, 'empty.pdf')
+        open(empty_file, 'wb').close()
+        result = merge_pdfs([self.test_file1, empty_file], os.path.join(self.test_dir, 'merged.pdf'))
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], 'File is empty: empty.pdf')
+
+    def test_document_cache_reuses_parsed_inputs(self):
+        """Test that inputs given with a digest are parsed once and merge the same as fresh ones."""
+        configure_document_cache(1024 * 1024)
+        self.addCleanup(configure_document_cache, 0)
+        with open(self.test_file2, 'rb') as file2:
+            data = file2.read()
+        sources = [('cover.pdf', self.test_file1, 'cover-digest'), ('body.pdf', data, 'body-digest'),
+                   ('cover.pdf', self.test_file1, 'cover-digest')]
+
+        first = merge_documents(sources)
+        self.assertEqual((first['cache_hits'], first['cache_misses']), (0, 2))
+        self.assertEqual(len(document_cache), 2)
+
+        # A cached input skips parsing, even once its file is gone
+        os.remove(self.test_file1)
+        second = merge_documents(sources)
+        self.assertEqual((second['cache_hits'], second['cache_misses']), (2, 0))
+        self.assertEqual(second['data'], first['data'])
+        self.assertEqual(document_cache.stats()['hits'], 2)
+
+        configure_document_cache(0)
+        self.assertEqual(len(document_cache), 0)
+        disabled = merge_documents([('body.pdf', data, 'body-digest'), data])
+        self.assertEqual(disabled, {'pages': 2, 'size_bytes': len(disabled['data']), 'data': disabled['data']})
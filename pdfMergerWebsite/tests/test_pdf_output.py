@@ -0,0 +1,127 @@
+"""
+Unit tests for output profiles.
+
+This module verifies that the balanced and smallest profiles produce smaller,
+still readable documents with object and cross-reference streams.
+"""
+import unittest
+import io
+from pypdf import PdfReader
+
+from pdfMergerWebsite.backend.utils.pdf_merger import PdfInputError, merge_pdf_documents
+from pdfMergerWebsite.backend.utils.pdf_output import (
+    OutputProfileError, resolve_output_profile, compress_streams, write_with_object_streams
+)
+
+
+def _pdf_with_text_pages(label, pages=5):
+    """
+    Build a PDF whose pages carry uncompressed, repetitive content streams.
+
+    Args:
+        label (str): Text drawn on every page
+        pages (int): Number of pages
+
+    Returns:
+        bytes: The PDF document
+    """
+    objects = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % (4 + 2 * page) for page in range(pages)), pages),
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    }
+    for page in range(pages):
+        lines = b'\n'.join(b'BT /F1 10 Tf 20 %d Td (%s line %d) Tj ET' % (20 + 12 * line, label.encode(), line)
+                           for line in range(60))
+        objects[4 + 2 * page] = (b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R '
+                                 b'/Resources << /Font << /F1 3 0 R >> >> >>' % (5 + 2 * page))
+        objects[5 + 2 * page] = b'<< /Length %d >>\nstream\n%s\nendstream' % (len(lines), lines)
+    output = io.BytesIO()
+    output.write(b'%PDF-1.4\n')
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = output.tell()
+        output.write(b'%d 0 obj\n%s\nendobj\n' % (object_id, objects[object_id]))
+    xref_offset = output.tell()
+    output.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for object_id in sorted(objects):
+        output.write(b'%010d 00000 n \n' % offsets[object_id])
+    output.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset))
+    return output.getvalue()
+
+
+class TestPdfOutput(unittest.TestCase):
+    """Test cases for output profiles, stream compression and object streams."""
+
+    def setUp(self):
+        """Set up test inputs."""
+        self.documents = [(f'doc{index}.pdf', _pdf_with_text_pages(f'document {index}')) for index in range(3)]
+
+    def _assert_readable(self, pdf_bytes, pages=15):
+        """Check that a merged document parses and keeps its page content."""
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        self.assertEqual(len(reader.pages), pages)
+        self.assertIn(b'document 2 line 59', reader.pages[-1]['/Contents'].get_object().get_data())
+        return reader
+
+    def test_profiles_shrink_output(self):
+        """Test that balanced and smallest output is smaller than fast output."""
+        fast = merge_pdf_documents(self.documents, {'profile': 'fast'})
+        balanced = merge_pdf_documents(self.documents, {'profile': 'balanced'})
+        smallest = merge_pdf_documents(self.documents, {'profile': 'smallest'})
+
+        self.assertEqual(fast, merge_pdf_documents(self.documents))
+        self.assertLess(len(balanced), len(fast) // 3)
+        self.assertLessEqual(len(smallest), len(balanced))
+        for pdf_bytes in (fast, balanced, smallest):
+            self._assert_readable(pdf_bytes)
+
+    def test_object_and_xref_streams(self):
+        """Test that balanced output packs objects into object streams."""
+        balanced = merge_pdf_documents(self.documents, {'profile': 'balanced'})
+
+        self.assertTrue(balanced.startswith(b'%PDF-1.5'))
+        self.assertIn(b'/ObjStm', balanced)
+        self.assertIn(b'/XRef', balanced)
+        self.assertNotIn(b'\nxref\n', balanced)
+        reader = self._assert_readable(balanced)
+        self.assertEqual(reader.trailer['/Root']['/Type'], '/Catalog')
+
+    def test_compression_level_override(self):
+        """Test that a compression level overrides the profile and is validated."""
+        self.assertEqual(resolve_output_profile('balanced', 1)['compression_level'], 1)
+        with self.assertRaises(OutputProfileError):
+            resolve_output_profile('tiny')
+        with self.assertRaises(OutputProfileError):
+            resolve_output_profile('balanced', 12)
+        with self.assertRaises(PdfInputError):
+            merge_pdf_documents(self.documents, {'profile': 'tiny'})
+
+    def test_parallel_compression_matches_serial(self):
+        """Test that threaded compression compresses the same streams as serial compression."""
+        from pypdf import PdfWriter  # pylint: disable=import-outside-toplevel
+        from pdfMergerWebsite.backend.utils import pdf_output  # pylint: disable=import-outside-toplevel
+
+        outputs = []
+        for max_threads in (1, 4):
+            writer = PdfWriter()
+            for _, pdf_bytes in self.documents:
+                writer.append(PdfReader(io.BytesIO(pdf_bytes)))
+            original_threshold = pdf_output.PARALLEL_DEFLATE_MIN_BYTES
+            pdf_output.PARALLEL_DEFLATE_MIN_BYTES = 0
+            try:
+                stats = compress_streams(writer, 6, max_threads=max_threads)
+            finally:
+                pdf_output.PARALLEL_DEFLATE_MIN_BYTES = original_threshold
+            self.assertEqual(stats['streams_compressed'], 15)
+            self.assertLess(stats['bytes_after'], stats['bytes_before'])
+            buffer = io.BytesIO()
+            write_with_object_streams(writer, buffer)
+            outputs.append(buffer.getvalue())
+        self.assertEqual(len(outputs[0]), len(outputs[1]))
+        self._assert_readable(outputs[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Unit tests for the PDF persistence utilities.
+
+This module verifies the segmented on-disk store and the write-behind persister,
+including record supersession, expiry handling, compaction and coalesced flushing.
+"""
+import unittest
+import os
+import io
+import time
+import tempfile
+import shutil
+
+from pdfMergerWebsite.backend.utils.pdf_persistence import SegmentedPdfStore, PdfPersister
+
+
+class TestPdfPersistence(unittest.TestCase):
+    """Test cases for the segmented PDF store and persister."""
+
+    def setUp(self):
+        """Create a temporary directory for the store."""
+        self.test_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.test_dir, 'pdf_store')
+        self.disk_store = SegmentedPdfStore(self.store_dir)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_dir)
+
+    def _entry(self, data, expires_in=60):
+        """Build a memory store entry holding the given bytes."""
+        return {
+            'data': io.BytesIO(data),
+            'filename': 'merged.pdf',
+            'expiration': time.time() + expires_in,
+            'created_at': time.time()
+        }
+
+    def test_round_trip_without_base64(self):
+        """Test that PDF bytes are stored verbatim and read back intact."""
+        payload = b'%PDF-1.7\n' + bytes(range(256)) * 64
+        self.disk_store.append({'abc123': self._entry(payload)})
+
+        record = self.disk_store.get('abc123')
+        self.assertEqual(record['data'], payload)
+        self.assertEqual(record['filename'], 'merged.pdf')
+        # Header and ID overhead only, no base64 inflation
+        self.assertLess(self.disk_store.stats()['segment_bytes'], len(payload) + 128)
+
+    def test_newer_records_supersede_and_expired_are_skipped(self):
+        """Test that the latest record wins and expired records are ignored."""
+        self.disk_store.append({'same': self._entry(b'%PDF-old')})
+        self.disk_store.append({'same': self._entry(b'%PDF-new'), 'gone': self._entry(b'%PDF-x', -5)})
+
+        self.assertEqual(self.disk_store.get('same')['data'], b'%PDF-new')
+        self.assertIsNone(self.disk_store.get('gone'))
+        self.assertEqual(sorted(self.disk_store.load_all()), ['same'])
+
+    def test_other_instances_see_new_records(self):
+        """Test that a second store on the same directory picks up the index tail."""
+        reader = SegmentedPdfStore(self.store_dir)
+        self.assertIsNone(reader.get('later'))
+
+        self.disk_store.append({'later': self._entry(b'%PDF-later')})
+        self.assertEqual(reader.get('later')['data'], b'%PDF-later')
+
+    def test_compaction_drops_expired_segments(self):
+        """Test that idle segments holding only expired PDFs are deleted."""
+        store = SegmentedPdfStore(self.store_dir, segment_max_bytes=1, seal_after_seconds=0)
+        store.append({'old': self._entry(b'%PDF-old', -5)})
+        store.append({'keep': self._entry(b'%PDF-keep')})
+        store.append({'filler': self._entry(b'%PDF-filler', -5)})
+        self.assertEqual(store.stats()['segments'], 3)
+
+        result = store.compact()
+
+        self.assertEqual(result['segments_removed'], 2)
+        self.assertEqual(store.stats()['index_entries'], 1)
+        self.assertEqual(SegmentedPdfStore(self.store_dir).get('keep')['data'], b'%PDF-keep')
+
+    def test_missing_index_is_rebuilt_from_segments(self):
+        """Test that segments alone are enough to recover the store."""
+        self.disk_store.append({'one': self._entry(b'%PDF-1')})
+        os.remove(os.path.join(self.store_dir, 'index.bin'))
+
+        self.assertEqual(SegmentedPdfStore(self.store_dir).get('one')['data'], b'%PDF-1')
+
+    def test_persister_coalesces_and_flushes_on_stop(self):
+        """Test that repeated changes to one ID are written once."""
+        persister = PdfPersister(self.disk_store, debounce_seconds=60)
+        persister.start()
+        persister.mark_dirty('one', self._entry(b'%PDF-1'))
+        persister.mark_dirty('one', self._entry(b'%PDF-2'))
+        persister.mark_dirty('two', self._entry(b'%PDF-3'))
+        self.assertEqual(persister.pending(), 2)
+
+        persister.stop()
+
+        self.assertEqual(persister.pending(), 0)
+        self.assertEqual(persister.stats['records_written'], 2)
+        self.assertEqual(self.disk_store.get('one')['data'], b'%PDF-2')
@@ -0,0 +1,76 @@
+"""
+Unit tests for request profiling.
+
+This module verifies request sampling and that stored profiles combine the
+statistics of the handler and its pool tasks and are pruned to a maximum.
+"""
+import unittest
+import os
+import cProfile
+import tempfile
+import shutil
+
+from pdfMergerWebsite.backend.utils.profiling import RequestSampler, ProfileStore, profiled_call
+
+
+def _busy_task(count, progress=None):
+    """Stand-in for a merge task."""
+    return sum(range(count))
+
+
+class TestRequestSampler(unittest.TestCase):
+    """Test cases for RequestSampler."""
+
+    def test_disabled_by_default(self):
+        """Test that nothing is profiled without a token or sample rate."""
+        sampler = RequestSampler()
+        self.assertFalse(sampler.enabled)
+        self.assertFalse(sampler.should_profile('anything'))
+
+    def test_token_and_sampling(self):
+        """Test that the token always selects a request and sampling picks one in N."""
+        sampler = RequestSampler('token', sample_every=3)
+        self.assertTrue(sampler.should_profile('token'))
+        self.assertFalse(sampler.is_authorized('wrong'))
+        picks = [sampler.should_profile(None) for _ in range(9)]
+        self.assertEqual(picks.count(True), 3)
+        self.assertTrue(picks[2])
+
+
+class TestProfileStore(unittest.TestCase):
+    """Test cases for ProfileStore."""
+
+    def setUp(self):
+        """Set up a store in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = ProfileStore(self.temp_dir, max_profiles=2)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_worker_statistics_are_included(self):
+        """Test that statistics marshalled by profiled_call end up in the saved profile."""
+        result, worker_stats = profiled_call(_busy_task, 1000)
+        self.assertEqual(result, sum(range(1000)))
+        profiler = cProfile.Profile()
+        profiler.runcall(sum, range(10))
+
+        profile_id = self.store.save(profiler, [worker_stats], 'test')
+        report = self.store.report(profile_id)
+        self.assertIn(f'Profile {profile_id}', report)
+        self.assertIn('_busy_task', report)
+        self.assertIsNone(self.store.report('0123456789abcdef'))
+        self.assertIsNone(self.store.path('../etc/passwd'))
+
+    def test_old_profiles_are_pruned(self):
+        """Test that only the newest profiles are kept."""
+        for _ in range(4):
+            profiler = cProfile.Profile()
+            profiler.runcall(sum, range(10))
+            self.store.save(profiler)
+        self.assertEqual(len(os.listdir(self.temp_dir)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,18 @@ import tempfile
 import shutil
 import sys
 import json
-from server import app
+import time
+import hashlib
+import gzip
+import re
+import threading
+from unittest import mock
+from pypdf import PdfReader, PdfWriter
+import server
+from server import app, limiter, merge_result_cache
+from backend.utils.merge_pool import MergePool
+from backend.utils.admission import AdmissionController
+from backend.utils.profiling import RequestSampler, ProfileStore
 
 # Add the parent directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -28,6 +39,8 @@ class TestServerEndpoints(unittest.TestCase):
         app.config['TESTING'] = True
         app.config['DEBUG'] = False
         self.app = app.test_client()
+        # Merge tests upload more often than the per-minute limit allows
+        limiter.enabled = False
         # Create temporary test directory
         self.test_dir = tempfile.mkdtemp()
         # Create test PDF file
@@ -40,12 +53,63 @@ class TestServerEndpoints(unittest.TestCase):
         """Clean up resources after each test method."""
         # Clean up test directory
         shutil.rmtree(self.test_dir)
+        limiter.enabled = True
+
+    def _make_pdf_bytes(self, pages=1):
+        """
+        Build a valid PDF document in memory.
+
+        Args:
+            pages (int): Number of blank pages to add
+
+        Returns:
+            bytes: The PDF document
+        """
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=200, height=200)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+
+    def _upload(self, *documents, query='', merge_spec=None, **form):
+        """Post the given PDF documents, and any extra form fields, to the upload endpoint."""
+        data = {
+            'files': [(io.BytesIO(doc), f'doc{index}.pdf') for index, doc in enumerate(documents)],
+            'output_filename': 'test_output',
+            **form
+        }
+        if merge_spec is not None:
+            data['merge_spec'] = json.dumps(merge_spec)
+        return self.app.post('/upload' + query, content_type='multipart/form-data', data=data)
 
     def test_index_route(self):
         """Test that the index route returns the main page."""
         response = self.app.get('/')
         self.assertEqual(response.status_code, 200)
 
+    def test_frontend_served_precompressed(self):
+        """Test that the landing page comes gzipped from memory and references immutable hashed assets."""
+        response = self.app.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        page = gzip.decompress(response.data).decode('utf-8')
+        stylesheet = re.search(r'href="(css/styles\.[0-9a-f]+\.css)"', page).group(1)
+
+        revalidated = self.app.get('/', headers={'Accept-Encoding': 'gzip',
+                                                 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.data, b'')
+
+        hashed = self.app.get('/' + stylesheet)
+        self.assertEqual(hashed.status_code, 200)
+        self.assertIn('immutable', hashed.headers['Cache-Control'])
+        self.assertNotIn('Content-Encoding', hashed.headers)
+        self.assertEqual(hashed.data, self.app.get('/css/styles.css').data)
+        self.assertEqual(self.app.get('/js/missing.js').status_code, 404)
+
     def test_upload_no_files(self):
         """Test that upload endpoint handles missing files correctly."""
         response = self.app.post('/upload', data={})
@@ -83,3 +147,411 @@ class TestServerEndpoints(unittest.TestCase):
         """Test downloading a non-existent file returns a 404 error."""
         response = self.app.get('/download/nonexistent_file')
         self.assertEqual(response.status_code, 404)
+
+    def test_repeat_merge_served_from_cache(self):
+        """Test that merging identical inputs twice reuses the cached output."""
+        merge_result_cache.clear()
+        first_doc = self._make_pdf_bytes(1)
+        second_doc = self._make_pdf_bytes(2)
+        hits_before = merge_result_cache.stats()['hits']
+
+        first = self._upload(first_doc, second_doc)
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(json.loads(first.data)['cached'])
+
+        second = self._upload(first_doc, second_doc)
+        self.assertEqual(second.status_code, 200)
+        second_data = json.loads(second.data)
+        self.assertTrue(second_data['cached'])
+        self.assertEqual(merge_result_cache.stats()['hits'], hits_before + 1)
+
+        # Reordering the inputs is a different merge
+        third = self._upload(second_doc, first_doc)
+        self.assertFalse(json.loads(third.data)['cached'])
+
+        download = self.app.get(second_data['download_link'])
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(download.data.startswith(b'%PDF-'))
+
+    def test_repeated_inputs_skip_parsing(self):
+        """Test that an input shared by two different merges is parsed once and reported in /health."""
+        original_pool = server.merge_pool
+        server.merge_pool = MergePool(max_workers=0, initializer=server.configure_document_cache,
+                                      initargs=(1024 * 1024,))
+        merge_result_cache.clear()
+        before = dict(server.document_cache_stats)
+        try:
+            cover = self._make_pdf_bytes(1)
+            first = self._upload(cover, self._make_pdf_bytes(2))
+            second = self._upload(cover, self._make_pdf_bytes(3))
+        finally:
+            server.merge_pool = original_pool
+            server.configure_document_cache(0)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+
+        report = json.loads(self.app.get('/health').data)['pdf_store']['document_cache']
+        self.assertEqual(report['hits'] - before['hits'], 1)
+        self.assertEqual(report['misses'] - before['misses'], 3)
+
+    def test_upload_spooled_to_disk(self):
+        """Test that uploads larger than the spool threshold still merge."""
+        original_threshold = server.UPLOAD_SPOOL_MAX_MEMORY
+        server.UPLOAD_SPOOL_MAX_MEMORY = 64
+        try:
+            response = self._upload(self._make_pdf_bytes(3), self._make_pdf_bytes(4))
+        finally:
+            server.UPLOAD_SPOOL_MAX_MEMORY = original_threshold
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('download_link', json.loads(response.data))
+
+    def test_spooled_upload_passed_to_pool_by_path(self):
+        """Test that an upload rolled over to disk reaches merge processes as a path, a small one as bytes."""
+        document = self._make_pdf_bytes(2)
+        with server.NamedSpooledTemporaryFile(max_size=len(document) // 2, mode='w+b') as spooled:
+            spooled.write(document)
+            path = server.pool_document(spooled)
+            self.assertIsInstance(path, str)
+            with open(path, 'rb') as on_disk:
+                self.assertEqual(on_disk.read(), document)
+        self.assertFalse(os.path.exists(path))
+
+        with server.NamedSpooledTemporaryFile(max_size=len(document) * 2, mode='w+b') as spooled:
+            spooled.write(document)
+            self.assertEqual(server.pool_document(spooled), document)
+
+    def test_async_merge_job(self):
+        """Test that an asynchronous upload can be polled until its download is ready."""
+        merge_result_cache.clear()
+        response = self._upload(self._make_pdf_bytes(2), self._make_pdf_bytes(3), query='?async=1')
+        self.assertEqual(response.status_code, 202)
+        status_url = json.loads(response.data)['status_url']
+
+        deadline = time.time() + 10
+        status = json.loads(self.app.get(status_url).data)
+        while status['status'] in ('queued', 'running') and time.time() < deadline:
+            time.sleep(0.05)
+            status = json.loads(self.app.get(status_url).data)
+
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['progress']['pages_done'], 5)
+        self.assertEqual(status['progress']['pages_total'], 5)
+        download = self.app.get(status['download_link'])
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(download.data.startswith(b'%PDF-'))
+
+    def test_unknown_job_returns_404(self):
+        """Test that polling an unknown job ID returns a 404 error."""
+        response = self.app.get('/jobs/unknown')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', json.loads(response.data))
+
+    def test_upload_rejected_when_merge_pool_full(self):
+        """Test that uploads get 429 with Retry-After while the merge pool is full."""
+        merge_result_cache.clear()
+        original_pool = server.merge_pool
+        server.merge_pool = MergePool(max_workers=0, max_queued=0)
+        started, release = threading.Event(), threading.Event()
+
+        def hold_slot(progress):
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=server.merge_pool.run, args=(hold_slot,))
+        worker.start()
+        started.wait(5)
+        try:
+            response = self._upload(self._make_pdf_bytes(1), self._make_pdf_bytes(2))
+        finally:
+            release.set()
+            worker.join()
+            server.merge_pool = original_pool
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+    def test_merges_admitted_by_cost(self):
+        """Test that a client out of CPU budget gets 429 while another client is still admitted."""
+        merge_result_cache.clear()
+        original_admission = server.merge_admission
+        # Every merge request costs at least 0.2 CPU seconds of a 0.3 second bucket that barely refills
+        server.merge_admission = AdmissionController(client_rate=1e-6, client_burst=0.3, max_inflight=0,
+                                                     overhead_seconds=0.2)
+        try:
+            documents = (self._make_pdf_bytes(1), self._make_pdf_bytes(2))
+            first = self._upload(*documents)
+            second = self._upload(*documents)
+            other_client = self.app.post('/upload', content_type='multipart/form-data',
+                                         environ_base={'REMOTE_ADDR': '10.0.0.2'},
+                                         data={'files': [(io.BytesIO(doc), f'doc{index}.pdf')
+                                                         for index, doc in enumerate(documents)]})
+            snapshot = server.merge_admission.snapshot()
+        finally:
+            server.merge_admission = original_admission
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertGreaterEqual(int(second.headers['Retry-After']), 1)
+        self.assertEqual(other_client.status_code, 200)
+        self.assertEqual((snapshot['admitted'], snapshot['rejected_client']), (2, 1))
+
+    def test_streamed_merge_is_stored_and_cached(self):
+        """Test that a streamed merge arrives in chunks and can be kept in the store."""
+        merge_result_cache.clear()
+        original_chunk_size = server.MERGE_STREAM_CHUNK_SIZE
+        server.MERGE_STREAM_CHUNK_SIZE = 256
+        try:
+            response = self._upload(self._make_pdf_bytes(3), self._make_pdf_bytes(2), query='/stream?store=1')
+            chunks = list(response.response)
+            response.close()
+        finally:
+            server.MERGE_STREAM_CHUNK_SIZE = original_chunk_size
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(chunks), 1)
+        streamed = b''.join(chunks)
+        self.assertTrue(streamed.startswith(b'%PDF-'))
+        download = self.app.get(response.headers['X-Download-Link'])
+        self.assertEqual(download.data, streamed)
+
+        repeat = self._upload(self._make_pdf_bytes(3), self._make_pdf_bytes(2), query='/stream')
+        self.assertEqual(repeat.get_data(), streamed)
+
+    def test_streamed_merge_rejects_invalid_pdf(self):
+        """Test that an unreadable input is reported before streaming starts."""
+        response = self._upload(b'not a pdf', self._make_pdf_bytes(1), query='/stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', json.loads(response.data))
+
+    def _stored_pdf(self):
+        """Merge two documents and return the download link and the stored bytes."""
+        response = self._upload(self._make_pdf_bytes(2), self._make_pdf_bytes(1))
+        download_link = json.loads(response.data)['download_link']
+        return download_link, self.app.get(download_link).data
+
+    def test_download_single_range(self):
+        """Test that a byte range is answered with 206 and the matching slice."""
+        download_link, content = self._stored_pdf()
+
+        response = self.app.get(download_link, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, content[10:20])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 10-19/{len(content)}')
+
+        suffix = self.app.get(download_link, headers={'Range': 'bytes=-5'})
+        self.assertEqual(suffix.data, content[-5:])
+
+        beyond = self.app.get(download_link, headers={'Range': f'bytes={len(content)}-'})
+        self.assertEqual(beyond.status_code, 416)
+
+    def test_download_multiple_ranges(self):
+        """Test that several ranges are answered with a multipart/byteranges body."""
+        download_link, content = self._stored_pdf()
+
+        response = self.app.get(download_link, headers={'Range': 'bytes=0-4,20-29'})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.content_type.startswith('multipart/byteranges; boundary='))
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertIn(b'Content-Range: bytes 0-4/' + str(len(content)).encode() + b'\r\n\r\n' + content[0:5],
+                      response.data)
+        self.assertIn(b'Content-Range: bytes 20-29/' + str(len(content)).encode() + b'\r\n\r\n' + content[20:30],
+                      response.data)
+
+    def test_download_conditional_requests(self):
+        """Test ETag revalidation and If-Range handling."""
+        download_link, content = self._stored_pdf()
+        etag = self.app.get(download_link).headers['ETag']
+
+        not_modified = self.app.get(download_link, headers={'If-None-Match': etag})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.data, b'')
+
+        resumed = self.app.get(download_link, headers={'Range': 'bytes=5-', 'If-Range': etag})
+        self.assertEqual(resumed.status_code, 206)
+        self.assertEqual(resumed.data, content[5:])
+
+        changed = self.app.get(download_link, headers={'Range': 'bytes=5-', 'If-Range': '"other"'})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data, content)
+
+    def test_upload_with_merge_spec(self):
+        """Test that a merge spec picks pages and that bad specs are rejected."""
+        merge_result_cache.clear()
+        merge_spec = [{'file': 1, 'pages': '2-3'}, {'file': 0, 'pages': '-1'}]
+        response = self._upload(self._make_pdf_bytes(2), self._make_pdf_bytes(4), merge_spec=merge_spec)
+        self.assertEqual(response.status_code, 200)
+        merged = self.app.get(json.loads(response.data)['download_link']).data
+        self.assertEqual(len(PdfReader(io.BytesIO(merged)).pages), 3)
+
+        # Without the spec the same inputs are a different merge
+        plain = self._upload(self._make_pdf_bytes(2), self._make_pdf_bytes(4))
+        self.assertFalse(json.loads(plain.data)['cached'])
+
+        for bad_spec in ([{'file': 5}], [{'file': 0, 'pages': '9'}]):
+            rejected = self._upload(self._make_pdf_bytes(2), self._make_pdf_bytes(4), merge_spec=bad_spec)
+            self.assertEqual(rejected.status_code, 400)
+            self.assertIn('error', json.loads(rejected.data))
+
+    def test_upload_with_output_profile(self):
+        """Test that the output profile is applied and reported with size and time."""
+        merge_result_cache.clear()
+        response = self._upload(self._make_pdf_bytes(3), self._make_pdf_bytes(2), profile='smallest')
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.data)
+        self.assertEqual(result['profile'], 'smallest')
+        self.assertGreaterEqual(result['merge_seconds'], 0)
+        merged = self.app.get(result['download_link']).data
+        self.assertEqual(result['size_bytes'], len(merged))
+        self.assertIn(b'/ObjStm', merged)
+        self.assertEqual(len(PdfReader(io.BytesIO(merged)).pages), 5)
+
+        for form in ({'profile': 'tiny'}, {'profile': 'balanced', 'compression_level': '12'}):
+            rejected = self._upload(self._make_pdf_bytes(1), self._make_pdf_bytes(1), **form)
+            self.assertEqual(rejected.status_code, 400)
+
+    def test_append_to_stored_pdf(self):
+        """Test that appending keeps the stored bytes and adds the new pages after them."""
+        merge_result_cache.clear()
+        result = json.loads(self._upload(self._make_pdf_bytes(2), self._make_pdf_bytes(1)).data)
+        original = self.app.get(result['download_link']).data
+        pdf_id = result['download_link'].rsplit('/', 1)[1]
+
+        response = self.app.post(f'/append/{pdf_id}', content_type='multipart/form-data',
+                                 data={'files': [(io.BytesIO(self._make_pdf_bytes(3)), 'more.pdf')]})
+        self.assertEqual(response.status_code, 200)
+        appended = json.loads(response.data)
+        self.assertEqual((appended['pages_added'], appended['page_count']), (3, 6))
+
+        updated = self.app.get(result['download_link']).data
+        self.assertTrue(updated.startswith(original))
+        self.assertEqual(len(updated), appended['size_bytes'])
+        self.assertEqual(len(PdfReader(io.BytesIO(updated)).pages), 6)
+
+        # Another worker appended in between: the store refuses the stale replace
+        with mock.patch.object(server.pdf_memory_store, 'replace_if_size', return_value=False):
+            raced = self.app.post(f'/append/{pdf_id}', content_type='multipart/form-data',
+                                  data={'files': [(io.BytesIO(self._make_pdf_bytes(1)), 'more.pdf')]})
+        self.assertEqual(raced.status_code, 409)
+        self.assertEqual(self.app.get(result['download_link']).data, updated)
+
+        missing = self.app.post('/append/00000000', content_type='multipart/form-data',
+                                data={'files': [(io.BytesIO(self._make_pdf_bytes(1)), 'more.pdf')]})
+        self.assertEqual(missing.status_code, 404)
+        no_files = self.app.post(f'/append/{pdf_id}', content_type='multipart/form-data', data={})
+        self.assertEqual(no_files.status_code, 400)
+
+    def test_chunked_upload_merge(self):
+        """Test a chunked upload from session to merge, including a rejected chunk and a resume."""
+        document = self._make_pdf_bytes(3)
+        chunk_size = 256
+        created = self.app.post('/uploads', json={'filename': 'scan.pdf', 'size': len(document),
+                                                  'chunk_size': chunk_size})
+        self.assertEqual(created.status_code, 201)
+        upload = json.loads(created.data)
+        chunk_url = f"/uploads/{upload['upload_id']}/chunks/"
+        chunks = [document[start:start + chunk_size] for start in range(0, len(document), chunk_size)]
+        self.assertEqual(upload['chunk_count'], len(chunks))
+
+        corrupted = self.app.put(chunk_url + '0', data=b'x' * len(chunks[0]),
+                                 headers={'X-Chunk-SHA256': hashlib.sha256(chunks[0]).hexdigest()})
+        self.assertEqual(corrupted.status_code, 422)
+        for index, chunk in enumerate(chunks):
+            response = self.app.put(chunk_url + str(index), data=chunk,
+                                    headers={'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest()})
+            self.assertEqual(response.status_code, 200)
+        status = json.loads(self.app.get(upload['status_url']).data)
+        self.assertEqual(status['received_offset'], len(document))
+
+        self.assertEqual(self.app.post(upload['status_url'] + '/complete').status_code, 200)
+        merge_result_cache.clear()
+        response = self.app.post('/upload', content_type='multipart/form-data', data={
+            'files': [(io.BytesIO(self._make_pdf_bytes(1)), 'cover.pdf')],
+            'upload_id': upload['upload_id']
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        merged = self.app.get(json.loads(response.data)['download_link']).data
+        self.assertEqual(len(PdfReader(io.BytesIO(merged)).pages), 4)
+
+        unknown = self.app.post('/upload', content_type='multipart/form-data', data={
+            'files': [(io.BytesIO(self._make_pdf_bytes(1)), 'cover.pdf')],
+            'upload_id': '0' * 32
+        })
+        self.assertEqual(unknown.status_code, 404)
+        self.assertEqual(self.app.delete(upload['status_url']).status_code, 204)
+
+    def test_metrics_endpoint(self):
+        """Test that merges and downloads show up in the Prometheus exposition."""
+        def sample(text, name):
+            line = next(line for line in text.splitlines() if line.startswith(name + ' '))
+            return float(line.split()[1])
+
+        before = self.app.get('/metrics').get_data(as_text=True)
+        merge_result_cache.clear()
+        download_link, content = self._stored_pdf()
+        self.app.get(download_link).close()
+        response = self.app.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE pdfmerger_merge_seconds histogram', text)
+        self.assertIn('pdfmerger_write_seconds_bucket{le="+Inf"}', text)
+        self.assertIn('# TYPE pdfmerger_document_cache_misses_total counter', text)
+        self.assertGreater(sample(text, 'pdfmerger_upload_parse_seconds_count'),
+                           sample(before, 'pdfmerger_upload_parse_seconds_count'))
+        self.assertGreater(sample(text, 'pdfmerger_merge_seconds_count'), sample(before, 'pdfmerger_merge_seconds_count'))
+        self.assertGreaterEqual(sample(text, 'pdfmerger_download_bytes_sum'), len(content))
+        self.assertGreaterEqual(sample(text, 'pdfmerger_store_entries'), 1)
+        self.assertIn('pdfmerger_expiry_lag_seconds', text)
+
+    def test_profiled_upload(self):
+        """Test that an upload with the profiling token is profiled, merge pool process included."""
+        original_sampler, original_store = server.request_sampler, server.profile_store
+        server.request_sampler = RequestSampler('secret-token')
+        server.profile_store = ProfileStore(os.path.join(self.test_dir, 'profiles'))
+        try:
+            merge_result_cache.clear()
+            plain = self._upload(self._make_pdf_bytes(1), self._make_pdf_bytes(1))
+            self.assertNotIn('X-Profile-ID', plain.headers)
+
+            data = {'files': [(io.BytesIO(self._make_pdf_bytes(2)), 'a.pdf'),
+                              (io.BytesIO(self._make_pdf_bytes(1)), 'b.pdf')]}
+            response = self.app.post('/upload', content_type='multipart/form-data', data=data,
+                                     headers={'X-Profile-Token': 'secret-token'})
+            self.assertEqual(response.status_code, 200)
+            profile_id = response.headers['X-Profile-ID']
+
+            self.assertEqual(self.app.get(f'/profiles/{profile_id}').status_code, 403)
+            report = self.app.get(f'/profiles/{profile_id}?sort=tottime',
+                                  headers={'X-Profile-Token': 'secret-token'})
+            self.assertEqual(report.status_code, 200)
+            self.assertIn('write_merged_pdf', report.get_data(as_text=True))
+            raw = self.app.get(f'/profiles/{profile_id}?format=pstats',
+                               headers={'X-Profile-Token': 'secret-token'})
+            self.assertEqual(raw.mimetype, 'application/octet-stream')
+            missing = self.app.get('/profiles/../../etc', headers={'X-Profile-Token': 'secret-token'})
+            self.assertEqual(missing.status_code, 404)
+        finally:
+            server.request_sampler, server.profile_store = original_sampler, original_store
+
+    def test_inspect_reports_pages_and_caches(self):
+        """Test that /inspect describes each file and serves repeats from its cache."""
+        document = self._make_pdf_bytes(3)
+        data = {'files': [(io.BytesIO(document), 'a.pdf'), (io.BytesIO(b'not a pdf'), 'b.pdf')]}
+        response = self.app.post('/inspect', content_type='multipart/form-data', data=data)
+        self.assertEqual(response.status_code, 200)
+        first, second = json.loads(response.data)['files']
+
+        self.assertTrue(first['valid'])
+        self.assertEqual(first['page_count'], 3)
+        self.assertFalse(first['encrypted'])
+        self.assertEqual(first['size_bytes'], len(document))
+        self.assertEqual(first['page_sizes'], [{'first_page': 1, 'count': 3, 'width': 200, 'height': 200}])
+        self.assertFalse(second['valid'])
+        self.assertIn('error', second)
+
+        again = self.app.post('/inspect', content_type='multipart/form-data',
+                              data={'files': [(io.BytesIO(document), 'renamed.pdf')]})
+        repeat = json.loads(again.data)['files'][0]
+        self.assertTrue(repeat['cached'])
+        self.assertEqual(repeat['filename'], 'renamed.pdf')
@@ -0,0 +1,162 @@
+"""
+Unit tests for the shared SQLite PDF store.
+
+This module verifies that the store behaves like the in-memory PDF dictionary
+and that separate store instances on one database file see the same PDFs, job
+records and admission budgets.
+"""
+import unittest
+import os
+import io
+import time
+import tempfile
+import shutil
+import threading
+
+from pdfMergerWebsite.backend.utils.shared_store import SqlitePdfStore, SqliteJobStatusStore, SqliteTokenBucketStore
+from pdfMergerWebsite.backend.utils.admission import AdmissionController, AdmissionDenied
+from pdfMergerWebsite.backend.utils.merge_jobs import MergeJobQueue
+
+
+class TestSqlitePdfStore(unittest.TestCase):
+    """Test cases for the SQLite-backed PDF store."""
+
+    def setUp(self):
+        """Create a temporary database location."""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'pdf_store.sqlite3')
+        self.store = SqlitePdfStore(self.db_path)
+
+    def tearDown(self):
+        """Remove the temporary database."""
+        shutil.rmtree(self.test_dir)
+
+    def _entry(self, data, expires_in=60):
+        """Build a memory store entry holding the given bytes."""
+        return {
+            'data': io.BytesIO(data),
+            'filename': 'merged.pdf',
+            'expiration': time.time() + expires_in,
+            'created_at': time.time()
+        }
+
+    def test_behaves_like_a_dictionary(self):
+        """Test item access, membership, length and deletion."""
+        self.store['abc'] = self._entry(b'%PDF-abc')
+
+        self.assertIn('abc', self.store)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store['abc']['data'].getvalue(), b'%PDF-abc')
+        self.assertEqual(self.store['abc']['size_bytes'], 8)
+        self.assertIsNone(self.store.get('missing'))
+
+        del self.store['abc']
+        self.assertNotIn('abc', self.store)
+        with self.assertRaises(KeyError):
+            del self.store['abc']
+
+    def test_instances_share_the_database(self):
+        """Test that a PDF stored by one instance is visible to another."""
+        other_worker = SqlitePdfStore(self.db_path)
+        self.store['shared'] = self._entry(b'%PDF-shared')
+
+        self.assertEqual(other_worker['shared']['data'].getvalue(), b'%PDF-shared')
+        self.assertEqual(list(other_worker), ['shared'])
+
+    def test_finished_jobs_purged_by_index(self):
+        """Test that only job records past their expires_at are deleted, also when a queue prunes them."""
+        jobs = SqliteJobStatusStore(self.db_path)
+        jobs['running'] = {'status': 'running'}
+        jobs['old'] = {'status': 'done', 'expires_at': 100.0}
+        jobs['new'] = {'status': 'done', 'expires_at': 300.0}
+        self.assertEqual(jobs.purge_expired(current_time=200.0), 1)
+        self.assertEqual(sorted(jobs), ['new', 'running'])
+
+        queue = MergeJobQueue(status_store=jobs, retention_seconds=0)
+        first = queue.submit(lambda report_progress: {})
+        for _ in range(100):
+            if (queue.get(first) or {}).get('status') == 'done':
+                break
+            time.sleep(0.01)
+        time.sleep(0.01)
+        second = queue.submit(lambda report_progress: {})
+        self.assertIsNone(queue.get(first))
+        self.assertIsNotNone(queue.get(second))
+
+    def test_pop_of_row_deleted_by_another_instance(self):
+        """Test that pop returns the entry once and the default after another worker deleted the row."""
+        other_worker = SqlitePdfStore(self.db_path)
+        self.store['doc'] = self._entry(b'%PDF-doc')
+
+        self.assertEqual(other_worker.pop('doc')['data'].getvalue(), b'%PDF-doc')
+        self.assertIsNone(self.store.pop('doc', None))
+        with self.assertRaises(KeyError):
+            self.store.pop('doc')
+
+        jobs, other_jobs = SqliteJobStatusStore(self.db_path), SqliteJobStatusStore(self.db_path)
+        jobs['job1'] = {'status': 'done'}
+        self.assertEqual(other_jobs.pop('job1', None), {'status': 'done'})
+        self.assertEqual(jobs.pop('job1', 'gone'), 'gone')
+
+    def test_replace_if_size_between_instances(self):
+        """Test that of two workers appending to the same version only the first one wins."""
+        other_worker = SqlitePdfStore(self.db_path)
+        self.store['doc'] = self._entry(b'%PDF-doc')
+        seen_by_both = other_worker['doc']['size_bytes']
+
+        self.assertTrue(self.store.replace_if_size('doc', seen_by_both, io.BytesIO(b'%PDF-doc+first')))
+        self.assertFalse(other_worker.replace_if_size('doc', seen_by_both, io.BytesIO(b'%PDF-doc+second')))
+        self.assertEqual(other_worker['doc']['data'].getvalue(), b'%PDF-doc+first')
+        self.assertEqual(other_worker['doc']['size_bytes'], 14)
+        self.assertEqual(other_worker['doc']['filename'], 'merged.pdf')
+        self.assertFalse(other_worker.replace_if_size('missing', 0, io.BytesIO(b'%PDF')))
+
+    def test_purge_expired(self):
+        """Test that only expired PDFs are purged."""
+        self.store['old'] = self._entry(b'%PDF-old', -5)
+        self.store['new'] = self._entry(b'%PDF-new')
+
+        self.assertEqual(self.store.purge_expired(), ['old'])
+        self.assertEqual(list(self.store), ['new'])
+        self.assertEqual(self.store.total_bytes(), 8)
+
+    def test_job_status_shared_between_instances(self):
+        """Test that job status written by one worker can be polled through another."""
+        writer = SqliteJobStatusStore(self.db_path)
+        reader = SqliteJobStatusStore(self.db_path)
+        writer['job1'] = {'status': 'running', 'progress': {'pages_done': 3}}
+
+        self.assertEqual(reader['job1']['progress']['pages_done'], 3)
+        del reader['job1']
+        self.assertIsNone(writer.get('job1'))
+
+    def test_admission_budget_shared_between_workers(self):
+        """Test that a client's CPU budget spent through one worker is gone for another."""
+        def worker_controller():
+            return AdmissionController(client_rate=1e-6, client_burst=1.0, max_inflight=0,
+                                       cpu_seconds_per_page=0.1, overhead_seconds=0,
+                                       bucket_store=SqliteTokenBucketStore(self.db_path))
+        first, second = worker_controller(), worker_controller()
+
+        with first.admit('client', [(0, 6)]) as ticket:
+            ticket.settle(0.6)
+        with self.assertRaises(AdmissionDenied) as denied:
+            second.admit('client', [(0, 6)])
+        self.assertEqual(denied.exception.scope, 'client')
+        self.assertAlmostEqual(second.client_tokens('client'), 0.4, places=3)
+        second.admit('other', [(0, 6)]).release()
+        self.assertEqual(first.snapshot()['clients'], 2)
+
+    def test_bucket_tokens_taken_once(self):
+        """Test that workers taking from one bucket at the same time never overspend it."""
+        results = []
+
+        def take():
+            results.append(SqliteTokenBucketStore(self.db_path).take('client', 1.0, 1e-6, 5.0)[0])
+
+        threads = [threading.Thread(target=take) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 5)
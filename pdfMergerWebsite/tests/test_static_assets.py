@@ -0,0 +1,83 @@
+"""
+Unit tests for the static asset bundle.
+
+This module verifies that pages reference the hashed names of their scripts
+and stylesheets, and that the smallest variant a client accepts is chosen.
+"""
+import unittest
+import os
+import gzip
+import tempfile
+import shutil
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from pdfMergerWebsite.backend.utils.static_assets import StaticAssetBundle, brotli
+
+
+class TestStaticAssetBundle(unittest.TestCase):
+    """Test cases for StaticAssetBundle."""
+
+    def setUp(self):
+        """Set up a small frontend directory."""
+        self.root = tempfile.mkdtemp()
+        self._write('index.html', '<link rel="stylesheet" href="css/site.css">\n'
+                                  '<script src="/js/app.js"></script>\n'
+                                  '<a href="https://example.com/js/app.js">x</a><img src="missing.png">')
+        self._write('css/site.css', 'body { color: black; }\n' * 100)
+        self._write('js/app.js', 'console.log(1);')
+        self._write('css/nested.html', '<link href="site.css">')
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, path, text):
+        """Write a text file below the frontend directory."""
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w', encoding='utf-8') as asset_file:
+            asset_file.write(text)
+
+    def test_pages_reference_hashed_names(self):
+        """Test that local scripts and stylesheets are referenced by hashed name and resolve to the asset."""
+        bundle = StaticAssetBundle(self.root)
+        css, hashed = bundle.get('css/site.css')
+        self.assertFalse(hashed)
+        self.assertRegex(css.hashed_path, r'^css/site\.[0-9a-f]{10}\.css$')
+        self.assertEqual(bundle.get(css.hashed_path), (css, True))
+        app_js = bundle.get('js/app.js')[0]
+
+        page = bundle.get('index.html')[0].variants['identity'].decode()
+        self.assertIn(f'href="{css.hashed_path}"', page)
+        self.assertIn(f'src="/{app_js.hashed_path}"', page)
+        self.assertIn('https://example.com/js/app.js', page)
+        self.assertIn('src="missing.png"', page)
+        nested = bundle.get('css/nested.html')[0].variants['identity'].decode()
+        self.assertIn(f'href="{os.path.basename(css.hashed_path)}"', nested)
+        self.assertEqual(bundle.get('js/app.missing.js'), (None, False))
+
+    def test_negotiates_smallest_accepted_variant(self):
+        """Test that compressed variants are only sent to clients accepting them."""
+        css = StaticAssetBundle(self.root).get('css/site.css')[0]
+        self.assertTrue(css.compressible)
+
+        coding, body, etag = css.negotiate(MIMEAccept())
+        self.assertEqual((coding, etag), ('identity', css.etag))
+        coding, body, etag = css.negotiate(parse_accept_header('gzip;q=0.5, deflate'))
+        self.assertEqual(coding, 'gzip')
+        self.assertEqual(gzip.decompress(body), css.variants['identity'])
+        self.assertEqual(etag, f'{css.etag}-gzip')
+        coding, _, _ = css.negotiate(parse_accept_header('*'))
+        self.assertEqual(coding, 'br' if brotli is not None else 'gzip')
+        self.assertEqual(css.negotiate(parse_accept_header('gzip;q=0'))[0], 'identity')
+
+        # Too small to be worth compressing
+        app_js = StaticAssetBundle(self.root).get('js/app.js')[0]
+        self.assertFalse(app_js.compressible)
+        self.assertIn('javascript', app_js.content_type)
+
+
+if __name__ == '__main__':
+    unittest.main()
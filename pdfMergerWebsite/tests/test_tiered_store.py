@@ -0,0 +1,112 @@
+"""
+Unit tests for the tiered PDF store.
+
+This module verifies that the memory tier stays within its byte budget, that
+least recently used PDFs spill to disk and that reading them promotes them back.
+"""
+import unittest
+import io
+import os
+import tempfile
+import shutil
+import time
+
+from pdfMergerWebsite.backend.utils.tiered_store import TieredPdfStore
+
+
+def _entry(data):
+    """Build a PDF store entry holding ``data``."""
+    return {
+        'data': io.BytesIO(data),
+        'filename': 'merged.pdf',
+        'expiration': time.time() + 3600,
+        'created_at': time.time(),
+        'size_bytes': len(data)
+    }
+
+
+class TestTieredPdfStore(unittest.TestCase):
+    """Test cases for TieredPdfStore."""
+
+    def setUp(self):
+        """Set up a store with room for two 100-byte PDFs in memory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = TieredPdfStore(self.temp_dir, max_memory_bytes=250)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_least_recently_used_entry_spills(self):
+        """Test that going over budget spills the least recently read entry."""
+        self.store['a'] = _entry(b'a' * 100)
+        self.store['b'] = _entry(b'b' * 100)
+        self.assertEqual(self.store['a']['filename'], 'merged.pdf')  # 'b' is now the oldest
+        self.store['c'] = _entry(b'c' * 100)
+
+        stats = self.store.tier_stats()
+        self.assertEqual(stats['memory_entries'], 2)
+        self.assertEqual(stats['memory_bytes'], 200)
+        self.assertEqual(stats['disk_entries'], 1)
+        self.assertEqual(stats['disk_bytes'], 100)
+        self.assertEqual(stats['spills'], 1)
+        self.assertIsNone(self.store.peek('b')['data'])
+        self.assertEqual(len(os.listdir(self.store.spill_dir)), 1)
+        self.assertEqual(sorted(self.store), ['a', 'b', 'c'])
+
+    def test_spilled_entry_is_promoted_on_read(self):
+        """Test that reading a spilled entry loads it back and spills another."""
+        for key in 'abc':
+            self.store[key] = _entry(key.encode() * 100)
+
+        entry = self.store['a']
+        self.assertEqual(entry['data'].getvalue(), b'a' * 100)
+        self.assertEqual(entry['size_bytes'], 100)
+        stats = self.store.tier_stats()
+        self.assertEqual(stats['promotions'], 1)
+        self.assertEqual(stats['spills'], 2)
+        self.assertEqual(stats['memory_bytes'], 200)
+        self.assertIsNone(self.store.peek('b')['data'])
+
+    def test_delete_removes_spilled_file(self):
+        """Test that deleting a spilled entry deletes its file and frees its bytes."""
+        for key in 'abc':
+            self.store[key] = _entry(key.encode() * 100)
+        del self.store['a']
+        self.assertNotIn('a', self.store)
+        self.assertEqual(os.listdir(self.store.spill_dir), [])
+        self.assertEqual(self.store.tier_stats()['disk_bytes'], 0)
+        self.assertIsNone(self.store.pop('a', None))
+
+    def test_oversized_entry_served_from_disk(self):
+        """Test that an entry larger than the budget stays on disk when read."""
+        self.store['big'] = _entry(b'x' * 300)
+        self.assertEqual(self.store.tier_stats()['disk_entries'], 1)
+        self.assertEqual(self.store['big']['data'].getvalue(), b'x' * 300)
+        self.assertEqual(self.store.tier_stats()['promotions'], 0)
+
+    def test_replace_if_size(self):
+        """Test that a PDF is only replaced while it has the size the caller saw, in either tier."""
+        for key in 'abc':
+            self.store[key] = _entry(key.encode() * 100)
+
+        self.assertFalse(self.store.replace_if_size('a', 99, io.BytesIO(b'a' * 120)))
+        # 'a' is spilled; replacing it brings the new bytes into memory
+        self.assertTrue(self.store.replace_if_size('a', 100, io.BytesIO(b'a' * 120)))
+        self.assertEqual(self.store['a']['data'].getvalue(), b'a' * 120)
+        self.assertEqual(self.store['a']['size_bytes'], 120)
+        self.assertFalse(self.store.replace_if_size('a', 100, io.BytesIO(b'a' * 140)))
+        self.assertFalse(self.store.replace_if_size('missing', 0, io.BytesIO(b'')))
+
+    def test_unlimited_budget_never_spills(self):
+        """Test that a zero budget keeps every entry in memory."""
+        store = TieredPdfStore(self.temp_dir)
+        for key in 'abcdef':
+            store[key] = _entry(key.encode() * 1000)
+        self.assertEqual(store.tier_stats()['disk_entries'], 0)
+        self.assertIsNone(store.spill_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()